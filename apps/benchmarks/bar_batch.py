@@ -0,0 +1,123 @@
+"""Compares building a list of Bar instances against building a columnar
+BarBatch from the same stream of IQFeed historical bar messages.
+
+Run with: python -m benchmarks.bar_batch
+"""
+
+from typing import Callable
+from typing import Final
+from typing import List
+from typing import Tuple
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.timestamps import generate_timestamps
+from iqfeedserver import iq
+from iqfeedserver.iq.bar_batch import BarBatchBuilder
+
+
+DEFAULT_BARS: Final = 1000000
+
+
+def generate_fields(count: int) -> List[List[str]]:
+    """Generates the fields of historical bar messages.
+
+    Args:
+        count: The number of messages to generate.
+
+    Returns:
+        The fields of each message.
+    """
+    return [
+        [
+            "SPY", timestamp,
+            "%.2f" % (300.5 + i % 7), "%.2f" % (299.5 + i % 5),
+            "%.2f" % (300 + i % 3), "%.2f" % (300.25 + i % 4),
+            str(1000 * i), "1000", "10"
+        ] for i, timestamp in enumerate(generate_timestamps(count))
+    ]
+
+
+def build_bars(messages: List[List[str]]) -> object:
+    """Builds a list of Bar instances the way request_bars_in_period does.
+
+    Args:
+        messages: The fields of each message.
+
+    Returns:
+        The list of bars.
+    """
+    conn = iq.HistoryConn()
+    return [conn._handle_historical_bar(fields) for fields in messages]
+
+
+def build_batch(messages: List[List[str]]) -> object:
+    """Builds a BarBatch the way request_bar_batch_in_period does.
+
+    Args:
+        messages: The fields of each message.
+
+    Returns:
+        The batch of bars.
+    """
+    builder = BarBatchBuilder("SPY")
+    for fields in messages:
+        builder.append_historical_fields(fields)
+
+    return builder.build()
+
+
+def measure(
+    build: Callable[[List[List[str]]], object], messages: List[List[str]]
+) -> Tuple[float, int]:
+    """Measures how long it takes to build the bars and how much memory the
+    result holds on to.
+
+    Args:
+        build: The function to build the bars with.
+        messages: The fields of each message.
+
+    Returns:
+        The number of seconds taken and the number of bytes retained.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    build(messages)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(messages)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return elapsed, retained
+
+
+def main() -> None:
+    """Runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bars", type=int, default=DEFAULT_BARS)
+    args = parser.parse_args()
+
+    messages = generate_fields(args.bars)
+
+    bars_time, bars_memory = measure(build_bars, messages)
+    batch_time, batch_memory = measure(build_batch, messages)
+
+    print("Built %d bars" % len(messages))
+    print("List[Bar]: %.3fs, %.1f MiB" % (bars_time, bars_memory / 1024 ** 2))
+    print("BarBatch:  %.3fs, %.1f MiB" % (
+        batch_time, batch_memory / 1024 ** 2
+    ))
+    print("speedup:   %.1fx, memory reduction: %.1fx" % (
+        bars_time / batch_time, bars_memory / batch_memory
+    ))
+
+
+if __name__ == "__main__":
+    main()
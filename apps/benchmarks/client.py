@@ -0,0 +1,200 @@
+"""A minimal client for iqfeedserver's replay protocol, used to drive the
+server in benchmarks.
+"""
+
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+import asyncio
+import datetime
+import time
+
+from iqfeedserver import trading_calendar
+
+
+# The number of seconds the server waits for a message before sending a
+# heartbeat
+HEARTBEAT_INTERVAL: Final = 5.0
+
+SERVER_CONNECTED: Final = "S,SERVER CONNECTED"
+
+
+class ReplayResult(NamedTuple):
+    """The outcome of replaying a ticker for a day.
+    """
+    ticker: str
+    date: str
+    bars: int
+    latency: float
+    error: bool
+
+
+class _PendingReplay:
+    """A replay waiting for its bars to arrive.
+    """
+
+    def __init__(self, ticker: str, date: str) -> None:
+        """Instantiates the instance.
+
+        Args:
+            ticker: The ticker being replayed.
+            date: The date being replayed, formatted as YYYYMMDD.
+        """
+        self.bars = 0
+        self.date = date
+        self.done = asyncio.get_running_loop().create_future()
+
+        # IQFeedServer doesn't mark the end of a replay so a request is
+        # complete once the bar at the close arrives
+        session = trading_calendar.get_session(
+            datetime.datetime.strptime(date, "%Y%m%d").date()
+        )
+        self.last_bar = session.close.strftime("%H:%M:%S") if session \
+            else trading_calendar.MARKET_CLOSE.strftime("%H:%M:%S")
+        self.started = time.perf_counter()
+        self.ticker = ticker
+
+    def finish(self, error: bool) -> None:
+        """Completes the replay.
+
+        Args:
+            error: Whether the server reported an error.
+        """
+        if not self.done.done():
+            self.done.set_result(ReplayResult(
+                self.ticker, self.date, self.bars,
+                time.perf_counter() - self.started, error
+            ))
+
+
+class ReplayClient:
+    """Connects to iqfeedserver and replays days of bars. Replays for
+    different tickers run concurrently, while replays for the same ticker run
+    one after another since the server's responses can't tell them apart.
+    """
+
+    def __init__(self) -> None:
+        """Instantiates the instance.
+        """
+        # How late each heartbeat arrived, in seconds. Heartbeats are due once
+        # the client hasn't sent anything for HEARTBEAT_INTERVAL, so lateness
+        # shows how far the server's event loop is lagging
+        self.heartbeat_lateness = []  # type: List[float]
+        self._last_activity = 0.0
+        self._locks = {}  # type: Dict[str, asyncio.Lock]
+        self._pending = {}  # type: Dict[str, _PendingReplay]
+        self._reader = None  # type: Optional[asyncio.StreamReader]
+        self._task = None  # type: Optional[asyncio.Task]
+        self._writer = None  # type: Optional[asyncio.StreamWriter]
+
+    @property
+    def closed(self) -> bool:
+        """Gets whether the connection to the server has been closed.
+        """
+        return not self._task or self._task.done()
+
+    async def connect(self, host: str, port: int) -> None:
+        """Connects to the server and waits for the handshake to complete.
+
+        Args:
+            host: The host the server is running on.
+            port: The port the server is listening on.
+
+        Raises:
+            ConnectionError: If the server doesn't complete the handshake.
+        """
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._writer.write(b"S,CONNECT\r\n")
+
+        line = await self._reader.readline()
+        if line.decode("latin-1").strip() != SERVER_CONNECTED:
+            raise ConnectionError("Unexpected handshake: %r" % line)
+
+        self._last_activity = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._read())
+
+    async def disconnect(self) -> None:
+        """Disconnects from the server.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        if self._writer:
+            self._writer.close()
+
+    async def replay(
+        self, ticker: str, date: str, timeout: float = 60
+    ) -> ReplayResult:
+        """Replays the bars of a ticker for a day.
+
+        Args:
+            ticker: The ticker to replay.
+            date: The date to replay, formatted as YYYYMMDD.
+            timeout: The maximum number of seconds to wait for the replay.
+
+        Returns:
+            The outcome of the replay.
+
+        Raises:
+            asyncio.TimeoutError: If the replay doesn't complete in time.
+        """
+        if not self._writer:
+            raise RuntimeError("Not connected")
+
+        lock = self._locks.setdefault(ticker, asyncio.Lock())
+
+        async with lock:
+            pending = _PendingReplay(ticker, date)
+            self._pending[ticker] = pending
+
+            try:
+                self._writer.write(
+                    ("BW,%s,60,%s 093000,,,,,,s,,\r\n" % (ticker, date))
+                    .encode("latin-1")
+                )
+                self._last_activity = time.perf_counter()
+                return await asyncio.wait_for(pending.done, timeout)
+
+            finally:
+                del self._pending[ticker]
+
+    async def _read(self) -> None:
+        """Reads responses from the server and hands them to the replays
+        waiting on them.
+        """
+        assert self._reader
+
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+
+            fields = line.decode("latin-1").rstrip().split(",")
+
+            if len(fields) > 3 and fields[1] == "BC":
+                pending = self._pending.get(fields[2])
+                if pending:
+                    pending.bars += 1
+                    if fields[3].endswith(pending.last_bar):
+                        pending.finish(False)
+
+            elif fields[0] == "n" and len(fields) > 1:
+                pending = self._pending.get(fields[1])
+                if pending:
+                    pending.finish(True)
+
+            elif ",".join(fields) == SERVER_CONNECTED:
+                now = time.perf_counter()
+                self.heartbeat_lateness.append(max(
+                    0.0, now - self._last_activity - HEARTBEAT_INTERVAL
+                ))
+                self._last_activity = now
+
+        for pending in self._pending.values():
+            if not pending.done.done():
+                pending.done.set_exception(
+                    ConnectionError("Server closed the connection")
+                )
@@ -0,0 +1,360 @@
+"""A stand-in for IQFeed's lookup port that answers HIT and HDT requests with
+synthetic bars. The bars only depend on the ticker and time requested, so
+every run sees the same data.
+
+Run standalone with: python -m benchmarks.fake_iqfeed --port 9100
+"""
+
+from typing import Dict
+from typing import Final
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+import argparse
+import asyncio
+import datetime
+import zlib
+
+from iqfeedserver import trading_calendar
+
+
+CURRENT_PROTOCOL: Final = "6.1"
+DEFAULT_PORT: Final = 9100
+
+# The number of lines written at once when the line rate is limited
+PACE_INTERVAL: Final = 0.01
+
+
+class FakeIQFeed:
+    """Serves deterministic historical data over IQFeed's lookup protocol.
+    Requests on the same connection are answered concurrently, the same way
+    IQFeed interleaves the responses to pipelined requests.
+    """
+
+    def __init__(self, latency: float = 0, line_rate: int = 0) -> None:
+        """Instantiates the instance.
+
+        Args:
+            latency: The number of seconds to wait before answering each
+            request.
+            line_rate: The maximum number of lines to send per second for each
+            request. Unlimited if 0.
+        """
+        self.connections = 0
+        self.latency = latency
+        self.line_rate = line_rate
+        self.requests = 0
+        self._connections = {
+        }  # type: Dict[asyncio.Task, asyncio.StreamWriter]
+        self._server = None  # type: Optional[asyncio.AbstractServer]
+        self._port = 0
+
+    @property
+    def port(self) -> int:
+        """Gets the port the server is listening on.
+        """
+        return self._port
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0
+    ) -> "FakeIQFeed":
+        """Starts listening for connections.
+
+        Args:
+            host: The host to listen on.
+            port: The port to listen on. Picks a free port if 0.
+
+        Returns:
+            The started server.
+        """
+        server = await asyncio.start_server(self._handle, host, port)
+        self._port = server.sockets[0].getsockname()[1]
+        self._server = server
+        return self
+
+    async def stop(self) -> None:
+        """Stops listening for connections and closes the open ones.
+        """
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        for writer in self._connections.values():
+            writer.close()
+
+        if self._connections:
+            await asyncio.wait(list(self._connections))
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answers the requests sent on a connection until it is closed.
+
+        Args:
+            reader: The reader to receive requests from.
+            writer: The writer to send responses to.
+        """
+        self.connections += 1
+        connection = asyncio.current_task()
+        assert connection
+        self._connections[connection] = writer
+        tasks = set()  # type: Set[asyncio.Task]
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                task = asyncio.get_running_loop().create_task(
+                    self._answer(line.decode("latin-1").strip(), writer)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        except ConnectionError:
+            pass
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            writer.close()
+            del self._connections[connection]
+
+    async def _answer(
+        self, command: str, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answers a single request.
+
+        Args:
+            command: The request sent by the client.
+            writer: The writer to send the response to.
+        """
+        fields = command.split(",")
+
+        if fields[0] == "S" and fields[1:2] == ["SET PROTOCOL"]:
+            writer.write(
+                ("S,CURRENT PROTOCOL,%s\r\n" % CURRENT_PROTOCOL).encode()
+            )
+            return
+
+        if fields[0] == "HIT" and len(fields) > 9:
+            req_id = fields[9]
+            lines = generate_hit_lines(
+                req_id, fields[1], int(fields[2]),
+                _parse_timestamp(fields[3]), _parse_timestamp(fields[4])
+            )
+
+        elif fields[0] == "HDT" and len(fields) > 6:
+            req_id = fields[6]
+            lines = generate_hdt_lines(
+                req_id, fields[1], _parse_date(fields[2]),
+                _parse_date(fields[3])
+            )
+
+        else:
+            return
+
+        self.requests += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        lines = lines or ["%s,E,!NO_DATA!," % req_id]
+        lines.append("%s,!ENDMSG!," % req_id)
+
+        step = max(1, int(self.line_rate * PACE_INTERVAL)) \
+            if self.line_rate else len(lines)
+
+        try:
+            for start in range(0, len(lines), step):
+                writer.write("".join(
+                    line + "\r\n" for line in lines[start:start + step]
+                ).encode("latin-1"))
+
+                await writer.drain()
+                if self.line_rate:
+                    await asyncio.sleep(PACE_INTERVAL)
+
+        except ConnectionError:
+            pass
+
+
+def generate_hit_lines(
+    req_id: str, ticker: str, interval: int, start: datetime.datetime,
+    end: datetime.datetime
+) -> List[str]:
+    """Generates the response lines for a HIT request. Bars are only generated
+    during market hours on trading days.
+
+    Args:
+        req_id: The ID of the request.
+        ticker: The ticker requested.
+        interval: The number of seconds in each bar.
+        start: The start of the period requested.
+        end: The end of the period requested.
+
+    Returns:
+        The lines of historical bars, without the end message.
+    """
+    lines = []  # type: List[str]
+    base = _get_base_price(ticker)
+
+    for timestamp in _iterate_bar_times(start, end, interval):
+        minute = timestamp.toordinal() * 1440 + timestamp.hour * 60 + \
+            timestamp.minute
+        open_p = base + (minute % 97) / 100
+        close_p = base + (minute % 89) / 100
+        volume = 100 + minute % 900
+        lines.append("%s,%s,%.2f,%.2f,%.2f,%.2f,%d,%d,%d," % (
+            req_id, timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            max(open_p, close_p) + 0.05, min(open_p, close_p) - 0.05,
+            open_p, close_p, volume * (len(lines) + 1), volume,
+            1 + volume // 50
+        ))
+
+    return lines
+
+
+def generate_hdt_lines(
+    req_id: str, ticker: str, start: datetime.date, end: datetime.date
+) -> List[str]:
+    """Generates the response lines for an HDT request, one daily bar for
+    each trading day.
+
+    Args:
+        req_id: The ID of the request.
+        ticker: The ticker requested.
+        start: The first date requested.
+        end: The last date requested.
+
+    Returns:
+        The lines of daily bars, without the end message.
+    """
+    lines = []  # type: List[str]
+    base = _get_base_price(ticker)
+    day = start
+
+    while day <= end:
+        if trading_calendar.is_trading_day(day):
+            ordinal = day.toordinal()
+            open_p = base + (ordinal % 97) / 10
+            close_p = base + (ordinal % 89) / 10
+            lines.append("%s,%s,%.2f,%.2f,%.2f,%.2f,%d,0," % (
+                req_id, day.isoformat(), max(open_p, close_p) + 1,
+                min(open_p, close_p) - 1, open_p, close_p,
+                100000 + ordinal % 50000
+            ))
+
+        day += datetime.timedelta(days=1)
+
+    return lines
+
+
+def _iterate_bar_times(
+    start: datetime.datetime, end: datetime.datetime, interval: int
+) -> Iterator[datetime.datetime]:
+    """Iterates over the end times of the bars in a period that fall within
+    market hours on trading days.
+
+    Args:
+        start: The start of the period.
+        end: The end of the period.
+        interval: The number of seconds in each bar.
+
+    Yields:
+        The end time of each bar.
+    """
+    step = datetime.timedelta(seconds=max(1, interval))
+    day = start.date()
+
+    while day <= end.date():
+        session = trading_calendar.get_session(day)
+        if session:
+            timestamp = max(session.open, start) + step
+
+            while timestamp <= min(session.close, end):
+                yield timestamp
+                timestamp += step
+
+        day += datetime.timedelta(days=1)
+
+
+def _get_base_price(ticker: str) -> float:
+    """Gets the price a ticker's synthetic bars move around.
+
+    Args:
+        ticker: The ticker to get the price for.
+
+    Returns:
+        The base price for the ticker.
+    """
+    return 10 + zlib.crc32(ticker.encode()) % 490
+
+
+def _parse_timestamp(value: str) -> datetime.datetime:
+    """Parses a timestamp sent in a HIT request.
+
+    Args:
+        value: The timestamp to parse.
+
+    Returns:
+        The parsed timestamp.
+    """
+    return datetime.datetime.strptime(value, "%Y%m%d %H%M%S")
+
+
+def _parse_date(value: str) -> datetime.date:
+    """Parses a date sent in an HDT request.
+
+    Args:
+        value: The date to parse.
+
+    Returns:
+        The parsed date.
+    """
+    return datetime.datetime.strptime(value, "%Y%m%d").date()
+
+
+async def serve(host: str, port: int, latency: float, line_rate: int) -> None:
+    """Runs the fake server until interrupted.
+
+    Args:
+        host: The host to listen on.
+        port: The port to listen on.
+        latency: The number of seconds to wait before answering each request.
+        line_rate: The maximum number of lines to send per second for each
+        request. Unlimited if 0.
+    """
+    server = await FakeIQFeed(latency, line_rate).start(host, port)
+    print("Fake IQFeed listening on %s:%d" % (host, server.port))
+
+    try:
+        await asyncio.Event().wait()
+
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    """Runs the fake server.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--line-rate", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency, args.line_rate))
+
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Generates load against a running iqfeedserver with many simulated backtest
+clients, ramping up the number of clients to find where latency collapses.
+
+Each client completes the S,CONNECT handshake, then replays days from the
+ticker and date mix one after another. Repeated days are likely served from
+the payload cache, so use a wide mix to measure pulling from IQFeed.
+
+Run with: python -m benchmarks.load --ramp 1,2,4,8,16,32 --output curve.json
+"""
+
+from typing import Final
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+import argparse
+import asyncio
+import datetime
+import json
+import time
+
+from benchmarks.client import ReplayClient
+from benchmarks.client import ReplayResult
+from benchmarks.suite import percentile
+from iqfeedserver import trading_calendar
+
+
+DEFAULT_DURATION: Final = 30.0
+DEFAULT_HOST: Final = "127.0.0.1"
+DEFAULT_MAX_P99_MS: Final = 5000.0
+DEFAULT_PORT: Final = 9999
+DEFAULT_RAMP: Final = "1,2,4,8,16,32,64"
+DEFAULT_TICKERS: Final = "AAPL,MSFT,SPY,QQQ,AMZN"
+
+# A step saturates the server once it adds less than this fraction of
+# throughput over the best step so far
+MIN_THROUGHPUT_GAIN: Final = 0.05
+
+
+class StepResult(NamedTuple):
+    """The metrics measured with a number of concurrent clients.
+    """
+    clients: int
+    requests: int
+    errors: int
+    bars_per_sec: float
+    requests_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    heartbeat_p99_ms: float
+
+
+def get_dates(value: str) -> List[str]:
+    """Gets the dates to replay from the command line value.
+
+    Args:
+        value: Comma separated dates formatted as YYYYMMDD, or a range
+        formatted as YYYYMMDD-YYYYMMDD.
+
+    Returns:
+        The trading days to replay, formatted as YYYYMMDD.
+    """
+    if "-" not in value:
+        return value.split(",")
+
+    first, last = (
+        datetime.datetime.strptime(date, "%Y%m%d").date()
+        for date in value.split("-")
+    )
+
+    dates = []  # type: List[str]
+    while first <= last:
+        if trading_calendar.is_trading_day(first):
+            dates.append(first.strftime("%Y%m%d"))
+
+        first += datetime.timedelta(days=1)
+
+    return dates
+
+
+async def run_client(
+    host: str, port: int, mix: List[Tuple[str, str]], start: int,
+    deadline: float, think_time: float, timeout: float
+) -> Tuple[List[ReplayResult], int, List[float]]:
+    """Runs a single client until the deadline.
+
+    Args:
+        host: The host the server is running on.
+        port: The port the server is listening on.
+        mix: The tickers and dates to replay.
+        start: The position in the mix to start replaying from.
+        deadline: The time.perf_counter() value to stop sending requests at.
+        think_time: The number of seconds to wait between requests.
+        timeout: The maximum number of seconds to wait for each replay.
+
+    Returns:
+        The completed replays, the number of failed replays, and how late each
+        heartbeat was.
+    """
+    client = ReplayClient()
+    results = []  # type: List[ReplayResult]
+    errors = 0
+
+    try:
+        await client.connect(host, port)
+
+        position = start
+        while time.perf_counter() < deadline:
+            ticker, date = mix[position % len(mix)]
+            position += 1
+
+            try:
+                result = await client.replay(ticker, date, timeout)
+
+            except (asyncio.TimeoutError, ConnectionError):
+                errors += 1
+                if client.closed:
+                    break
+
+                continue
+
+            if result.error:
+                errors += 1
+            else:
+                results.append(result)
+
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    except ConnectionError:
+        errors += 1
+
+    finally:
+        await client.disconnect()
+
+    return results, errors, client.heartbeat_lateness
+
+
+async def run_step(
+    host: str, port: int, clients: int, mix: List[Tuple[str, str]],
+    duration: float, think_time: float, timeout: float
+) -> StepResult:
+    """Runs a number of clients at once for a while.
+
+    Args:
+        host: The host the server is running on.
+        port: The port the server is listening on.
+        clients: The number of clients to run.
+        mix: The tickers and dates to replay.
+        duration: The number of seconds to keep sending requests for.
+        think_time: The number of seconds each client waits between
+        requests.
+        timeout: The maximum number of seconds to wait for each replay.
+
+    Returns:
+        The metrics measured during the step.
+    """
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(
+        run_client(
+            host, port, mix, index * len(mix) // clients,
+            started + duration, think_time, timeout
+        ) for index in range(clients)
+    ))
+    seconds = time.perf_counter() - started
+
+    results = [result for results, _, _ in outcomes for result in results]
+    lateness = [late for _, _, lates in outcomes for late in lates]
+
+    return StepResult(
+        clients=clients,
+        requests=len(results),
+        errors=sum(errors for _, errors, _ in outcomes),
+        bars_per_sec=round(sum(result.bars for result in results) / seconds),
+        requests_per_sec=round(len(results) / seconds, 2),
+        p50_ms=round(percentile(
+            [result.latency for result in results], 0.5
+        ) * 1000, 2),
+        p99_ms=round(percentile(
+            [result.latency for result in results], 0.99
+        ) * 1000, 2),
+        heartbeat_p99_ms=round(percentile(lateness, 0.99) * 1000, 2)
+    )
+
+
+def is_saturated(
+    step: StepResult, best: Optional[StepResult], max_p99_ms: float
+) -> bool:
+    """Checks whether a step pushed the server past its capacity.
+
+    Args:
+        step: The metrics of the step.
+        best: The step with the highest throughput so far.
+        max_p99_ms: The highest acceptable p99 latency.
+
+    Returns:
+        True if the server is saturated. False otherwise.
+    """
+    if step.p99_ms > max_p99_ms or step.errors > step.requests // 100:
+        return True
+
+    return best is not None and (
+        step.bars_per_sec < best.bars_per_sec * (1 + MIN_THROUGHPUT_GAIN)
+    )
+
+
+async def ramp(
+    host: str, port: int, steps: List[int], mix: List[Tuple[str, str]],
+    duration: float, think_time: float, timeout: float, max_p99_ms: float
+) -> Tuple[List[StepResult], int]:
+    """Increases the number of clients step by step until the server
+    saturates.
+
+    Args:
+        host: The host the server is running on.
+        port: The port the server is listening on.
+        steps: The number of clients to run in each step.
+        mix: The tickers and dates to replay.
+        duration: The number of seconds to run each step for.
+        think_time: The number of seconds each client waits between
+        requests.
+        timeout: The maximum number of seconds to wait for each replay.
+        max_p99_ms: The highest acceptable p99 latency.
+
+    Returns:
+        The metrics of each step, and the highest number of clients served
+        before the server saturated.
+    """
+    curve = []  # type: List[StepResult]
+    best = None  # type: Optional[StepResult]
+    capacity = 0
+
+    for clients in steps:
+        step = await run_step(
+            host, port, clients, mix, duration, think_time, timeout
+        )
+        curve.append(step)
+
+        print("%5d clients  %8d bars/s  %7.2f req/s  p50 %8.2fms  "
+              "p99 %8.2fms  heartbeat p99 %7.2fms  errors %d" % (
+                  step.clients, step.bars_per_sec, step.requests_per_sec,
+                  step.p50_ms, step.p99_ms, step.heartbeat_p99_ms,
+                  step.errors
+              ))
+
+        if is_saturated(step, best, max_p99_ms):
+            break
+
+        capacity = clients
+        if not best or step.bars_per_sec > best.bars_per_sec:
+            best = step
+
+    return curve, capacity
+
+
+def main() -> None:
+    """Runs the load generator.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--ramp", default=DEFAULT_RAMP,
+        help="Comma separated numbers of clients to run in each step."
+    )
+    parser.add_argument("--tickers", default=DEFAULT_TICKERS)
+    parser.add_argument(
+        "--dates", default="20190102-20190329",
+        help="Comma separated dates, or a range like 20190102-20190329."
+    )
+    parser.add_argument(
+        "--duration", type=float, default=DEFAULT_DURATION,
+        help="The number of seconds to run each step for."
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=0,
+        help="The number of seconds each client waits between requests."
+    )
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument(
+        "--max-p99-ms", type=float, default=DEFAULT_MAX_P99_MS,
+        help="The p99 latency at which the server counts as saturated."
+    )
+    parser.add_argument("--output", help="A file to save the curve to.")
+    args = parser.parse_args()
+
+    mix = [
+        (ticker, date)
+        for date in get_dates(args.dates)
+        for ticker in args.tickers.split(",")
+    ]
+
+    curve, capacity = asyncio.run(ramp(
+        args.host, args.port, [int(step) for step in args.ramp.split(",")],
+        mix, args.duration, args.think_time, args.timeout, args.max_p99_ms
+    ))
+
+    print("Capacity: %d concurrent clients" % capacity)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "capacity": capacity,
+                "curve": [step._asdict() for step in curve]
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
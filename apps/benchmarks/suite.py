@@ -0,0 +1,455 @@
+"""Measures iqfeedserver end to end against a fake IQFeed lookup server. Each
+scenario drives one layer of the stack: HistoryConn on its own, the worker
+that formats replays, and the full server through IQFeedServerHandler.
+
+Results can be saved as a JSON baseline and compared against on later runs.
+
+Run with: python -m benchmarks.suite --save baseline.json
+Compare with: python -m benchmarks.suite --compare baseline.json
+"""
+
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import NamedTuple
+from typing import Set
+from typing import Tuple
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+from benchmarks.client import ReplayClient
+from benchmarks.fake_iqfeed import FakeIQFeed
+from iqfeedserver import iq
+from iqfeedserver import trading_calendar
+from iqfeedserver import worker
+from iqfeedserver.handler import IQFeedServerHandler
+
+
+DEFAULT_CONCURRENCY: Final = 8
+DEFAULT_DAYS: Final = 20
+DEFAULT_REPEAT: Final = 3
+DEFAULT_TICKERS: Final = ("AAPL", "MSFT", "SPY", "QQQ", "AMZN")
+DEFAULT_TOLERANCE: Final = 0.2
+FIRST_DAY: Final = datetime.date(2019, 1, 2)
+
+# Metrics where a lower value is better. Higher is better for the rest
+LOWER_IS_BETTER: Final = (
+    "p50_ms", "p99_ms", "peak_rss_kb", "peak_traced_kb"
+)
+
+Request = Tuple[str, datetime.date]
+Scenario = Callable[[FakeIQFeed, List[Request], int], Awaitable[List[float]]]
+
+
+class ScenarioResult(NamedTuple):
+    """The metrics measured for a scenario.
+    """
+    requests: int
+    bars: int
+    seconds: float
+    bars_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_kb: int
+    peak_traced_kb: int
+
+
+def get_requests(
+    tickers: List[str], days: int, offset: int = 0
+) -> List[Request]:
+    """Gets the ticker and trading day of every request to make.
+
+    Args:
+        tickers: The tickers to request.
+        days: The number of trading days to request for each ticker.
+        offset: The number of trading days to skip, so repeated runs don't
+        hit caches.
+
+    Returns:
+        The requests to make.
+    """
+    dates = []  # type: List[datetime.date]
+    day = FIRST_DAY
+
+    while len(dates) < offset + days:
+        if trading_calendar.is_trading_day(day):
+            dates.append(day)
+
+        day += datetime.timedelta(days=1)
+
+    return [(ticker, date) for date in dates[offset:] for ticker in tickers]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Gets a percentile of some values using the nearest rank.
+
+    Args:
+        values: The values to get the percentile of.
+        fraction: The percentile to get, between 0 and 1.
+
+    Returns:
+        The percentile. 0 if there are no values.
+    """
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def gather_limited(
+    calls: List[Callable[[], Awaitable[float]]], concurrency: int
+) -> List[float]:
+    """Runs calls with at most a given number running at once.
+
+    Args:
+        calls: The calls to run. Each returns its latency.
+        concurrency: The maximum number of calls to run at once.
+
+    Returns:
+        The latency of each call.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call: Callable[[], Awaitable[float]]) -> float:
+        async with semaphore:
+            return await call()
+
+    return list(await asyncio.gather(*(run(call) for call in calls)))
+
+
+async def run_history_conn(
+    server: FakeIQFeed, requests: List[Request], concurrency: int
+) -> List[float]:
+    """Pipelines requests for bar batches over a single HistoryConn.
+
+    Args:
+        server: The fake IQFeed server to request the bars from.
+        requests: The requests to make.
+        concurrency: The maximum number of requests in flight.
+
+    Returns:
+        The latency of each request.
+    """
+    conn = iq.HistoryConn()
+    await conn.connect("127.0.0.1", server.port)
+
+    async def request(ticker: str, date: datetime.date) -> float:
+        start = datetime.datetime.combine(date, datetime.time(9, 30))
+        started = time.perf_counter()
+        await conn.request_bar_batch_in_period(
+            ticker, start, start.replace(hour=16), 60
+        )
+        return time.perf_counter() - started
+
+    try:
+        return await gather_limited([
+            functools.partial(request, ticker, date)
+            for ticker, date in requests
+        ], concurrency)
+
+    finally:
+        await conn.disconnect()
+
+
+async def run_worker(
+    server: FakeIQFeed, requests: List[Request], concurrency: int
+) -> List[float]:
+    """Replays days through worker.process_job.
+
+    Args:
+        server: The fake IQFeed server the worker pulls bars from.
+        requests: The requests to make.
+        concurrency: The maximum number of replays at once.
+
+    Returns:
+        The latency of each replay.
+    """
+    async def replay(ticker: str, date: datetime.date) -> float:
+        started = time.perf_counter()
+        async for _ in worker.process_job(
+            ticker, datetime.datetime.combine(date, datetime.time(9, 30))
+        ):
+            pass
+
+        return time.perf_counter() - started
+
+    try:
+        return await gather_limited([
+            functools.partial(replay, ticker, date)
+            for ticker, date in requests
+        ], concurrency)
+
+    finally:
+        await worker.close()
+
+
+async def run_handler(
+    server: FakeIQFeed, requests: List[Request], concurrency: int
+) -> List[float]:
+    """Replays days through a real server, over a single client connection.
+
+    Args:
+        server: The fake IQFeed server the worker pulls bars from.
+        requests: The requests to make.
+        concurrency: The maximum number of replays at once.
+
+    Returns:
+        The latency of each replay.
+    """
+    handler = IQFeedServerHandler(concurrency)
+    sessions = set()  # type: Set[asyncio.Task]
+
+    async def handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        session = asyncio.current_task()
+        assert session
+        sessions.add(session)
+
+        try:
+            await handler.handle(reader, writer)
+
+        finally:
+            sessions.discard(session)
+
+    listener = await asyncio.start_server(handle, "127.0.0.1", 0)
+    client = ReplayClient()
+
+    async def replay(ticker: str, date: datetime.date) -> float:
+        result = await client.replay(ticker, date.strftime("%Y%m%d"))
+        if result.error:
+            raise RuntimeError("Replay failed for %s on %s" % (ticker, date))
+
+        return result.latency
+
+    try:
+        await client.connect("127.0.0.1", listener.sockets[0].getsockname()[1])
+
+        return await gather_limited([
+            functools.partial(replay, ticker, date)
+            for ticker, date in requests
+        ], concurrency)
+
+    finally:
+        await client.disconnect()
+        listener.close()
+        await listener.wait_closed()
+
+        # Let the server notice the client left
+        if sessions:
+            await asyncio.wait(list(sessions), timeout=10)
+
+        await worker.close()
+
+
+SCENARIOS: Final = {
+    "history_conn": run_history_conn,
+    "worker": run_worker,
+    "handler": run_handler,
+}  # type: Dict[str, Scenario]
+
+
+async def measure(
+    scenario: Scenario, server: FakeIQFeed, tickers: List[str], days: int,
+    concurrency: int, repeat: int, offset: int
+) -> Tuple[ScenarioResult, int]:
+    """Times a scenario a number of times and keeps the fastest run, then runs
+    it once more to trace its memory allocations, which slows it down. Every
+    run requests different days so none of them are served from a cache.
+
+    Args:
+        scenario: The scenario to run.
+        server: The fake IQFeed server to run the scenario against.
+        tickers: The tickers to request.
+        days: The number of days to request for each ticker in each run.
+        concurrency: The maximum number of requests in flight.
+        repeat: The number of times to time the scenario.
+        offset: The number of trading days to skip.
+
+    Returns:
+        The measured metrics and the number of trading days used.
+    """
+    requests = []  # type: List[Request]
+    latencies = []  # type: List[float]
+    seconds = 0.0
+
+    for run in range(repeat):
+        requests = get_requests(tickers, days, offset + run * days)
+
+        started = time.perf_counter()
+        run_latencies = await scenario(server, requests, concurrency)
+        run_seconds = time.perf_counter() - started
+
+        if not seconds or run_seconds < seconds:
+            latencies = run_latencies
+            seconds = run_seconds
+
+    tracemalloc.start()
+    await scenario(
+        server, get_requests(tickers, days, offset + repeat * days),
+        concurrency
+    )
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Every request covers a full trading day of minute bars
+    bars = len(requests) * 390
+
+    return ScenarioResult(
+        requests=len(requests),
+        bars=bars,
+        seconds=round(seconds, 3),
+        bars_per_sec=round(bars / seconds),
+        p50_ms=round(percentile(latencies, 0.5) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        peak_traced_kb=peak_traced // 1024
+    ), days * (repeat + 1)
+
+
+async def run_suite(
+    names: List[str], tickers: List[str], days: int, concurrency: int,
+    repeat: int, latency: float, line_rate: int
+) -> Dict[str, ScenarioResult]:
+    """Runs the selected scenarios.
+
+    Args:
+        names: The names of the scenarios to run.
+        tickers: The tickers to request.
+        days: The number of days to request for each ticker.
+        concurrency: The maximum number of requests in flight.
+        repeat: The number of times to time each scenario.
+        latency: The number of seconds the fake server waits before
+        answering each request.
+        line_rate: The maximum number of lines per second the fake server
+        sends for each request. Unlimited if 0.
+
+    Returns:
+        The metrics of each scenario.
+    """
+    server = await FakeIQFeed(latency, line_rate).start()
+    os.environ["IQFEED_HOST"] = "127.0.0.1"
+    os.environ["IQFEED_PORT_LOOKUP"] = str(server.port)
+    os.environ.pop("IQFEED_CACHE_DIR", None)
+
+    results = {}  # type: Dict[str, ScenarioResult]
+    offset = 0
+
+    try:
+        for name in names:
+            results[name], used = await measure(
+                SCENARIOS[name], server, tickers, days, concurrency, repeat,
+                offset
+            )
+            offset += used
+
+    finally:
+        await server.stop()
+
+    return results
+
+
+def compare(
+    results: Dict[str, ScenarioResult], baseline: Dict[str, Dict[str, float]],
+    tolerance: float
+) -> bool:
+    """Prints how the results changed since the baseline.
+
+    Args:
+        results: The metrics of each scenario.
+        baseline: The metrics of each scenario saved by a previous run.
+        tolerance: The fraction a metric can get worse by before it counts as
+        a regression.
+
+    Returns:
+        True if no metric regressed. False otherwise.
+    """
+    passed = True
+
+    for name, result in results.items():
+        for metric in ("bars_per_sec", "p50_ms", "p99_ms", "peak_traced_kb"):
+            previous = baseline.get(name, {}).get(metric)
+            if not previous:
+                continue
+
+            current = getattr(result, metric)
+            change = (current - previous) / previous
+            worse = -change if metric not in LOWER_IS_BETTER else change
+
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                passed = False
+
+            print("%-13s %-15s %12s -> %12s (%+.1f%%)%s" % (
+                name, metric, previous, current, change * 100, flag
+            ))
+
+    return passed
+
+
+def main() -> None:
+    """Runs the benchmark suite.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--scenario", action="append", choices=list(SCENARIOS),
+        help="The scenarios to run. Runs all of them by default."
+    )
+    parser.add_argument("--tickers", default=",".join(DEFAULT_TICKERS))
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_CONCURRENCY
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--line-rate", type=int, default=0)
+    parser.add_argument("--save", help="A file to save the results to.")
+    parser.add_argument("--compare", help="A baseline to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="The fraction a metric can get worse by before failing."
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(run_suite(
+        args.scenario or list(SCENARIOS), args.tickers.split(","), args.days,
+        args.concurrency, args.repeat, args.latency, args.line_rate
+    ))
+
+    for name, result in results.items():
+        print("%-13s %7d bars/s  p50 %7.2fms  p99 %7.2fms  rss %d KiB  "
+              "traced %d KiB" % (
+                  name, result.bars_per_sec, result.p50_ms, result.p99_ms,
+                  result.peak_rss_kb, result.peak_traced_kb
+              ))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                name: result._asdict() for name, result in results.items()
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
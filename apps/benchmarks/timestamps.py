@@ -0,0 +1,105 @@
+"""Compares parsing IQFeed timestamps with strptime against the fixed width
+parser in field_readers.
+
+Run with: python -m benchmarks.timestamps
+"""
+
+from typing import Callable
+from typing import Final
+from typing import List
+import argparse
+import datetime
+import time
+
+from iqfeedserver.iq import field_readers
+
+
+BARS_PER_DAY: Final = 390
+DEFAULT_BARS: Final = 1000000
+
+
+def generate_timestamps(count: int) -> List[str]:
+    """Generates minute bar timestamps spanning as many trading days as
+    needed.
+
+    Args:
+        count: The number of timestamps to generate.
+
+    Returns:
+        The generated timestamps in IQFeed format.
+    """
+    timestamps = []  # type: List[str]
+    day = datetime.datetime(2019, 1, 2, 9, 31)
+
+    while len(timestamps) < count:
+        for minute in range(min(BARS_PER_DAY, count - len(timestamps))):
+            value = day + datetime.timedelta(minutes=minute)
+            timestamps.append(value.strftime("%Y-%m-%d %H:%M:%S"))
+
+        day += datetime.timedelta(days=1)
+
+    return timestamps
+
+
+def parse_with_strptime(timestamp: str) -> object:
+    """Parses a timestamp the way field_readers used to.
+
+    Args:
+        timestamp: The timestamp to parse.
+
+    Returns:
+        The parsed date and time.
+    """
+    value = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    return value.date(), value.time()
+
+
+def measure(parse: Callable[[str], object], timestamps: List[str]) -> float:
+    """Measures how long it takes to parse every timestamp.
+
+    Args:
+        parse: The function to parse a timestamp with.
+        timestamps: The timestamps to parse.
+
+    Returns:
+        The number of seconds taken.
+    """
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        parse(timestamp)
+
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bars", type=int, default=DEFAULT_BARS)
+    args = parser.parse_args()
+
+    timestamps = generate_timestamps(args.bars)
+
+    for timestamp in timestamps[:BARS_PER_DAY * 2]:
+        assert (
+            field_readers.convert_iqfeed_timestamp_to_date_and_time(timestamp)
+            == parse_with_strptime(timestamp)
+        )
+
+    baseline = measure(parse_with_strptime, timestamps)
+    fast = measure(
+        field_readers.convert_iqfeed_timestamp_to_date_and_time, timestamps
+    )
+
+    print("Parsed %d timestamps" % len(timestamps))
+    print("strptime:    %.3fs (%.0f bars/s)" % (
+        baseline, len(timestamps) / baseline
+    ))
+    print("fixed width: %.3fs (%.0f bars/s)" % (
+        fast, len(timestamps) / fast
+    ))
+    print("speedup:     %.1fx" % (baseline / fast))
+
+
+if __name__ == "__main__":
+    main()
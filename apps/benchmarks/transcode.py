@@ -0,0 +1,136 @@
+"""Compares turning IQFeed historical bar messages into BC messages by parsing
+the bars into a BarBatch against rewriting the text of the fields directly.
+
+Run with: python -m benchmarks.transcode
+"""
+
+from typing import Final
+from typing import List
+import argparse
+import time
+
+from benchmarks.timestamps import generate_timestamps
+from iqfeedserver import worker
+from iqfeedserver.iq import BarBatchBuilder
+from iqfeedserver.iq import field_readers
+
+
+BATCH_SIZE: Final = 1000
+DEFAULT_BARS: Final = 1000000
+PREFIX: Final = "B-AAPL-0060-s,BC,AAPL"
+
+
+def generate_fields(count: int) -> List[List[str]]:
+    """Generates the fields of historical bar messages.
+
+    Args:
+        count: The number of messages to generate.
+
+    Returns:
+        The fields of each message, starting with the ticker.
+    """
+    return [
+        [
+            "AAPL", timestamp, "%.2f" % (268 + i % 7), "%.2f" % (267 + i % 5),
+            "%.4f" % (267.5 + i % 3), "%.2f" % (267.25 + i % 11),
+            str(1000 * (i + 1)), "1000", str(10 + i % 13)
+        ]
+        for i, timestamp in enumerate(generate_timestamps(count))
+    ]
+
+
+def transcode_parsed(messages: List[List[str]]) -> int:
+    """Transcodes messages by parsing them into batches the way the worker
+    does by default.
+
+    Args:
+        messages: The fields of the messages to transcode.
+
+    Returns:
+        The number of bytes produced.
+    """
+    total = 0
+    builder = BarBatchBuilder("AAPL")
+
+    for start in range(0, len(messages), BATCH_SIZE):
+        for fields in messages[start:start + BATCH_SIZE]:
+            builder.append_historical_fields(fields)
+
+        total += len(worker.encode_messages(
+            worker.format_bars(builder.take(), "B-AAPL-0060-s")
+        ))
+
+    return total
+
+
+def transcode_passthrough(
+    messages: List[List[str]], validate: bool
+) -> int:
+    """Transcodes messages by rewriting their text the way the passthrough
+    mode does.
+
+    Args:
+        messages: The fields of the messages to transcode.
+        validate: Whether to check the shape of each message.
+
+    Returns:
+        The number of bytes produced.
+    """
+    total = 0
+
+    for start in range(0, len(messages), BATCH_SIZE):
+        lines = []  # type: List[str]
+
+        for fields in messages[start:start + BATCH_SIZE]:
+            (
+                _, timestamp, high_p, low_p, open_p, close_p, tot_vlm,
+                prd_vlm, num_trds
+            ) = fields
+
+            if validate:
+                field_readers.check_historical_fields(fields)
+
+            lines.append(",".join((
+                PREFIX, timestamp, open_p, high_p, low_p, close_p, tot_vlm,
+                prd_vlm, num_trds
+            )))
+
+        total += len(worker.encode_messages(lines))
+
+    return total
+
+
+def main() -> None:
+    """Runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bars", type=int, default=DEFAULT_BARS)
+    args = parser.parse_args()
+
+    messages = generate_fields(args.bars)
+
+    start = time.perf_counter()
+    transcode_parsed(messages)
+    parsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transcode_passthrough(messages, False)
+    raw = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transcode_passthrough(messages, True)
+    validated = time.perf_counter() - start
+
+    print("Transcoded %d bars" % len(messages))
+    for name, seconds in (
+        ("parsed:     ", parsed),
+        ("passthrough:", raw),
+        ("validated:  ", validated),
+    ):
+        print("%s %.3fs (%.0f bars/s, %.1fx)" % (
+            name, seconds, len(messages) / seconds, parsed / seconds
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,586 @@
+from typing import BinaryIO
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+from typing import TypeVar
+import contextlib
+import datetime
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import urllib.parse
+
+import numpy
+
+from iqfeedserver import iq
+from iqfeedserver.iq.bar_batch import COLUMNS
+from iqfeedserver.iq.tick_batch import TICK_COLUMNS
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_BYTES: Final = 10 * 1024 ** 3
+EXTENSION: Final = ".bars"
+HEADER: Final = struct.Struct("<4sHI")
+INDEX_FILE: Final = "index.json"
+INDEX_LOCK_FILE: Final = "index.lock"
+INDEX_SAVE_INTERVAL: Final = 60
+MAGIC: Final = b"IQBC"
+VERSION: Final = 1
+
+# Tick files hold blocks of ticks, each a count followed by the columns of
+# the block. Everything is 8 bytes wide so the columns can be memory mapped
+TICK_BLOCK_HEADER: Final = struct.Struct("<Q")
+TICK_EXTENSION: Final = ".ticks"
+TICK_HEADER: Final = struct.Struct("<4sHxx")
+TICK_MAGIC: Final = b"IQTC"
+
+T = TypeVar("T")
+
+
+class BarCache:
+    """Persists the bars of completed trading days on disk so they only need
+    to be pulled from IQFeed once. Each (ticker, date, interval) is stored in
+    its own columnar binary file, and a small JSON index tracks the size and
+    last access time of every file so the least recently used files can be
+    evicted once the cache grows past its size cap. The index is kept in
+    least recently used order along with the total size of the files, so
+    storing a file doesn't need to look at every entry. It's written to disk
+    at most every INDEX_SAVE_INTERVAL seconds and when the cache is flushed.
+
+    The ticks of each (ticker, date) are stored the same way, except that
+    tick files are memory mapped rather than read, since a day of ticks can
+    run to millions of rows.
+
+    Methods block on disk I/O and are safe to call from executor threads.
+    A shared cache can also be used by several processes at once. Each process
+    picks up the files written by the others and merges their index entries
+    whenever it writes the index, holding a lock on the index file so
+    processes writing at the same time don't drop each other's entries.
+    """
+
+    def __init__(
+        self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES,
+        shared: bool = False
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            directory: The directory to store the cache in.
+            max_bytes: The maximum number of bytes the cache can use on disk.
+            shared: Whether other processes use the same directory.
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._next_save = time.time() + INDEX_SAVE_INTERVAL
+        self._shared = shared
+
+        # The files tracked since the index was last written
+        self._unsaved = set()  # type: Set[str]
+
+        os.makedirs(directory, exist_ok=True)
+        self._index = self._load_index()
+        self._size = sum(size for size, _ in self._index.values())
+
+    @property
+    def size(self) -> int:
+        """Gets the number of bytes used by the cache on disk.
+        """
+        with self._lock:
+            return self._size
+
+    def get(
+        self, ticker: str, date: datetime.date, interval_len: int,
+        interval_type: iq.IntervalType = iq.IntervalType.SECONDS
+    ) -> Optional[iq.BarBatch]:
+        """Gets the cached bars for a ticker on a given date.
+
+        Args:
+            ticker: The ticker to get the bars for.
+            date: The date to get the bars for.
+            interval_len: The amount of time each bar represents.
+            interval_type: The type of time associated with the given
+            interval_len.
+
+        Returns:
+            The cached bars. None if the bars are not cached.
+        """
+        return self._load(
+            self._get_name(ticker, date, interval_len, interval_type),
+            lambda path: self._read(path, ticker)
+        )
+
+    def put(
+        self, ticker: str, date: datetime.date, interval_len: int,
+        interval_type: iq.IntervalType, bars: iq.BarBatch
+    ) -> bool:
+        """Stores the bars for a ticker on a given date. Bars for today or
+        later are never stored since the day isn't complete yet.
+
+        Args:
+            ticker: The ticker the bars belong to.
+            date: The date the bars belong to.
+            interval_len: The amount of time each bar represents.
+            interval_type: The type of time associated with the given
+            interval_len.
+            bars: The bars to store.
+
+        Returns:
+            True if the bars were stored. False otherwise.
+        """
+        if date >= datetime.date.today() or not bars:
+            return False
+
+        data = self._encode(bars)
+
+        return self._store(
+            self._get_name(ticker, date, interval_len, interval_type),
+            lambda f: f.write(data)
+        )
+
+    def get_ticks(
+        self, ticker: str, date: datetime.date
+    ) -> Optional[List[iq.TickBatch]]:
+        """Gets the cached ticks for a ticker on a given date. The ticks are
+        memory mapped, so they're only read from disk as they're used.
+
+        Args:
+            ticker: The ticker to get the ticks for.
+            date: The date to get the ticks for.
+
+        Returns:
+            The cached ticks, in blocks in the order they were stored. None if
+            the ticks are not cached.
+        """
+        return self._load(
+            self._get_tick_name(ticker, date),
+            lambda path: self._read_ticks(path, ticker)
+        )
+
+    def put_ticks(
+        self, ticker: str, date: datetime.date,
+        batches: Sequence[iq.TickBatch]
+    ) -> bool:
+        """Stores the ticks for a ticker on a given date. Each batch is
+        written as a block of its own, so the batches don't need to be joined
+        first. Ticks for today or later are never stored since the day isn't
+        complete yet.
+
+        Args:
+            ticker: The ticker the ticks belong to.
+            date: The date the ticks belong to.
+            batches: The ticks to store, in order.
+
+        Returns:
+            True if the ticks were stored. False otherwise.
+        """
+        if date >= datetime.date.today() or not any(batches):
+            return False
+
+        def write(f: BinaryIO) -> None:
+            f.write(TICK_HEADER.pack(TICK_MAGIC, VERSION))
+
+            for batch in batches:
+                if not batch:
+                    continue
+
+                f.write(TICK_BLOCK_HEADER.pack(len(batch)))
+                for column, (_, typecode) in zip(batch.columns, TICK_COLUMNS):
+                    f.write(numpy.ascontiguousarray(
+                        column, dtype="<" + typecode
+                    ).data)
+
+        return self._store(self._get_tick_name(ticker, date), write)
+
+    def flush(self) -> None:
+        """Writes the index to disk so access times survive restarts.
+        """
+        with self._lock:
+            self._persist()
+
+    @staticmethod
+    def _get_name(
+        ticker: str, date: datetime.date, interval_len: int,
+        interval_type: iq.IntervalType
+    ) -> str:
+        """Gets the name of the file to store bars in.
+
+        Args:
+            ticker: The ticker of the bars.
+            date: The date of the bars.
+            interval_len: The amount of time each bar represents.
+            interval_type: The type of time associated with the given
+            interval_len.
+
+        Returns:
+            The name of the file.
+        """
+        return "%s_%s_%d%s%s" % (
+            urllib.parse.quote(ticker, safe=""),
+            date.strftime("%Y%m%d"),
+            interval_len,
+            interval_type.value,
+            EXTENSION
+        )
+
+    @staticmethod
+    def _get_tick_name(ticker: str, date: datetime.date) -> str:
+        """Gets the name of the file to store ticks in.
+
+        Args:
+            ticker: The ticker of the ticks.
+            date: The date of the ticks.
+
+        Returns:
+            The name of the file.
+        """
+        return "%s_%s%s" % (
+            urllib.parse.quote(ticker, safe=""), date.strftime("%Y%m%d"),
+            TICK_EXTENSION
+        )
+
+    def _load(self, name: str, read: Callable[[str], T]) -> Optional[T]:
+        """Reads a file from the cache, and records that it was used.
+
+        Args:
+            name: The name of the file.
+            read: Called with the path of the file to read it.
+
+        Returns:
+            The data read from the file. None if the file is not cached.
+        """
+        with self._lock:
+            if name not in self._index and not self._adopt(name):
+                return None
+
+            try:
+                data = read(os.path.join(self._directory, name))
+
+            except (OSError, ValueError):
+                logger.exception("Unable to read cached data from %s", name)
+                self._remove(name)
+                return None
+
+            size, _ = self._index[name]
+            self._track(name, size, time.time())
+            return data
+
+    def _store(self, name: str, write: Callable[[BinaryIO], object]) -> bool:
+        """Writes a file to the cache, then evicts the least recently used
+        files if the cache has grown past its size cap.
+
+        Args:
+            name: The name of the file.
+            write: Called with the open file to write its contents.
+
+        Returns:
+            True if the file was written. False otherwise.
+        """
+        with self._lock:
+            path = os.path.join(self._directory, name)
+            temp_path = "%s.%d.tmp" % (path, os.getpid())
+
+            try:
+                with open(temp_path, "wb") as f:
+                    write(f)
+                    size = f.tell()
+
+                os.replace(temp_path, path)
+
+            except OSError:
+                logger.exception("Unable to write cached data to %s", name)
+
+                try:
+                    os.remove(temp_path)
+
+                except OSError:
+                    pass
+
+                return False
+
+            self._track(name, size, time.time())
+            self._unsaved.add(name)
+            self._evict()
+
+            if time.time() >= self._next_save:
+                self._persist()
+
+        return True
+
+    @staticmethod
+    def _encode(bars: iq.BarBatch) -> bytes:
+        """Encodes bars into the columnar file format.
+
+        Args:
+            bars: The bars to encode.
+
+        Returns:
+            The encoded bars.
+        """
+        return HEADER.pack(MAGIC, VERSION, len(bars)) + b"".join(
+            column.astype("<" + typecode, copy=False).tobytes()
+            for column, (_, typecode) in zip(bars.columns, COLUMNS)
+        )
+
+    @staticmethod
+    def _read(path: str, ticker: str) -> iq.BarBatch:
+        """Reads bars stored in the columnar file format.
+
+        Args:
+            path: The path of the file to read.
+            ticker: The ticker of the bars.
+
+        Returns:
+            The bars stored in the file.
+
+        Raises:
+            ValueError: If the file is not a valid bar file.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if len(data) < HEADER.size:
+            raise ValueError("Bar file is truncated")
+
+        magic, version, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Unknown bar file format")
+
+        columns = []  # type: List[numpy.ndarray]
+        offset = HEADER.size
+
+        for _, typecode in COLUMNS:
+            dtype = numpy.dtype("<" + typecode)
+            if offset + count * dtype.itemsize > len(data):
+                raise ValueError("Bar file is truncated")
+
+            columns.append(numpy.frombuffer(
+                data, dtype=dtype, count=count, offset=offset
+            ).astype(typecode, copy=False))
+            offset += count * dtype.itemsize
+
+        return iq.BarBatch(ticker, *columns)
+
+    @staticmethod
+    def _read_ticks(path: str, ticker: str) -> List[iq.TickBatch]:
+        """Memory maps ticks stored in the columnar file format.
+
+        Args:
+            path: The path of the file to read.
+            ticker: The ticker of the ticks.
+
+        Returns:
+            The blocks of ticks stored in the file. Their columns are views of
+            the mapped file.
+
+        Raises:
+            ValueError: If the file is not a valid tick file.
+        """
+        data = numpy.memmap(path, dtype=numpy.uint8, mode="r")
+
+        if len(data) < TICK_HEADER.size:
+            raise ValueError("Tick file is truncated")
+
+        magic, version = TICK_HEADER.unpack_from(data.data)
+        if magic != TICK_MAGIC or version != VERSION:
+            raise ValueError("Unknown tick file format")
+
+        batches = []  # type: List[iq.TickBatch]
+        offset = TICK_HEADER.size
+
+        while offset < len(data):
+            if offset + TICK_BLOCK_HEADER.size > len(data):
+                raise ValueError("Tick file is truncated")
+
+            count, = TICK_BLOCK_HEADER.unpack_from(data.data, offset)
+            offset += TICK_BLOCK_HEADER.size
+
+            columns = []  # type: List[numpy.ndarray]
+            for _, typecode in TICK_COLUMNS:
+                dtype = numpy.dtype("<" + typecode)
+                end = offset + count * dtype.itemsize
+                if end > len(data):
+                    raise ValueError("Tick file is truncated")
+
+                columns.append(data[offset:end].view(dtype))
+                offset = end
+
+            batches.append(iq.TickBatch(ticker, *columns))
+
+        return batches
+
+    def _adopt(self, name: str) -> bool:
+        """Starts tracking a file written by another process.
+
+        Args:
+            name: The name of the file.
+
+        Returns:
+            True if the file exists and is now tracked. False otherwise.
+        """
+        if not self._shared:
+            return False
+
+        try:
+            size = os.stat(os.path.join(self._directory, name)).st_size
+
+        except OSError:
+            return False
+
+        self._track(name, size, time.time())
+        self._unsaved.add(name)
+        return True
+
+    def _track(self, name: str, size: int, accessed: float) -> None:
+        """Records a file in the index as its most recently used file.
+
+        Args:
+            name: The name of the file.
+            size: The number of bytes in the file.
+            accessed: The time the file was last used.
+        """
+        self._untrack(name)
+        self._index[name] = (size, accessed)
+        self._size += size
+
+    def _untrack(self, name: str) -> None:
+        """Stops tracking a file in the index.
+
+        Args:
+            name: The name of the file.
+        """
+        entry = self._index.pop(name, None)
+        if entry:
+            self._size -= entry[0]
+
+    def _merge_index(self) -> None:
+        """Adds the entries written to the index on disk by other processes
+        and drops the entries for files they removed.
+        """
+        try:
+            with open(os.path.join(self._directory, INDEX_FILE)) as f:
+                others = json.load(f)
+
+        except (OSError, ValueError):
+            return
+
+        # Entries missing from the index on disk are either new to this
+        # process or were evicted by another one
+        index = {
+            name: entry for name, entry in self._index.items()
+            if name in others or name in self._unsaved
+        }
+
+        for name, (size, accessed) in others.items():
+            _, current = index.get(name, (0, 0.0))
+            index[name] = (int(size), max(float(accessed), current))
+
+        self._index = dict(sorted(index.items(), key=lambda item: item[1][1]))
+        self._size = sum(size for size, _ in self._index.values())
+
+    def _evict(self) -> None:
+        """Removes the least recently used files until the cache fits within
+        its size cap.
+        """
+        while self._size > self._max_bytes and self._index:
+            self._remove(next(iter(self._index)))
+
+    def _remove(self, name: str) -> None:
+        """Removes a file from the cache.
+
+        Args:
+            name: The name of the file to remove.
+        """
+        self._untrack(name)
+
+        try:
+            os.remove(os.path.join(self._directory, name))
+
+        except FileNotFoundError:
+            pass
+
+    def _load_index(self) -> Dict[str, Tuple[int, float]]:
+        """Loads the index from the files in the cache directory, with the
+        access times written to the index on disk. Files written since the
+        index was last written use their modification time.
+
+        Returns:
+            The mapping of file name to size and last access time, in least
+            recently used order.
+        """
+        try:
+            with open(os.path.join(self._directory, INDEX_FILE)) as f:
+                saved = {
+                    name: float(accessed)
+                    for name, (_, accessed) in json.load(f).items()
+                }
+
+        except (OSError, ValueError, TypeError):
+            saved = {}
+
+        index = {}  # type: Dict[str, Tuple[int, float]]
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith((EXTENSION, TICK_EXTENSION)):
+                stat = entry.stat()
+                index[entry.name] = (
+                    stat.st_size, saved.get(entry.name, stat.st_mtime)
+                )
+
+        return dict(sorted(index.items(), key=lambda item: item[1][1]))
+
+    def _persist(self) -> None:
+        """Writes the index to disk, first merging the entries written by
+        other processes when the cache is shared.
+        """
+        if self._shared:
+            with self._lock_index():
+                self._merge_index()
+                self._evict()
+                self._save_index()
+
+        else:
+            self._save_index()
+
+        self._unsaved.clear()
+        self._next_save = time.time() + INDEX_SAVE_INTERVAL
+
+    @contextlib.contextmanager
+    def _lock_index(self) -> Iterator[None]:
+        """Holds an exclusive lock shared with the other processes using the
+        cache while the index on disk is read and written.
+        """
+        with open(os.path.join(self._directory, INDEX_LOCK_FILE), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+            try:
+                yield
+
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _save_index(self) -> None:
+        """Writes the index to disk.
+        """
+        path = os.path.join(self._directory, INDEX_FILE)
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(self._index, f)
+
+            os.replace(temp_path, path)
+
+        except OSError:
+            logger.exception("Unable to write the bar cache index")
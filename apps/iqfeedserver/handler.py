@@ -1,17 +1,48 @@
+from typing import Final
 from typing import List
+from typing import Tuple
 import asyncio
+import datetime
+import functools
 import logging
 
+from iqfeedserver import iq
 from iqfeedserver import worker
+from iqfeedserver.heartbeat import HEARTBEAT_INTERVAL
+from iqfeedserver.heartbeat import HeartbeatScheduler
+from iqfeedserver.iq.field_readers import get_field
+from iqfeedserver.session import ClientSession
+from iqfeedserver.session import DEFAULT_MAX_JOBS
 
 
 logger = logging.getLogger(__name__)
 
 
+# Let whole responses be buffered before pausing so bulk replays only need to
+# wait for the socket to drain once
+WRITE_BUFFER_HIGH: Final = 4 * 1024 ** 2
+WRITE_BUFFER_LOW: Final = 1024 ** 2
+
+
 class IQFeedServerHandler:
     """A mock IQFeed server that handles and sends requests.
     """
 
+    def __init__(
+        self, max_jobs: int = DEFAULT_MAX_JOBS,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            max_jobs: The maximum number of requests to process at the same
+            time for each client.
+            heartbeat_interval: The number of seconds a client can stay idle
+            before it is sent a heartbeat.
+        """
+        self._heartbeats = HeartbeatScheduler(heartbeat_interval)
+        self._max_jobs = max_jobs
+
     async def handle(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ) -> None:
@@ -22,34 +53,40 @@ class IQFeedServerHandler:
             reader: The reader to receive messages from the client.
             writer: The writer to send messages to the client.
         """
+        writer.transport.set_write_buffer_limits(
+            high=WRITE_BUFFER_HIGH, low=WRITE_BUFFER_LOW
+        )
+
+        session = ClientSession(reader, writer, self._max_jobs)
+        self._heartbeats.register(writer)
+
         try:
             while True:
-                if not await self.process_messages(reader, writer):
+                if not await self.process_messages(session):
                     return
 
         except Exception:
             logger.exception("Error occurred")
 
         finally:
+            self._heartbeats.unregister(writer)
+            await session.close()
             writer.close()
 
-    async def process_messages(
-        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
-    ) -> bool:
+    async def process_messages(self, session: ClientSession) -> bool:
         """Processes messages received from the client.
 
         Args:
-            reader: The reader to receive messages from the client.
-            writer: The writer to send messages to the client.
+            session: The session of the client to process messages for.
 
         Returns:
             True if the message was processed successfully. False if the client
             has disconnected.
         """
         try:
-            message = await self._get_message(reader, writer)
+            message = await self._get_message(session)
 
-        except BrokenPipeError:
+        except ConnectionError:
             return False
 
         if not message:
@@ -59,74 +96,156 @@ class IQFeedServerHandler:
 
         # Connected? Ok
         if message == "S,CONNECT":
-            return await self._send(writer, ["S,SERVER CONNECTED"])
+            return await self._send(session, ["S,SERVER CONNECTED"])
 
         # If the client requests a ticker, add it to the jobs queue
         elif message.startswith("BW,"):
             message_split = message.split(",")
             ticker = message_split[1]
-            date = message_split[3].split(" ")[0]
 
-            messages = await worker.process_job(ticker, date)
-            return await self._send(writer, messages)
+            try:
+                start, interval, days = self._parse_watch(message_split)
+
+            except ValueError as e:
+                logger.warning("Invalid request %s: %s", message, e)
+                return await self._send(session, ["n," + ticker])
+
+            # Live watches never end on their own, so they can't take up
+            # the slots replays are waiting for
+            session.submit(ticker, functools.partial(
+                worker.process_job, ticker, start, interval, days
+            ), limited=not worker.is_live_job(start, days))
+
+        # Tick requests are answered like IQFeed's lookup port would
+        elif message.startswith("HTT,"):
+            message_split = message.split(",")
+            ticker = message_split[1]
+
+            try:
+                start, end, request_id = self._parse_ticks(message_split)
+
+            except ValueError as e:
+                logger.warning("Invalid request %s: %s", message, e)
+                request_id = get_field(message_split, 8) or ticker
+                return await self._send(session, [
+                    "%s,E,Invalid request.," % request_id,
+                    request_id + ",!ENDMSG!,"
+                ])
+
+            session.submit(ticker, functools.partial(
+                worker.process_tick_job, ticker, start, end, request_id
+            ))
+
+        # If the client no longer wants a ticker, stop working on it
+        elif message.startswith("BR,"):
+            session.cancel(message.split(",")[1])
 
         return True
 
-    @classmethod
-    async def _get_message(
-        cls, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
-    ) -> str:
-        """Gets the next message.
+    async def _get_message(self, session: ClientSession) -> str:
+        """Gets the next message. Idle clients are sent heartbeats by the
+        heartbeat scheduler while waiting.
 
         Args:
-            reader: The reader to receive messages from the client.
-            writer: The writer to send messages to the client.
+            session: The session of the client to get the message from.
 
         Returns:
             The next message received from the client.
+
+        Raises:
+            BrokenPipeError: If the client disconnected.
         """
-        message = ""
+        line = await session.reader.readline()
+        if not line:
+            raise BrokenPipeError("Client disconnected")
 
-        try:
-            line = await asyncio.wait_for(reader.readline(), timeout=5)
-            message = line.decode("latin-1").strip()
+        self._heartbeats.touch(session.writer)
+        return line.decode("latin-1").strip()
 
-        except asyncio.TimeoutError:
-            pass
+    @staticmethod
+    def _parse_watch(
+        message_split: List[str]
+    ) -> Tuple[datetime.datetime, int, int]:
+        """Parses the fields of a BW message.
 
-        # Check that we're still connected if we didn't get a message
-        if not message and not await cls._send(writer, ["S,SERVER CONNECTED"]):
-            raise BrokenPipeError("Client disconnected")
+        Args:
+            message_split: The fields of the BW message.
+
+        Returns:
+            The time to start replaying from, the number of seconds in each
+            bar, and the number of trading days to replay. The number of days
+            is capped at worker.get_max_days().
+
+        Raises:
+            ValueError: If the message has an invalid or unsupported field.
+        """
+        fields = message_split + [""] * (10 - len(message_split))
+        interval_len, begin, max_days, interval_type = (
+            fields[2], fields[3], fields[4], fields[9]
+        )
 
-        return message
+        if interval_type not in ("", iq.IntervalType.SECONDS.value):
+            raise ValueError("Unsupported interval type %s" % interval_type)
+
+        interval = int(interval_len) if interval_len \
+            else worker.DEFAULT_INTERVAL
+        days = int(max_days) if max_days else 1
+
+        if interval < 1 or days < 1:
+            raise ValueError("Interval and days must be positive")
+
+        # MaxDays is a limit, so a larger one is served as the most days a
+        # single request can replay
+        days = min(days, worker.get_max_days())
+
+        start = datetime.datetime.strptime(
+            begin, "%Y%m%d %H%M%S" if " " in begin else "%Y%m%d"
+        )
+
+        return start, interval, days
 
     @staticmethod
-    async def _send(
-        writer: asyncio.StreamWriter, messages: List[str]
-    ) -> bool:
-        """Sends a message back to the client.
+    def _parse_ticks(
+        message_split: List[str]
+    ) -> Tuple[datetime.datetime, datetime.datetime, str]:
+        """Parses the fields of an HTT message.
 
         Args:
-            writer: The writer to send messages to the client.
-            messages: The list of messages to send to the client.
+            message_split: The fields of the HTT message.
 
         Returns:
-            True if the messages were sent successfully. False otherwise.
+            The start and end of the period to replay the ticks of, and the
+            request ID to tag the ticks with. The period ends with the day it
+            starts on if no end is given.
 
         Raises:
-            RuntimeError: If not connected.
+            ValueError: If the message has an invalid field.
         """
-        for message in messages:
-            logger.debug("Sending: %s", message)
+        fields = message_split + [""] * (9 - len(message_split))
+        begin, end, request_id = fields[2], fields[3], fields[8]
 
-            encoded_message = (message + "\r\n").encode("latin-1")
+        start = datetime.datetime.strptime(begin, "%Y%m%d %H%M%S")
+        stop = datetime.datetime.strptime(end, "%Y%m%d %H%M%S") if end \
+            else datetime.datetime.combine(start.date(), datetime.time.max)
 
-            try:
-                writer.write(encoded_message)
-                await writer.drain()
+        if stop < start:
+            raise ValueError("The period ends before it starts")
 
-            except Exception:
-                logger.info("Client disconnected")
-                return False
+        return start, stop, request_id or fields[1]
 
-        return True
+    @staticmethod
+    async def _send(session: ClientSession, messages: List[str]) -> bool:
+        """Sends a message back to the client.
+
+        Args:
+            session: The session of the client to send the messages to.
+            messages: The list of messages to send to the client.
+
+        Returns:
+            True if the messages were sent successfully. False otherwise.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            for message in messages:
+                logger.debug("Sending: %s", message)
+
+        return await session.send(worker.encode_messages(messages))
@@ -0,0 +1,124 @@
+from typing import Final
+from typing import Optional
+import asyncio
+import collections
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# The number of seconds a client can stay quiet before it is sent a heartbeat
+HEARTBEAT_INTERVAL: Final = 5.0
+HEARTBEAT_MESSAGE: Final = b"S,SERVER CONNECTED\r\n"
+
+
+class HeartbeatScheduler:
+    """Sends heartbeats to every client that has been idle for longer than the
+    heartbeat interval, using a single timer for the whole server.
+
+    Every client shares the same interval, so clients kept in order of their
+    last activity are also in order of their deadlines. Recording activity
+    only moves a client to the back of the queue, and the timer is set for the
+    client at the front, so no timer is created per client or per read. Dead
+    clients are detected by their connection closing rather than by the
+    heartbeat failing.
+    """
+
+    def __init__(
+        self, interval: float = HEARTBEAT_INTERVAL,
+        message: bytes = HEARTBEAT_MESSAGE
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            interval: The number of seconds a client can stay idle before it is
+            sent a heartbeat.
+            message: The encoded heartbeat to send.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        self._clients = collections.OrderedDict(
+        )  # type: collections.OrderedDict[asyncio.StreamWriter, float]
+        self._interval = interval
+        self._message = message
+        self._sent = 0
+        self._timer = None  # type: Optional[asyncio.TimerHandle]
+
+    @property
+    def clients(self) -> int:
+        """Gets the number of clients being sent heartbeats.
+        """
+        return len(self._clients)
+
+    @property
+    def sent(self) -> int:
+        """Gets the number of heartbeats sent.
+        """
+        return self._sent
+
+    def register(self, writer: asyncio.StreamWriter) -> None:
+        """Starts sending heartbeats to a client.
+
+        Args:
+            writer: The writer to send the heartbeats to.
+        """
+        self.touch(writer)
+
+        if not self._timer:
+            self._schedule()
+
+    def touch(self, writer: asyncio.StreamWriter) -> None:
+        """Records activity from a client, postponing its next heartbeat.
+
+        Args:
+            writer: The writer of the client.
+        """
+        self._clients[writer] = asyncio.get_running_loop().time()
+        self._clients.move_to_end(writer)
+
+    def unregister(self, writer: asyncio.StreamWriter) -> None:
+        """Stops sending heartbeats to a client.
+
+        Args:
+            writer: The writer of the client.
+        """
+        self._clients.pop(writer, None)
+
+        if not self._clients and self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule(self) -> None:
+        """Sets the timer for the next client due a heartbeat.
+        """
+        self._timer = None
+        if not self._clients:
+            return
+
+        last_activity = next(iter(self._clients.values()))
+        self._timer = asyncio.get_running_loop().call_at(
+            last_activity + self._interval, self._beat
+        )
+
+    def _beat(self) -> None:
+        """Sends heartbeats to every client that is due one.
+        """
+        now = asyncio.get_running_loop().time()
+
+        while self._clients:
+            writer, last_activity = next(iter(self._clients.items()))
+            if last_activity + self._interval > now:
+                break
+
+            # The client's handler unregisters it once it notices the close
+            if writer.is_closing():
+                del self._clients[writer]
+                continue
+
+            writer.write(self._message)
+            self._sent += 1
+            self.touch(writer)
+
+        self._schedule()
@@ -13,11 +13,27 @@ class IntervalType(enum.Enum):
 
 from iqfeedserver.iq.bars import Bar
 from iqfeedserver.iq.bars import DailyBar
+from iqfeedserver.iq.daily_bar_table import DailyBarTable
+from iqfeedserver.iq.bar_batch import BarBatch
+from iqfeedserver.iq.bar_batch import BarBatchBuilder
+from iqfeedserver.iq.bar_batch import BarResampler
+from iqfeedserver.iq.tick_batch import TickBatch
+from iqfeedserver.iq.tick_batch import TickBatchBuilder
+from iqfeedserver.iq.limiter import AdaptiveLimiter
+from iqfeedserver.iq.limiter import LimiterStats
 from iqfeedserver.iq.conn import Conn
 from iqfeedserver.iq.conn import ConnectionState
 from iqfeedserver.iq.conn import HandlerResult
 from iqfeedserver.iq.conn import IQFeedError
 from iqfeedserver.iq.conn import NoDataError
 from iqfeedserver.iq.conn import TerminationStyle
+from iqfeedserver.iq.dispatch import BarDispatcher
+from iqfeedserver.iq.dispatch import OverflowPolicy
+from iqfeedserver.iq.dispatch import SubscriberStats
 from iqfeedserver.iq.bar_conn import BarConn
+from iqfeedserver.iq.history_conn import BarRequest
+from iqfeedserver.iq.history_conn import BarResult
+from iqfeedserver.iq.history_conn import DailyBarResult
 from iqfeedserver.iq.history_conn import HistoryConn
+from iqfeedserver.iq.pool import HistoryConnPool
+from iqfeedserver.iq.pool import PoolStats
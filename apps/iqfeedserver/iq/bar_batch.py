@@ -0,0 +1,422 @@
+from typing import Final
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Union
+import array
+import datetime
+
+import numpy
+
+from iqfeedserver.iq import Bar
+from iqfeedserver.iq import field_readers
+
+
+# Column name and array typecode, in the order they are stored
+COLUMNS: Final = (
+    ("timestamps", "q"),
+    ("open_p", "d"),
+    ("high_p", "d"),
+    ("low_p", "d"),
+    ("close_p", "d"),
+    ("tot_vlm", "q"),
+    ("prd_vlm", "q"),
+    ("num_trds", "q"),
+)
+
+
+class BarBatch:
+    """Stores the bars of a single ticker as columns of NumPy arrays instead of
+    a Bar per interval. Timestamps are the number of seconds since the epoch,
+    kept in IQFeed's time zone.
+
+    Indexing or iterating over a batch produces Bar instances so it can be used
+    anywhere a list of bars is expected.
+    """
+
+    def __init__(
+        self, ticker: str, timestamps: numpy.ndarray, open_p: numpy.ndarray,
+        high_p: numpy.ndarray, low_p: numpy.ndarray, close_p: numpy.ndarray,
+        tot_vlm: numpy.ndarray, prd_vlm: numpy.ndarray,
+        num_trds: numpy.ndarray
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            ticker: The ticker the bars belong to.
+            timestamps: The int64 end time of each bar.
+            open_p: The float64 open price of each bar.
+            high_p: The float64 high price of each bar.
+            low_p: The float64 low price of each bar.
+            close_p: The float64 close price of each bar.
+            tot_vlm: The int64 total volume for the day as of each bar.
+            prd_vlm: The int64 volume during each bar.
+            num_trds: The int64 number of trades during each bar.
+        """
+        self.ticker = ticker
+        self.timestamps = timestamps
+        self.open_p = open_p
+        self.high_p = high_p
+        self.low_p = low_p
+        self.close_p = close_p
+        self.tot_vlm = tot_vlm
+        self.prd_vlm = prd_vlm
+        self.num_trds = num_trds
+
+    @classmethod
+    def empty(cls, ticker: str) -> "BarBatch":
+        """Creates a batch without any bars.
+
+        Args:
+            ticker: The ticker the batch is for.
+
+        Returns:
+            The empty batch.
+        """
+        return cls(ticker, *(
+            numpy.empty(0, dtype=typecode) for _, typecode in COLUMNS
+        ))
+
+    @classmethod
+    def from_bars(cls, ticker: str, bars: Sequence[Bar]) -> "BarBatch":
+        """Creates a batch from a list of bars.
+
+        Args:
+            ticker: The ticker the bars belong to.
+            bars: The bars to store in the batch.
+
+        Returns:
+            The batch containing the bars.
+        """
+        builder = BarBatchBuilder(ticker)
+        for bar in bars:
+            builder.append(bar)
+
+        return builder.build()
+
+    @classmethod
+    def concatenate(
+        cls, ticker: str, batches: Sequence["BarBatch"]
+    ) -> "BarBatch":
+        """Joins batches of bars together into a single batch.
+
+        Args:
+            ticker: The ticker the bars belong to.
+            batches: The batches to join, in order.
+
+        Returns:
+            The joined batch.
+        """
+        if not batches:
+            return cls.empty(ticker)
+
+        if len(batches) == 1:
+            return batches[0]
+
+        return cls(ticker, *(
+            numpy.concatenate(columns)
+            for columns in zip(*(batch.columns for batch in batches))
+        ))
+
+    @property
+    def columns(self) -> List[numpy.ndarray]:
+        """Gets the columns of the batch in the order listed in COLUMNS.
+        """
+        return [getattr(self, name) for name, _ in COLUMNS]
+
+    @property
+    def nbytes(self) -> int:
+        """Gets the number of bytes used by the columns of the batch.
+        """
+        return sum(column.nbytes for column in self.columns)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index: int) -> Bar:
+        timestamp = field_readers.convert_epoch_to_datetime(
+            int(self.timestamps[index])
+        )
+
+        return Bar(
+            date=timestamp.date(),
+            time=timestamp.time(),
+            open_p=float(self.open_p[index]),
+            high_p=float(self.high_p[index]),
+            low_p=float(self.low_p[index]),
+            close_p=float(self.close_p[index]),
+            tot_vlm=int(self.tot_vlm[index]),
+            prd_vlm=int(self.prd_vlm[index]),
+            num_trds=int(self.num_trds[index]),
+            ticker=self.ticker
+        )
+
+    def __iter__(self) -> Iterator[Bar]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def slice(self, start: int, stop: int) -> "BarBatch":
+        """Gets a batch of a range of bars. The columns of the returned batch
+        are views of this batch's columns, so no data is copied.
+
+        Args:
+            start: The index of the first bar to include.
+            stop: The index after the last bar to include.
+
+        Returns:
+            The batch containing the range of bars.
+        """
+        return BarBatch(self.ticker, *(
+            column[start:stop] for column in self.columns
+        ))
+
+    def since(self, timestamp: int) -> "BarBatch":
+        """Gets the bars at or after a time. Timestamps are sorted, so the
+        first bar is found with a binary search and no data is copied.
+
+        Args:
+            timestamp: The earliest timestamp to include, in seconds since the
+            epoch.
+
+        Returns:
+            The batch containing the bars at or after the time.
+        """
+        return self.slice(
+            int(numpy.searchsorted(self.timestamps, timestamp)), len(self)
+        )
+
+    def to_bars(self) -> List[Bar]:
+        """Converts the batch to a list of bars.
+
+        Returns:
+            The bars in the batch.
+        """
+        return list(self)
+
+
+class BarBatchBuilder:
+    """Accumulates bars into growable typed buffers and turns them into a
+    BarBatch without creating any intermediate Bar instances.
+    """
+
+    def __init__(self, ticker: str) -> None:
+        """Instantiates the instance.
+
+        Args:
+            ticker: The ticker of the bars being built.
+        """
+        self._ticker = ticker
+        self._timestamps = array.array("q")
+        self._open_p = array.array("d")
+        self._high_p = array.array("d")
+        self._low_p = array.array("d")
+        self._close_p = array.array("d")
+        self._tot_vlm = array.array("q")
+        self._prd_vlm = array.array("q")
+        self._num_trds = array.array("q")
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def append(self, bar: Bar) -> None:
+        """Adds a bar to the batch.
+
+        Args:
+            bar: The bar to add.
+        """
+        self._timestamps.append(field_readers.convert_datetime_to_epoch(
+            datetime.datetime.combine(bar.date, bar.time)
+        ))
+        self._open_p.append(bar.open_p)
+        self._high_p.append(bar.high_p)
+        self._low_p.append(bar.low_p)
+        self._close_p.append(bar.close_p)
+        self._tot_vlm.append(bar.tot_vlm)
+        self._prd_vlm.append(bar.prd_vlm)
+        self._num_trds.append(bar.num_trds)
+
+    def append_historical_fields(self, fields: List[str]) -> None:
+        """Adds a bar from the fields of an IQFeed historical bar message.
+
+        Args:
+            fields: The fields of the message, starting with the ticker.
+
+        Raises:
+            ValueError: If invalid fields were provided.
+        """
+        (
+            _, timestamp, high_p, low_p, open_p, close_p, tot_vlm,
+            prd_vlm, num_trds
+        ) = fields
+
+        # Convert everything before appending so a bad field can't leave the
+        # columns with different lengths
+        values = (
+            field_readers.convert_iqfeed_timestamp_to_epoch(timestamp),
+            float(open_p),
+            float(high_p),
+            float(low_p),
+            float(close_p),
+            int(tot_vlm),
+            int(prd_vlm),
+            int(num_trds)
+        )
+
+        self._timestamps.append(values[0])
+        self._open_p.append(values[1])
+        self._high_p.append(values[2])
+        self._low_p.append(values[3])
+        self._close_p.append(values[4])
+        self._tot_vlm.append(values[5])
+        self._prd_vlm.append(values[6])
+        self._num_trds.append(values[7])
+
+    def take(self) -> BarBatch:
+        """Creates a batch from the bars added since the last call and starts
+        collecting a new batch. Unlike build(), the builder can keep being
+        used afterwards.
+
+        Returns:
+            The batch of bars added since the last call.
+        """
+        batch = BarBatch(self._ticker, *(
+            numpy.array(getattr(self, "_" + name), dtype=typecode)
+            for name, typecode in COLUMNS
+        ))
+
+        for name, _ in COLUMNS:
+            del getattr(self, "_" + name)[:]
+
+        return batch
+
+    def build(self) -> BarBatch:
+        """Creates the batch from the bars added so far. The NumPy arrays share
+        memory with the builder's buffers, so the builder must not be used
+        after calling this.
+
+        Returns:
+            The batch of bars.
+        """
+        return BarBatch(self._ticker, *(
+            numpy.frombuffer(getattr(self, "_" + name), dtype=typecode)
+            for name, typecode in COLUMNS
+        ))
+
+
+class BarResampler:
+    """Aggregates a stream of bars into bars of a longer interval. Each
+    resampled bar covers the bars whose end times fall into the same interval,
+    and is timestamped with the end of its interval like IQFeed's own bars.
+    IQFeed counts intervals from the start of the request, so bars resampled
+    with that start as their origin line up with the bars IQFeed would send.
+
+    Bars are fed in batches. A bar is only produced once every bar in its
+    interval has been seen.
+    """
+
+    def __init__(
+        self, ticker: str, interval: int, origin: Optional[int] = None
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            ticker: The ticker of the bars being resampled.
+            interval: The number of seconds in each resampled bar.
+            origin: The timestamp to count intervals from. Intervals are
+            counted from the midnight starting each bar's day if None.
+        """
+        if interval < 1:
+            raise ValueError("interval must be at least 1")
+
+        self._interval = interval
+        self._origin = origin
+        self._pending = BarBatch.empty(ticker)
+        self._ticker = ticker
+
+    def feed(self, bars: BarBatch) -> BarBatch:
+        """Adds a batch of bars.
+
+        Args:
+            bars: The bars to add, in order.
+
+        Returns:
+            The resampled bars of every interval that is now complete.
+        """
+        bars = BarBatch.concatenate(self._ticker, [self._pending, bars])
+        if not bars:
+            return bars
+
+        ends = self._get_interval_ends(bars)
+
+        # Hold back the last interval unless its final bar has arrived
+        if bars.timestamps[-1] == ends[-1]:
+            complete = len(bars)
+        else:
+            complete = int(numpy.searchsorted(ends, ends[-1]))
+
+        self._pending = bars.slice(complete, len(bars))
+        return self._aggregate(bars.slice(0, complete), ends[:complete])
+
+    def flush(self) -> BarBatch:
+        """Resamples the bars of the last interval, even if it isn't complete.
+
+        Returns:
+            The resampled bars that were held back.
+        """
+        bars = self._pending
+        self._pending = BarBatch.empty(self._ticker)
+        return self._aggregate(bars, self._get_interval_ends(bars))
+
+    def _get_interval_ends(self, bars: BarBatch) -> numpy.ndarray:
+        """Gets the end time of the interval each bar belongs to.
+
+        Args:
+            bars: The bars to get the intervals of.
+
+        Returns:
+            The end time of each bar's interval.
+        """
+        if self._origin is not None:
+            origins = self._origin  # type: Union[int, numpy.ndarray]
+
+        else:
+            # Count intervals from the midnight starting each bar's day, so
+            # intervals that don't divide a day line up the same way every
+            # day. A bar ending at midnight belongs to the day before.
+            origins = (bars.timestamps - 1) // \
+                field_readers.SECONDS_PER_DAY * field_readers.SECONDS_PER_DAY
+
+        return origins + -(
+            -(bars.timestamps - origins) // self._interval
+        ) * self._interval
+
+    def _aggregate(self, bars: BarBatch, ends: numpy.ndarray) -> BarBatch:
+        """Combines the bars of each interval into a single bar.
+
+        Args:
+            bars: The bars to combine, in order.
+            ends: The end time of each bar's interval.
+
+        Returns:
+            One bar for each interval.
+        """
+        if not bars:
+            return bars
+
+        starts = numpy.flatnonzero(
+            numpy.concatenate(([True], ends[1:] != ends[:-1]))
+        )
+        lasts = numpy.concatenate((starts[1:], [len(bars)])) - 1
+
+        return BarBatch(
+            self._ticker,
+            ends[starts],
+            bars.open_p[starts],
+            numpy.maximum.reduceat(bars.high_p, starts),
+            numpy.minimum.reduceat(bars.low_p, starts),
+            bars.close_p[lasts],
+            bars.tot_vlm[lasts],
+            numpy.add.reduceat(bars.prd_vlm, starts),
+            numpy.add.reduceat(bars.num_trds, starts)
+        )
@@ -3,14 +3,21 @@ from typing import Callable
 from typing import Dict
 from typing import Final
 from typing import List
+from typing import Optional
+import array
 import datetime
 import logging
 
+from iqfeedserver.iq import AdaptiveLimiter
 from iqfeedserver.iq import Bar
 from iqfeedserver.iq import Conn
 from iqfeedserver.iq import field_readers
 from iqfeedserver.iq import HandlerResult
 from iqfeedserver.iq import IntervalType
+from iqfeedserver.iq.dispatch import BarDispatcher
+from iqfeedserver.iq.dispatch import DEFAULT_QUEUE_SIZE
+from iqfeedserver.iq.dispatch import OverflowPolicy
+from iqfeedserver.iq.dispatch import SubscriberStats
 from iqfeedserver.iq.field_readers import get_field
 
 
@@ -21,40 +28,115 @@ HISTORY_BAR: Final = "BH"
 LIVE_BAR: Final = "BC"
 NO_DATA: Final = "n"
 
+# The number of tickers space is set aside for when a connection is created.
+# The space doubles whenever it runs out
+INITIAL_SLOTS: Final = 64
+
+# The timestamp of a slot that hasn't received a live bar yet
+NO_BAR: Final = -1
+
 
 class BarConn(Conn):
     """Let's you get live data as interval bar data.
+
+    Bars are handed to the registered callbacks through a BarDispatcher, so
+    reading from IQFeed never waits on a callback unless the callback's queue
+    is full and it was registered with OverflowPolicy.BLOCK.
+
+    IQFeed repeats live bars that haven't changed, so only the timestamp and
+    total volume of the last live bar of each watched ticker are kept to
+    filter out repeats. They're stored in slots of two preallocated arrays.
+    A ticker's slot is set aside when it's watched and freed when it's
+    unwatched.
     """
 
-    _history_bar_handlers = []  # type: List[Callable[[Bar], Awaitable[None]]]
-    _last_bar = {}  # type: Dict[str, Bar]
-    _live_bar_handlers = []  # type: List[Callable[[Bar], Awaitable[None]]]
+    def __init__(self, limiter: Optional[AdaptiveLimiter] = None) -> None:
+        """Instantiates the instance.
+
+        Args:
+            limiter: Limits the number of commands in flight to IQFeed.
+            Commands aren't limited if None.
+        """
+        super().__init__(limiter)
+
+        # Keep the callbacks of each connection apart so bars received by
+        # one connection aren't handed to the callbacks of another
+        self._history_bar_dispatcher = BarDispatcher()
+        self._live_bar_dispatcher = BarDispatcher()
+        self._disconnect_callbacks = [
+        ]  # type: List[Callable[[], Awaitable[None]]]
+        self._no_data_callbacks = [
+        ]  # type: List[Callable[[str], Awaitable[None]]]
+
+        self._free_slots = list(range(INITIAL_SLOTS - 1, -1, -1))
+        self._slots = {}  # type: Dict[str, int]
+        self._timestamps = array.array("q", [NO_BAR]) * INITIAL_SLOTS
+        self._tot_vlms = array.array("q", [0]) * INITIAL_SLOTS
+
+    @property
+    def subscriber_stats(self) -> List[SubscriberStats]:
+        """Gets the metrics of the history bar callbacks followed by the live
+        bar callbacks.
+        """
+        return self._history_bar_dispatcher.stats + \
+            self._live_bar_dispatcher.stats
 
     def register_history_bar_callback(
-        self, callback: Callable[[Bar], Awaitable[None]]
+        self, callback: Callable[[Bar], Awaitable[None]],
+        max_size: int = DEFAULT_QUEUE_SIZE,
+        policy: OverflowPolicy = OverflowPolicy.BLOCK
     ) -> None:
         """Registers a callback for processing history bars.
 
         Args:
             callback: The callback to call when a new history bar is received
             by IQFeed.
+            max_size: The number of bars that can be queued for the callback.
+            policy: What to do with a bar when the callback's queue is full.
         """
-        self._history_bar_handlers.append(callback)
+        self._history_bar_dispatcher.subscribe(callback, max_size, policy)
 
     def register_live_bar_callback(
-        self, callback: Callable[[Bar], Awaitable[None]]
+        self, callback: Callable[[Bar], Awaitable[None]],
+        max_size: int = DEFAULT_QUEUE_SIZE,
+        policy: OverflowPolicy = OverflowPolicy.BLOCK
     ) -> None:
         """Registers a callback for processing live bars.
 
         Args:
             callback: The callback to call when a new live bar is received
             by IQFeed.
+            max_size: The number of bars that can be queued for the callback.
+            policy: What to do with a bar when the callback's queue is full.
         """
-        self._live_bar_handlers.append(callback)
+        self._live_bar_dispatcher.subscribe(callback, max_size, policy)
+
+    def register_no_data_callback(
+        self, callback: Callable[[str], Awaitable[None]]
+    ) -> None:
+        """Registers a callback for tickers IQFeed has no data for. IQFeed
+        stops watching a ticker once it sends this.
+
+        Args:
+            callback: The callback to call with the ticker.
+        """
+        self._no_data_callbacks.append(callback)
+
+    def register_disconnect_callback(
+        self, callback: Callable[[], Awaitable[None]]
+    ) -> None:
+        """Registers a callback for when the connection to IQFeed is lost.
+        Isn't called when disconnect() is called.
+
+        Args:
+            callback: The callback to call once the connection is lost.
+        """
+        self._disconnect_callbacks.append(callback)
 
     async def watch(
         self, ticker: str, start: datetime.datetime, interval_len: int = 60,
-        interval_type: IntervalType = IntervalType.SECONDS
+        interval_type: IntervalType = IntervalType.SECONDS,
+        req_id: str = ""
     ) -> None:
         """Signals to IQFeed that we want to watch a ticker.
 
@@ -64,11 +146,15 @@ class BarConn(Conn):
             interval_len: The amount of time each bar should represent.
             interval_type: The type of time associated with the given
             interval_len.
+            req_id: The request ID IQFeed tags the bars of the watch with.
         """
+        # Forget the last bar of a previous watch of the ticker
+        self._timestamps[self._get_slot(ticker)] = NO_BAR
+
         await self.send_cmd(
             f"BW,{ticker},{interval_len}," +
             field_readers.convert_datetime_to_iqfeed_format(start) +
-            f",,,,,,{interval_type.value},,"
+            f",,,,,{req_id},{interval_type.value},,"
         )
 
     async def unwatch(self, ticker: str) -> None:
@@ -79,6 +165,10 @@ class BarConn(Conn):
         """
         await self.send_cmd("BR,%s" % ticker)
 
+        slot = self._slots.pop(ticker, None)
+        if slot is not None:
+            self._free_slots.append(slot)
+
     async def disconnect(self) -> None:
         """Disconnect from the socket to IQFeed. Call this to ensure sockets
         are closed and we exit cleanly.
@@ -86,9 +176,15 @@ class BarConn(Conn):
         Raises:
             RuntimeError: If the writer is not connected.
         """
-        await super().disconnect()
-        self._history_bar_handlers = []
-        self._live_bar_handlers = []
+        try:
+            await super().disconnect()
+
+        finally:
+            await self._history_bar_dispatcher.close()
+            await self._live_bar_dispatcher.close()
+
+            self._free_slots.extend(self._slots.values())
+            self._slots.clear()
 
     async def handle_fields(self, fields: List[str]) -> HandlerResult:
         """Called when a message is received from IQFeed. Determines if we've
@@ -102,7 +198,16 @@ class BarConn(Conn):
             HandlerResult.UNKNOWN_MESSAGE otherwise.
         """
         if get_field(fields, 0) == NO_DATA:
-            logger.error("No data for %s", get_field(fields, 1))
+            ticker = get_field(fields, 1)
+            logger.info("No data for %s", ticker)
+
+            for callback in self._no_data_callbacks:
+                try:
+                    await callback(ticker)
+
+                except Exception:
+                    logger.exception("Error handling no data for %s", ticker)
+
             return HandlerResult.HANDLED
 
         bar_type = get_field(fields, 1)
@@ -128,6 +233,17 @@ class BarConn(Conn):
 
         return HandlerResult.UNKNOWN_MESSAGE
 
+    async def handle_disconnect(self) -> None:
+        """Called when the connection to IQFeed is lost. Passes the news on
+        to the registered callbacks.
+        """
+        for callback in self._disconnect_callbacks:
+            try:
+                await callback()
+
+            except Exception:
+                logger.exception("Error handling lost IQFeed connection")
+
     def _get_bar(self, fields: List[str]) -> Bar:
         """Extracts a Bar from the IQFeed fields.
 
@@ -168,25 +284,57 @@ class BarConn(Conn):
         Args:
             bar: The bar to process.
         """
-        for handler in self._history_bar_handlers:
-            try:
-                await handler(bar)
-
-            except Exception:
-                logger.exception("Error handling bar for %s", bar.ticker)
+        await self._history_bar_dispatcher.dispatch(bar)
 
     async def _handle_live_bar(self, bar: Bar) -> None:
-        """Processes a live bar.
+        """Processes a live bar. Repeats of the last bar of a watched ticker
+        are dropped. Nothing is kept for tickers that aren't watched, such as
+        bars that arrive just after unwatching, so their bars are all passed
+        on.
 
         Args:
             bar: The bar to process.
         """
-        if bar != self._last_bar.get(bar.ticker):
-            self._last_bar[bar.ticker] = bar
+        slot = self._slots.get(bar.ticker)
+        if slot is None:
+            await self._live_bar_dispatcher.dispatch(bar)
+            return
 
-            for handler in self._live_bar_handlers:
-                try:
-                    await handler(bar)
+        timestamp = bar.date.toordinal() * 86400 + bar.time.hour * 3600 + \
+            bar.time.minute * 60 + bar.time.second
 
-                except Exception:
-                    logger.exception("Error handling bar for %s", bar.ticker)
+        if (
+            timestamp == self._timestamps[slot] and
+            bar.tot_vlm == self._tot_vlms[slot]
+        ):
+            return
+
+        self._timestamps[slot] = timestamp
+        self._tot_vlms[slot] = bar.tot_vlm
+
+        await self._live_bar_dispatcher.dispatch(bar)
+
+    def _get_slot(self, ticker: str) -> int:
+        """Gets the slot the last live bar of a ticker is kept in, setting one
+        aside if the ticker doesn't have one yet.
+
+        Args:
+            ticker: The ticker to get the slot of.
+
+        Returns:
+            The index of the slot in the arrays.
+        """
+        slot = self._slots.get(ticker)
+        if slot is not None:
+            return slot
+
+        if not self._free_slots:
+            size = len(self._timestamps)
+            self._timestamps.extend(array.array("q", [NO_BAR]) * size)
+            self._tot_vlms.extend(array.array("q", [0]) * size)
+            self._free_slots.extend(range(2 * size - 1, size - 1, -1))
+
+        slot = self._free_slots.pop()
+        self._timestamps[slot] = NO_BAR
+        self._slots[ticker] = slot
+        return slot
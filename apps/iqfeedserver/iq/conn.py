@@ -1,3 +1,5 @@
+from typing import AsyncGenerator
+from typing import AsyncIterator
 from typing import Callable
 from typing import Dict
 from typing import Final
@@ -5,12 +7,15 @@ from typing import List
 from typing import NamedTuple
 from typing import Optional
 import asyncio
+import contextlib
 import enum
 import logging
 import random
-import warnings
 
 from iqfeedserver.iq.field_readers import get_field
+from iqfeedserver.iq.limiter import AdaptiveLimiter
+from iqfeedserver.iq.limiter import Permit
+from iqfeedserver.iq.line_protocol import LineProtocol
 
 
 logger = logging.getLogger(__name__)
@@ -22,9 +27,15 @@ ERROR: Final = "E"
 NO_DATA: Final = "!NO_DATA!"
 PROTOCOL: Final = "6.1"
 SERVER_CONNECTED: Final = "SERVER CONNECTED"
+STREAM_QUEUE_SIZE: Final = 8
 SYSTEM_MESSAGE: Final = "S"
 TIMEOUT: Final = 4
 
+# Requests throttled by IQFeed are retried this many times, waiting twice as
+# long before each retry
+THROTTLE_RETRIES: Final = 5
+THROTTLE_RETRY_DELAY: Final = 0.1
+
 
 class NoDataError(Exception):
     """Raised when there is no data available for a request.
@@ -38,6 +49,43 @@ class IQFeedError(Exception):
     pass
 
 
+def is_throttling_error(error: Exception) -> bool:
+    """Checks whether an error means IQFeed rejected a request for being one
+    too many, rather than for being invalid.
+
+    Args:
+        error: The error to check.
+
+    Returns:
+        True if the request can be retried later. False otherwise.
+    """
+    message = str(error).lower()
+    return isinstance(error, IQFeedError) and (
+        "too many" in message or "simultaneous" in message
+    )
+
+
+class CommandStream:
+    """Delivers the data of a streamed IQFeed command in chunks. A chunk is
+    taken after every batch of messages read from IQFeed and put on a bounded
+    queue. While the queue is full the data is left with the command's
+    handler, and is taken as one larger chunk once the consumer catches up.
+    """
+
+    def __init__(self, flush: Callable[[], Optional[object]]) -> None:
+        """Instantiates the instance.
+
+        Args:
+            flush: Called to take the data collected since the last call as a
+            chunk. Returns None if there is no new data.
+        """
+        self.closed = False
+        self.flush = flush
+        self.queue = asyncio.Queue(
+            maxsize=STREAM_QUEUE_SIZE
+        )  # type: asyncio.Queue[Optional[object]]
+
+
 class CommandHandler(NamedTuple):
     """Maintains information about an IQFeed command.
     """
@@ -45,6 +93,8 @@ class CommandHandler(NamedTuple):
     future: asyncio.Future
     handler: Callable[[List[str]], object]
     result: List[object]
+    stream: Optional[CommandStream] = None
+    permit: Optional[Permit] = None
 
 
 class HandlerResult(enum.Enum):
@@ -72,16 +122,22 @@ class Conn:
     """Base async class to pull data from IQFeed.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, limiter: Optional[AdaptiveLimiter] = None) -> None:
         """Instantiates the instance.
+
+        Args:
+            limiter: Limits the number of commands in flight to IQFeed. Can be
+            shared between connections. Commands aren't limited if None.
         """
         self._commands = {}  # type: Dict[str, CommandHandler]
-        self._reader = None  # type: Optional[asyncio.StreamReader]
+        self._limiter = limiter
+        self._protocol = None  # type: Optional[LineProtocol]
         self._req_num = 0
         self._runner = None  # type: Optional[asyncio.Task]
         self._state = ConnectionState.NOT_RUNNING
+        self._streams_changed = None  # type: Optional[asyncio.Event]
         self._termination_style = TerminationStyle.RUN_FOREVER
-        self._writer = None  # type: Optional[asyncio.StreamWriter]
+        self._write_lock = None  # type: Optional[asyncio.Lock]
 
     @property
     def state(self) -> ConnectionState:
@@ -100,23 +156,19 @@ class Conn:
             port: The port to connect to.
             termination_style: Indicates how the connection should terminate.
         """
-        if self._reader:
+        if self._protocol:
             raise RuntimeError("Already connected to IQFeed")
 
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=DeprecationWarning)
-
-            try:
-                self._reader, self._writer = await asyncio.open_connection(
-                    host, port
-                )
+        try:
+            _, self._protocol = await asyncio.get_running_loop(
+            ).create_connection(lambda: LineProtocol(TIMEOUT), host, port)
 
-            except Exception:
-                logger.error(
-                    "Unable to connect to IQFeed at %s:%s", host, port
-                )
-                raise
+        except Exception:
+            logger.error("Unable to connect to IQFeed at %s:%s", host, port)
+            raise
 
+        self._streams_changed = asyncio.Event()
+        self._write_lock = asyncio.Lock()
         await self.send_cmd("S,SET PROTOCOL,%s" % PROTOCOL)
 
         self._termination_style = termination_style
@@ -130,17 +182,20 @@ class Conn:
         Raises:
             RuntimeError: If the writer is not connected.
         """
-        if not self._writer or not self._runner:
+        if not self._protocol or not self._runner:
             raise RuntimeError("Not connected")
 
+        protocol = self._protocol
         self._runner.cancel()
-        await self.send_cmd("S,DISCONNECT")
 
-        self._writer.close()
-        await self._writer.wait_closed()
-        self._reader = None
-        self._runner = None
-        self._writer = None
+        try:
+            await self.send_cmd("S,DISCONNECT")
+
+        finally:
+            protocol.transport.close()
+            self._protocol = None
+            self._runner = None
+            self._write_lock = None
 
     async def send_cmd(self, cmd: str) -> None:
         """Sends a message to IQFeed.
@@ -151,12 +206,16 @@ class Conn:
         Raises:
             RuntimeError: If IQFeed is not connected.
         """
-        if not self._writer:
+        if not self._protocol or not self._write_lock:
             raise RuntimeError("Not connected")
 
         cmd += "\r\n"
-        self._writer.write(cmd.encode(encoding="latin-1"))
-        await self._writer.drain()
+
+        # Many commands can be pipelined at once so only one can wait for
+        # the socket to drain at a time
+        async with self._write_lock:
+            self._protocol.transport.write(cmd.encode(encoding="latin-1"))
+            await self._protocol.drain()
 
     def get_next_req_id(self, prefix: str, ticker: str) -> str:
         """Gets the next request ID to use for IQFeed.
@@ -168,11 +227,10 @@ class Conn:
         Returns:
             The next unique request ID.
         """
-        req_id = "%s%s%.10d" % (
-            prefix, ticker, self._req_num + random.randint(1, 100)
-        )
+        # Commands can be multiplexed and wait for the limiter before they
+        # are registered, so every ID handed out has to be unique
         self._req_num += 1
-        return req_id
+        return "%s%s%.10d" % (prefix, ticker, self._req_num)
 
     async def wait_for_command(
         self, command: str, ticker: str, req_id: str,
@@ -192,16 +250,202 @@ class Conn:
             asyncio.TimeoutError: If timeout is reached before retrieving the
             bars from IQFeed.
         """
-        result = asyncio.get_running_loop().create_future()
-        self._commands[req_id] = CommandHandler(ticker, result, handler, [])
+        retry = 0
 
-        try:
-            await self.send_cmd(command)
-            await asyncio.wait_for(result, timeout=timeout)
-            return result.result()
+        while True:
+            async with self._acquire() as permit:
+                result = asyncio.get_running_loop().create_future()
+                self._commands[req_id] = CommandHandler(
+                    ticker, result, handler, [], permit=permit
+                )
+                self._notify_streams_changed()
 
-        finally:
-            del self._commands[req_id]
+                try:
+                    await self.send_cmd(command)
+                    await asyncio.wait_for(result, timeout=timeout)
+                    return result.result()
+
+                except IQFeedError as e:
+                    if is_throttling_error(e):
+                        permit.record_throttled()
+
+                    if not permit.throttled or retry == THROTTLE_RETRIES:
+                        raise
+
+                finally:
+                    del self._commands[req_id]
+
+            await self._wait_to_retry(ticker, retry)
+            retry += 1
+
+    async def stream_command(
+        self, command: str, ticker: str, req_id: str,
+        handler: Callable[[List[str]], object],
+        flush: Callable[[], Optional[object]], timeout: int
+    ) -> AsyncIterator[object]:
+        """Sends the given command and yields its data in chunks as it is
+        received, rather than waiting for the command to complete.
+
+        Each stream has a queue of STREAM_QUEUE_SIZE chunks. A consumer that
+        falls behind doesn't hold up the other commands on the connection,
+        since its data is left with handler until it catches up. Reading
+        from IQFeed only pauses once the consumer of every command in flight
+        has fallen behind, so handler needs to collect a slow consumer's
+        data in the meantime.
+
+        Args:
+            command: The command to send to IQFeed.
+            ticker: The ticker this command is related to.
+            req_id: The ID to identify this command.
+            handler: The function to call when new data related to the command
+            is received from IQFeed.
+            flush: Called after each batch of messages to take the data
+            collected by handler as a chunk. Returns None if there is no new
+            data.
+            timeout: The maximum number of seconds to wait for the next chunk
+            before timing out.
+
+        Yields:
+            The chunks returned by flush.
+
+        Raises:
+            asyncio.TimeoutError: If timeout is reached before the next chunk
+            is received from IQFeed.
+            NoDataError: If IQFeed has no data for the command.
+            IQFeedError: If there is an error sent back from IQFeed.
+        """
+        retry = 0
+
+        while True:
+            chunks = self._stream_command_once(
+                command, ticker, req_id, handler, flush, timeout
+            )
+            started = False
+
+            try:
+                async for chunk in chunks:
+                    started = True
+                    yield chunk
+
+                return
+
+            except IQFeedError as e:
+                # Chunks that were already yielded can't be taken back
+                if started or not is_throttling_error(e) or \
+                        retry == THROTTLE_RETRIES:
+                    raise
+
+            finally:
+                await chunks.aclose()
+
+            await self._wait_to_retry(ticker, retry)
+            retry += 1
+
+    async def _stream_command_once(
+        self, command: str, ticker: str, req_id: str,
+        handler: Callable[[List[str]], object],
+        flush: Callable[[], Optional[object]], timeout: int
+    ) -> AsyncGenerator[object, None]:
+        """Sends the given command once and yields its data in chunks as it is
+        received.
+
+        Args:
+            command: The command to send to IQFeed.
+            ticker: The ticker this command is related to.
+            req_id: The ID to identify this command.
+            handler: The function to call when new data related to the command
+            is received from IQFeed.
+            flush: Called after each batch of messages to take the data
+            collected by handler as a chunk. Returns None if there is no new
+            data.
+            timeout: The maximum number of seconds to wait for the next chunk
+            before timing out.
+
+        Yields:
+            The chunks returned by flush.
+        """
+        async with self._acquire() as permit:
+            result = asyncio.get_running_loop().create_future()
+            stream = CommandStream(flush)
+            command_handler = CommandHandler(
+                ticker, result, handler, [], stream, permit
+            )
+            self._commands[req_id] = command_handler
+            self._notify_streams_changed()
+
+            try:
+                await self.send_cmd(command)
+
+                while True:
+                    # Take the data left behind while the queue was full
+                    if stream.queue.empty():
+                        self._flush_stream(command_handler)
+
+                    chunk = await asyncio.wait_for(
+                        stream.queue.get(), timeout=timeout
+                    )
+                    self._notify_streams_changed()
+
+                    if chunk is None:
+                        break
+
+                    yield chunk
+
+                result.result()
+
+            except IQFeedError as e:
+                if is_throttling_error(e):
+                    permit.record_throttled()
+
+                raise
+
+            finally:
+                del self._commands[req_id]
+                stream.closed = True
+
+                # The reader may be waiting for this consumer to catch up
+                self._notify_streams_changed()
+
+                # The consumer may have stopped before seeing the error
+                if result.done() and not result.cancelled():
+                    result.exception()
+
+    @contextlib.asynccontextmanager
+    async def _acquire(self) -> AsyncIterator[Permit]:
+        """Waits until the limiter allows another command to be sent.
+
+        Yields:
+            The permit to send the command.
+        """
+        if not self._limiter:
+            yield Permit(asyncio.get_running_loop().time())
+            return
+
+        async with self._limiter.acquire() as permit:
+            yield permit
+
+    @staticmethod
+    async def _wait_to_retry(ticker: str, retry: int) -> None:
+        """Waits before retrying a command IQFeed throttled. The wait doubles
+        with each retry, with some jitter so throttled commands don't all
+        retry at once.
+
+        Args:
+            ticker: The ticker of the command.
+            retry: The number of times the command has been retried.
+        """
+        delay = THROTTLE_RETRY_DELAY * 2 ** retry * random.uniform(0.5, 1.5)
+        logger.info(
+            "IQFeed throttled request for %s, retrying in %.2fs", ticker,
+            delay
+        )
+        await asyncio.sleep(delay)
+
+    async def handle_disconnect(self) -> None:
+        """Called when the connection stops reading messages from IQFeed
+        without disconnect() being called, such as when IQFeed closes the
+        connection. Subclasses can override this method to react.
+        """
 
     async def handle_fields(self, fields: List[str]) -> HandlerResult:
         """Called when a message is received from IQFeed. Subclasses can
@@ -221,32 +465,57 @@ class Conn:
         """Continuously listens for messages from IQFeed and sends events when
         received.
         """
-        if not self._reader:
+        if not self._protocol:
             raise RuntimeError("Reader is not connected")
 
         try:
-            while True:
-                try:
-                    line = await asyncio.wait_for(
-                        self._reader.readline(), timeout=TIMEOUT
-                    )
+            await self._read_messages(self._protocol)
+
+        except asyncio.CancelledError:
+            # disconnect() was called, so the connection wasn't lost
+            return
 
-                except asyncio.TimeoutError:
-                    if (
-                        self._termination_style
-                        == TerminationStyle.TERMINATE_WHEN_NO_DATA_RECEIVED
-                    ):
-                        return
+        except Exception:
+            logger.exception("Error reading from IQFeed")
 
-                message = line.decode("latin-1").strip()
+        finally:
+            self._state = ConnectionState.NOT_RUNNING
+
+        await self.handle_disconnect()
+
+    async def _read_messages(self, protocol: LineProtocol) -> None:
+        """Handles the messages sent from IQFeed until the connection ends.
+
+        Args:
+            protocol: The protocol to read the messages from.
+        """
+        while True:
+            try:
+                lines = await protocol.read_lines()
+
+            except asyncio.TimeoutError:
+                if (
+                    self._termination_style
+                    == TerminationStyle.TERMINATE_WHEN_NO_DATA_RECEIVED
+                ):
+                    return
+
+                continue
+
+            # IQFeed closed the connection
+            if not lines:
+                logger.info("IQFeed closed the connection")
+                return
+
+            for line in lines:
+                message = line.strip()
                 if message:
                     await self._handle_message(message)
 
-        except asyncio.CancelledError:
-            pass
+            for command_handler in list(self._commands.values()):
+                self._flush_stream(command_handler)
 
-        finally:
-            self._state = ConnectionState.NOT_RUNNING
+            await self._wait_for_streams()
 
     async def _handle_message(self, message: str) -> None:
         """Handles the message sent from IQFeed.
@@ -283,6 +552,54 @@ class Conn:
         else:
             logger.debug("Unknown message: %s", message)
 
+    def _flush_stream(self, command_handler: CommandHandler) -> None:
+        """Passes the data collected for a streamed command on to its consumer,
+        unless the consumer has fallen behind and its queue is full.
+
+        Args:
+            command_handler: The command to pass the data of.
+        """
+        stream = command_handler.stream
+        if not stream or stream.closed or stream.queue.full():
+            return
+
+        chunk = stream.flush()
+        if chunk is not None:
+            stream.queue.put_nowait(chunk)
+
+        if command_handler.future.done() and not stream.queue.full():
+            stream.closed = True
+            stream.queue.put_nowait(None)
+
+    async def _wait_for_streams(self) -> None:
+        """Pauses reading from IQFeed while the consumer of every command in
+        flight has fallen behind, so their data doesn't pile up in memory.
+        Commands that aren't streamed, or whose consumer has room, keep
+        reading going.
+        """
+        assert self._streams_changed
+
+        while True:
+            waiting = [
+                command_handler for command_handler in self._commands.values()
+                if not command_handler.future.done()
+            ]
+
+            if not waiting or not all(
+                command_handler.stream and command_handler.stream.queue.full()
+                for command_handler in waiting
+            ):
+                return
+
+            self._streams_changed.clear()
+            await self._streams_changed.wait()
+
+    def _notify_streams_changed(self) -> None:
+        """Wakes up the reader if it is waiting for consumers to catch up.
+        """
+        if self._streams_changed:
+            self._streams_changed.set()
+
     @staticmethod
     def _process_future_result(
         fields: List[str], command_handler: CommandHandler
@@ -296,6 +613,11 @@ class Conn:
         if command_handler.future.done():
             return
 
+        # Only the first line counts, so large responses aren't mistaken for
+        # a slow IQFeed
+        if command_handler.permit:
+            command_handler.permit.record_latency()
+
         # If this is the end of the bars, send back the result
         if get_field(fields, 1) == END_MSG:
             command_handler.future.set_result(command_handler.result)
@@ -312,12 +634,16 @@ class Conn:
                 IQFeedError(get_field(fields, 2))
             )
 
-        # Otherwise, send the data to the callback to be handled
+        # Otherwise, send the data to the callback to be handled. Handlers that
+        # collect the data themselves return None
         else:
-            command_handler.result.append(command_handler.handler(
+            result = command_handler.handler(
                 # Replace req_id with ticker
                 [command_handler.ticker] + fields[1:]
-            ))
+            )
+
+            if result is not None:
+                command_handler.result.append(result)
 
     @staticmethod
     def _check_protocol(fields: List[str]) -> None:
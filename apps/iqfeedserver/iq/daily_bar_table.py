@@ -0,0 +1,163 @@
+from typing import Final
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+import datetime
+
+import numpy
+
+from iqfeedserver.iq import DailyBar
+
+
+# Column name and array typecode, in the order they are stored
+DAILY_COLUMNS: Final = (
+    ("high_p", "d"),
+    ("low_p", "d"),
+    ("open_p", "d"),
+    ("close_p", "d"),
+    ("prd_vlm", "q"),
+    ("open_int", "q"),
+)
+
+
+class DailyBarTable:
+    """Stores the daily bars of a single ticker over a range of dates as dense
+    columns of NumPy arrays, with a row for every calendar day in the range.
+    A day's row is found from its distance to the first day, so looking up a
+    date doesn't need a search. Days without a bar, such as weekends and
+    holidays, are marked as missing.
+    """
+
+    def __init__(
+        self, ticker: str, start: datetime.date, present: numpy.ndarray,
+        high_p: numpy.ndarray, low_p: numpy.ndarray, open_p: numpy.ndarray,
+        close_p: numpy.ndarray, prd_vlm: numpy.ndarray,
+        open_int: numpy.ndarray
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            ticker: The ticker the bars belong to.
+            start: The date of the first row.
+            present: Whether each day has a bar.
+            high_p: The float64 high price of each day.
+            low_p: The float64 low price of each day.
+            open_p: The float64 open price of each day.
+            close_p: The float64 close price of each day.
+            prd_vlm: The int64 volume of each day.
+            open_int: The int64 open interest of each day.
+        """
+        self.ticker = ticker
+        self.start = start
+        self.present = present
+        self.high_p = high_p
+        self.low_p = low_p
+        self.open_p = open_p
+        self.close_p = close_p
+        self.prd_vlm = prd_vlm
+        self.open_int = open_int
+
+    @classmethod
+    def from_bars(
+        cls, ticker: str, start: datetime.date, end: datetime.date,
+        bars: Sequence[DailyBar]
+    ) -> "DailyBarTable":
+        """Creates a table from a list of daily bars.
+
+        Args:
+            ticker: The ticker the bars belong to.
+            start: The first date of the table.
+            end: The last date of the table.
+            bars: The bars to store in the table. Bars outside of the dates
+            of the table are ignored.
+
+        Returns:
+            The table containing the bars.
+        """
+        size = max(0, (end - start).days + 1)
+        table = cls(
+            ticker, start, numpy.zeros(size, dtype=bool), *(
+                numpy.zeros(size, dtype=typecode)
+                for _, typecode in DAILY_COLUMNS
+            )
+        )
+
+        for bar in bars:
+            index = (bar.date - start).days
+            if 0 <= index < size:
+                table.present[index] = True
+                for name, _ in DAILY_COLUMNS:
+                    getattr(table, name)[index] = getattr(bar, name)
+
+        return table
+
+    @property
+    def end(self) -> datetime.date:
+        """Gets the date of the last row.
+        """
+        return self.start + datetime.timedelta(days=len(self.present) - 1)
+
+    @property
+    def columns(self) -> List[numpy.ndarray]:
+        """Gets the columns of the table in the order listed in DAILY_COLUMNS.
+        """
+        return [getattr(self, name) for name, _ in DAILY_COLUMNS]
+
+    def __len__(self) -> int:
+        return int(numpy.count_nonzero(self.present))
+
+    def __contains__(self, day: object) -> bool:
+        return isinstance(day, datetime.date) and self.get(day) is not None
+
+    def __iter__(self) -> Iterator[DailyBar]:
+        for index in numpy.flatnonzero(self.present).tolist():
+            bar = self._get_row(index)
+            assert bar
+            yield bar
+
+    def get(self, day: datetime.date) -> Optional[DailyBar]:
+        """Gets the daily bar of a date.
+
+        Args:
+            day: The date to get the bar of.
+
+        Returns:
+            The daily bar. None if the day has no bar or is outside of the
+            table.
+        """
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+
+        return self._get_row((day - self.start).days)
+
+    def to_bars(self) -> List[DailyBar]:
+        """Converts the table to a list of daily bars.
+
+        Returns:
+            The bars in the table, in date order.
+        """
+        return list(self)
+
+    def _get_row(self, index: int) -> Optional[DailyBar]:
+        """Gets the daily bar stored in a row.
+
+        Args:
+            index: The index of the row.
+
+        Returns:
+            The daily bar. None if the row has no bar or doesn't exist.
+        """
+        if not 0 <= index < len(self.present) or not self.present[index]:
+            return None
+
+        return DailyBar(
+            date=self.start + datetime.timedelta(days=index),
+            high_p=float(self.high_p[index]),
+            low_p=float(self.low_p[index]),
+            open_p=float(self.open_p[index]),
+            close_p=float(self.close_p[index]),
+            prd_vlm=int(self.prd_vlm[index]),
+            open_int=int(self.open_int[index]),
+            ticker=self.ticker
+        )
@@ -0,0 +1,241 @@
+from typing import Awaitable
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+import asyncio
+import collections
+import enum
+import logging
+
+from iqfeedserver.iq.bars import Bar
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_QUEUE_SIZE: Final = 1024
+
+
+class OverflowPolicy(enum.Enum):
+    """What to do with a bar when a subscriber's queue is full.
+    """
+    # Wait for room, pausing the connection's reads from IQFeed
+    BLOCK = "block"
+
+    # Drop the oldest queued bar
+    DROP_OLDEST = "drop_oldest"
+
+    # Replace the queued bar of the same ticker, or drop the oldest bar if
+    # none is queued
+    COALESCE = "coalesce"
+
+
+class SubscriberStats(NamedTuple):
+    """A snapshot of the metrics collected for a subscriber of a
+    BarDispatcher.
+    """
+    name: str
+    queued: int
+    delivered: int
+    dropped: int
+    coalesced: int
+    lag: float
+    max_lag: float
+
+
+class _Subscriber:
+    """Queues bars for a callback and calls it from a dedicated task, so a
+    slow callback only delays its own bars.
+    """
+
+    def __init__(
+        self, callback: Callable[[Bar], Awaitable[None]], max_size: int,
+        policy: OverflowPolicy
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            callback: The callback to pass the bars to.
+            max_size: The number of bars that can be queued for the callback.
+            policy: What to do with a bar when the queue is full.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self._callback = callback
+        self._coalesced = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._latest = {}  # type: Dict[str, List]
+        self._max_lag = 0.0
+        self._max_size = max_size
+        self._policy = policy
+        self._ready = None  # type: Optional[asyncio.Future]
+        self._room = None  # type: Optional[asyncio.Future]
+        self._slots = collections.deque()  # type: Deque[List]
+        self._task = None  # type: Optional[asyncio.Task]
+
+    @property
+    def stats(self) -> SubscriberStats:
+        """Gets the current metrics of the subscriber.
+        """
+        lag = 0.0
+        if self._slots:
+            lag = asyncio.get_running_loop().time() - self._slots[0][1]
+
+        return SubscriberStats(
+            name=getattr(self._callback, "__qualname__", repr(self._callback)),
+            queued=len(self._slots),
+            delivered=self._delivered,
+            dropped=self._dropped,
+            coalesced=self._coalesced,
+            lag=lag,
+            max_lag=max(lag, self._max_lag)
+        )
+
+    async def put(self, bar: Bar) -> None:
+        """Queues a bar for the callback. Only waits if the queue is full and
+        the subscriber blocks on overflow.
+
+        Args:
+            bar: The bar to queue.
+        """
+        loop = asyncio.get_running_loop()
+
+        if not self._task:
+            self._task = loop.create_task(self._run())
+
+        if len(self._slots) >= self._max_size:
+            if self._policy == OverflowPolicy.BLOCK:
+                while len(self._slots) >= self._max_size:
+                    if not self._room or self._room.done():
+                        self._room = loop.create_future()
+
+                    await self._room
+
+            elif (
+                self._policy == OverflowPolicy.COALESCE and
+                bar.ticker in self._latest
+            ):
+                # Keep the enqueue time of the replaced bar so the lag still
+                # shows how long the ticker has been waiting
+                self._latest[bar.ticker][0] = bar
+                self._coalesced += 1
+                return
+
+            else:
+                self._forget(self._slots.popleft())
+                self._dropped += 1
+
+        slot = [bar, loop.time()]
+        self._slots.append(slot)
+
+        if self._policy == OverflowPolicy.COALESCE:
+            self._latest[bar.ticker] = slot
+
+        if self._ready and not self._ready.done():
+            self._ready.set_result(None)
+
+    async def close(self) -> None:
+        """Stops calling the callback and drops any queued bars.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        self._slots.clear()
+        self._latest.clear()
+
+    async def _run(self) -> None:
+        """Passes the queued bars to the callback one at a time.
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            while not self._slots:
+                self._ready = loop.create_future()
+                await self._ready
+
+            slot = self._slots.popleft()
+            self._forget(slot)
+
+            if self._room and not self._room.done():
+                self._room.set_result(None)
+
+            self._max_lag = max(self._max_lag, loop.time() - slot[1])
+
+            try:
+                await self._callback(slot[0])
+
+            except Exception:
+                logger.exception("Error handling bar for %s", slot[0].ticker)
+
+            self._delivered += 1
+
+    def _forget(self, slot: List) -> None:
+        """Stops tracking a slot that left the queue as the latest bar of its
+        ticker.
+
+        Args:
+            slot: The slot that left the queue.
+        """
+        ticker = slot[0].ticker
+        if self._latest.get(ticker) is slot:
+            del self._latest[ticker]
+
+
+class BarDispatcher:
+    """Passes bars on to callbacks without waiting for the callbacks to run.
+    Every callback has its own bounded queue and its own task, so a slow
+    callback doesn't delay the other callbacks or the connection reading
+    from IQFeed. What happens when a callback falls too far behind is chosen
+    for each callback with an OverflowPolicy.
+    """
+
+    def __init__(self) -> None:
+        """Instantiates the instance.
+        """
+        self._subscribers = []  # type: List[_Subscriber]
+
+    @property
+    def stats(self) -> List[SubscriberStats]:
+        """Gets the current metrics of every subscriber.
+        """
+        return [subscriber.stats for subscriber in self._subscribers]
+
+    def subscribe(
+        self, callback: Callable[[Bar], Awaitable[None]],
+        max_size: int = DEFAULT_QUEUE_SIZE,
+        policy: OverflowPolicy = OverflowPolicy.BLOCK
+    ) -> None:
+        """Starts passing bars to a callback.
+
+        Args:
+            callback: The callback to pass the bars to.
+            max_size: The number of bars that can be queued for the callback.
+            policy: What to do with a bar when the callback's queue is full.
+        """
+        self._subscribers.append(_Subscriber(callback, max_size, policy))
+
+    async def dispatch(self, bar: Bar) -> None:
+        """Queues a bar for every callback.
+
+        Args:
+            bar: The bar to pass on.
+        """
+        for subscriber in self._subscribers:
+            await subscriber.put(bar)
+
+    async def close(self) -> None:
+        """Stops passing bars to every callback.
+        """
+        subscribers = self._subscribers
+        self._subscribers = []
+
+        for subscriber in subscribers:
+            await subscriber.close()
@@ -1,6 +1,15 @@
+from typing import Final
 from typing import List
 from typing import Tuple
 import datetime
+import functools
+
+
+DATE_LENGTH: Final = 10
+EPOCH: Final = datetime.datetime(1970, 1, 1)
+MICROSECONDS_PER_SECOND: Final = 1000000
+SECONDS_PER_DAY: Final = 86400
+TIMESTAMP_LENGTH: Final = 19
 
 
 def convert_datetime_to_iqfeed_format(date: datetime.datetime) -> str:
@@ -17,11 +26,11 @@ def convert_datetime_to_iqfeed_format(date: datetime.datetime) -> str:
     )
 
 
-def convert_datetime_to_iqfeed_date_format(date: datetime.datetime) -> str:
-    """Converts a python datetime to a date format readable by IQFeed.
+def convert_datetime_to_iqfeed_date_format(date: datetime.date) -> str:
+    """Converts a python date or datetime to a date format readable by IQFeed.
 
     Args:
-        date: The datetime value to convert.
+        date: The date or datetime value to convert.
 
     Returns:
         The converted datetime in a time format readable by IQFeed.
@@ -43,10 +52,135 @@ def convert_iqfeed_timestamp_to_date_and_time(
     Raises:
         ValueError: If the timestamp is an invalid format.
     """
+    # IQFeed always sends fixed width timestamps so they can be sliced up
+    # directly rather than going through strptime
+    if len(timestamp) == TIMESTAMP_LENGTH and timestamp[DATE_LENGTH] == " ":
+        try:
+            return (
+                _parse_iqfeed_date(timestamp[:DATE_LENGTH]),
+                _parse_iqfeed_time(timestamp[DATE_LENGTH + 1:])
+            )
+
+        except ValueError:
+            pass
+
     value = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
     return value.date(), value.time()
 
 
+def convert_iqfeed_timestamp_to_epoch(timestamp: str) -> int:
+    """Converts a timestamp sent by IQFeed to the number of seconds since the
+    epoch. The timestamp is kept in IQFeed's time zone.
+
+    Args:
+        timestamp: The value sent from IQFeed to convert.
+
+    Returns:
+        The number of seconds since the epoch.
+
+    Raises:
+        ValueError: If the timestamp is an invalid format.
+    """
+    if len(timestamp) == TIMESTAMP_LENGTH and timestamp[DATE_LENGTH] == " ":
+        try:
+            return (
+                _get_epoch_seconds_of_date(timestamp[:DATE_LENGTH]) +
+                _get_seconds_of_time(timestamp[DATE_LENGTH + 1:])
+            )
+
+        except ValueError:
+            pass
+
+    value = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    return int((value - EPOCH).total_seconds())
+
+
+def convert_iqfeed_tick_timestamp_to_epoch_micros(timestamp: str) -> int:
+    """Converts a tick timestamp sent by IQFeed, which may have a fraction of
+    a second, to the number of microseconds since the epoch. The timestamp is
+    kept in IQFeed's time zone.
+
+    Args:
+        timestamp: The value sent from IQFeed to convert.
+
+    Returns:
+        The number of microseconds since the epoch.
+
+    Raises:
+        ValueError: If the timestamp is an invalid format.
+    """
+    seconds = convert_iqfeed_timestamp_to_epoch(timestamp[:TIMESTAMP_LENGTH])
+
+    fraction = timestamp[TIMESTAMP_LENGTH + 1:]
+    if len(timestamp) > TIMESTAMP_LENGTH and (
+        timestamp[TIMESTAMP_LENGTH] != "." or not fraction.isdigit() or
+        len(fraction) > 6
+    ):
+        raise ValueError("Invalid tick timestamp: %s" % timestamp)
+
+    return seconds * MICROSECONDS_PER_SECOND + (
+        int(fraction.ljust(6, "0")) if fraction else 0
+    )
+
+
+def convert_epoch_micros_to_iqfeed_timestamp(micros: int) -> str:
+    """Converts a number of microseconds since the epoch to IQFeed's tick
+    timestamp format.
+
+    Args:
+        micros: The number of microseconds since the epoch.
+
+    Returns:
+        The timestamp in IQFeed format, with six decimal places.
+    """
+    seconds, micros = divmod(micros, MICROSECONDS_PER_SECOND)
+    return "%s.%.6d" % (convert_epoch_to_iqfeed_timestamp(seconds), micros)
+
+
+def convert_epoch_to_iqfeed_timestamp(seconds: int) -> str:
+    """Converts a number of seconds since the epoch to IQFeed's timestamp
+    format.
+
+    Args:
+        seconds: The number of seconds since the epoch.
+
+    Returns:
+        The timestamp in IQFeed format.
+    """
+    days, seconds = divmod(seconds, SECONDS_PER_DAY)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return "%s %.2d:%.2d:%.2d" % (
+        _format_epoch_day(days), hours, minutes, seconds
+    )
+
+
+def convert_epoch_to_datetime(seconds: int) -> datetime.datetime:
+    """Converts a number of seconds since the epoch to a python datetime.
+
+    Args:
+        seconds: The number of seconds since the epoch.
+
+    Returns:
+        The converted datetime.
+    """
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+
+def convert_datetime_to_epoch(date: datetime.datetime) -> int:
+    """Converts a python datetime to the number of seconds since the epoch.
+    Any time zone information is ignored.
+
+    Args:
+        date: The datetime value to convert.
+
+    Returns:
+        The number of seconds since the epoch.
+    """
+    return int((date.replace(tzinfo=None) - EPOCH).total_seconds())
+
+
 def convert_iqfeed_date_to_date(timestamp: str) -> datetime.date:
     """Converts a date sent by IQFeed to a date python value.
 
@@ -59,7 +193,42 @@ def convert_iqfeed_date_to_date(timestamp: str) -> datetime.date:
     Raises:
         ValueError: If the timestamp is an invalid format.
     """
-    return datetime.datetime.strptime(timestamp, "%Y-%m-%d").date()
+    try:
+        return _parse_iqfeed_date(timestamp)
+
+    except ValueError:
+        return datetime.datetime.strptime(timestamp, "%Y-%m-%d").date()
+
+
+def check_historical_fields(fields: List[str]) -> None:
+    """Cheaply checks that the fields of a historical bar message look valid
+    without converting them.
+
+    Args:
+        fields: The fields of the message, starting with the ticker.
+
+    Raises:
+        ValueError: If the fields don't look like a historical bar.
+    """
+    if len(fields) != 9:
+        raise ValueError("Expected 9 fields, got %d" % len(fields))
+
+    timestamp = fields[1]
+    if (
+        len(timestamp) != TIMESTAMP_LENGTH or
+        timestamp[4] != "-" or
+        timestamp[DATE_LENGTH] != " " or
+        timestamp[13] != ":"
+    ):
+        raise ValueError("Invalid timestamp: %s" % timestamp)
+
+    for price in fields[2:6]:
+        if not price or not price.replace(".", "", 1).lstrip("-").isdigit():
+            raise ValueError("Invalid price: %s" % price)
+
+    for count in fields[6:]:
+        if not count.isdigit():
+            raise ValueError("Invalid count: %s" % count)
 
 
 def get_field(fields: List[str], index: int) -> str:
@@ -78,3 +247,104 @@ def get_field(fields: List[str], index: int) -> str:
 
     except IndexError:
         return ""
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_iqfeed_date(value: str) -> datetime.date:
+    """Parses a fixed width YYYY-MM-DD date. Results are memoized since every
+    bar in a response shares the same few dates.
+
+    Args:
+        value: The date to parse.
+
+    Returns:
+        The parsed date.
+
+    Raises:
+        ValueError: If the date is an invalid format.
+    """
+    if (
+        len(value) != DATE_LENGTH or
+        value[4] != "-" or
+        value[7] != "-" or
+        not (value[:4] + value[5:7] + value[8:]).isdigit()
+    ):
+        raise ValueError("Invalid date: %s" % value)
+
+    return datetime.date(int(value[:4]), int(value[5:7]), int(value[8:]))
+
+
+@functools.lru_cache(maxsize=32768)
+def _parse_iqfeed_time(value: str) -> datetime.time:
+    """Parses a fixed width HH:MM:SS time. Results are memoized since every
+    trading day repeats the same bar times.
+
+    Args:
+        value: The time to parse.
+
+    Returns:
+        The parsed time.
+
+    Raises:
+        ValueError: If the time is an invalid format.
+    """
+    if (
+        len(value) != 8 or
+        value[2] != ":" or
+        value[5] != ":" or
+        not (value[:2] + value[3:5] + value[6:]).isdigit()
+    ):
+        raise ValueError("Invalid time: %s" % value)
+
+    return datetime.time(int(value[:2]), int(value[3:5]), int(value[6:]))
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_epoch_seconds_of_date(value: str) -> int:
+    """Gets the number of seconds between the epoch and the start of a fixed
+    width YYYY-MM-DD date.
+
+    Args:
+        value: The date to convert.
+
+    Returns:
+        The number of seconds since the epoch.
+
+    Raises:
+        ValueError: If the date is an invalid format.
+    """
+    return (
+        _parse_iqfeed_date(value) - EPOCH.date()
+    ).days * SECONDS_PER_DAY
+
+
+@functools.lru_cache(maxsize=32768)
+def _get_seconds_of_time(value: str) -> int:
+    """Gets the number of seconds since midnight of a fixed width HH:MM:SS
+    time.
+
+    Args:
+        value: The time to convert.
+
+    Returns:
+        The number of seconds since midnight.
+
+    Raises:
+        ValueError: If the time is an invalid format.
+    """
+    time = _parse_iqfeed_time(value)
+    return time.hour * 3600 + time.minute * 60 + time.second
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_epoch_day(days: int) -> str:
+    """Formats a number of days since the epoch as a YYYY-MM-DD date.
+
+    Args:
+        days: The number of days since the epoch.
+
+    Returns:
+        The formatted date.
+    """
+    date = EPOCH.date() + datetime.timedelta(days=days)
+    return "%.4d-%.2d-%.2d" % (date.year, date.month, date.day)
@@ -1,21 +1,69 @@
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Coroutine
 from typing import Final
+from typing import Iterable
 from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import TypeVar
+import asyncio
 import datetime
+import itertools
 import logging
 
 from iqfeedserver.iq import Bar
+from iqfeedserver.iq import BarBatch
+from iqfeedserver.iq import BarBatchBuilder
 from iqfeedserver.iq import Conn
 from iqfeedserver.iq import DailyBar
+from iqfeedserver.iq import DailyBarTable
 from iqfeedserver.iq import field_readers
 from iqfeedserver.iq import IntervalType
 from iqfeedserver.iq import NoDataError
+from iqfeedserver.iq import TickBatch
+from iqfeedserver.iq import TickBatchBuilder
 
 
 logger = logging.getLogger(__name__)
 
 
 DAILY_BAR_PREFIX: Final = "D_"
+DEFAULT_WINDOW: Final = 10
 HISTORY_BAR_PREFIX: Final = "H_"
+TICK_PREFIX: Final = "T_"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class BarRequest(NamedTuple):
+    """Describes a request for the bars of a ticker in a period.
+    """
+    ticker: str
+    start: datetime.datetime
+    end: datetime.datetime
+    interval_len: int
+    interval_type: IntervalType = IntervalType.SECONDS
+
+
+class BarResult(NamedTuple):
+    """The outcome of a BarRequest. Either bars or error is set.
+    """
+    request: BarRequest
+    bars: List[Bar]
+    error: Optional[Exception]
+
+
+class DailyBarResult(NamedTuple):
+    """The outcome of requesting the daily bars of a ticker over a range of
+    dates. Either table or error is set.
+    """
+    ticker: str
+    table: Optional[DailyBarTable]
+    error: Optional[Exception]
 
 
 class HistoryConn(Conn):
@@ -51,16 +99,8 @@ class HistoryConn(Conn):
             IQFeedError: If there is an error sent back from IQFeed.
         """
         req_id = self.get_next_req_id(HISTORY_BAR_PREFIX, ticker)
-
-        command = (
-            "HIT,%s,%d,%s,%s,,,,1,%s,,%s," % (
-                ticker,
-                interval_len,
-                field_readers.convert_datetime_to_iqfeed_format(start),
-                field_readers.convert_datetime_to_iqfeed_format(end),
-                req_id,
-                interval_type.value
-            )
+        command = self._get_bars_in_period_command(
+            req_id, ticker, start, end, interval_len, interval_type
         )
 
         bars = await self.wait_for_command(
@@ -72,6 +112,280 @@ class HistoryConn(Conn):
 
         return bars
 
+    async def request_bar_batch_in_period(
+        self, ticker: str, start: datetime.datetime, end: datetime.datetime,
+        interval_len: int, interval_type: IntervalType = IntervalType.SECONDS,
+        timeout: int = 30
+    ) -> BarBatch:
+        """Retrieves the bars for the given ticker for a specified period as a
+        columnar BarBatch. Uses far less memory than request_bars_in_period
+        for large requests since no Bar instances are created.
+
+        Args:
+            ticker: The ticker to retrieve the bars for.
+            start: The starting period to retrieve the bars for.
+            end: The ending period to retrieve the bars for.
+            interval_len: The amount of time each bar should represent.
+            interval_type: The type of time associated with the given
+            interval_len.
+            timeout: The maximum amount of seconds to wait retrieving data from
+            IQFeed.
+
+        Returns:
+            The bars for the given ticker and the given time period.
+
+        Raises:
+            asyncio.TimeoutError: If timeout is reached before retrieving the
+            bars from IQFeed.
+            NoDataError: If there is no data for the requested ticker and the
+            given times.
+            IQFeedError: If there is an error sent back from IQFeed.
+        """
+        req_id = self.get_next_req_id(HISTORY_BAR_PREFIX, ticker)
+        command = self._get_bars_in_period_command(
+            req_id, ticker, start, end, interval_len, interval_type
+        )
+
+        builder = BarBatchBuilder(ticker)
+        await self.wait_for_command(
+            command, ticker, req_id, builder.append_historical_fields, timeout
+        )
+
+        return builder.build()
+
+    async def stream_bar_batches_in_period(
+        self, ticker: str, start: datetime.datetime, end: datetime.datetime,
+        interval_len: int, interval_type: IntervalType = IntervalType.SECONDS,
+        timeout: int = 30
+    ) -> AsyncIterator[BarBatch]:
+        """Retrieves the bars for the given ticker for a specified period,
+        yielding them in batches as soon as they are received from IQFeed.
+        The bars are collected in memory while the caller falls behind, so
+        the other requests on the connection aren't held up.
+
+        Args:
+            ticker: The ticker to retrieve the bars for.
+            start: The starting period to retrieve the bars for.
+            end: The ending period to retrieve the bars for.
+            interval_len: The amount of time each bar should represent.
+            interval_type: The type of time associated with the given
+            interval_len.
+            timeout: The maximum amount of seconds to wait for the next batch
+            of bars from IQFeed.
+
+        Yields:
+            Batches of bars in the order they were received.
+
+        Raises:
+            asyncio.TimeoutError: If timeout is reached before retrieving the
+            next batch of bars from IQFeed.
+            NoDataError: If there is no data for the requested ticker and the
+            given times.
+            IQFeedError: If there is an error sent back from IQFeed.
+        """
+        req_id = self.get_next_req_id(HISTORY_BAR_PREFIX, ticker)
+        command = self._get_bars_in_period_command(
+            req_id, ticker, start, end, interval_len, interval_type
+        )
+
+        builder = BarBatchBuilder(ticker)
+
+        def flush() -> Optional[BarBatch]:
+            return builder.take() if len(builder) else None
+
+        async for batch in self.stream_command(
+            command, ticker, req_id, builder.append_historical_fields, flush,
+            timeout
+        ):
+            assert isinstance(batch, BarBatch)
+            yield batch
+
+    async def stream_raw_bars_in_period(
+        self, ticker: str, start: datetime.datetime, end: datetime.datetime,
+        interval_len: int, prefix: str,
+        interval_type: IntervalType = IntervalType.SECONDS,
+        validate: bool = False, since: Optional[datetime.datetime] = None,
+        timeout: int = 30
+    ) -> AsyncIterator[List[str]]:
+        """Retrieves the bars for the given ticker for a specified period as
+        text, yielding them in batches as soon as they are received from
+        IQFeed. The fields sent by IQFeed are reordered without being
+        converted, so prices keep IQFeed's exact formatting and no Bar
+        instances are created.
+
+        Each bar is formatted as the prefix followed by the timestamp, open,
+        high, low, close, total volume, period volume and number of trades,
+        separated by commas.
+
+        Args:
+            ticker: The ticker to retrieve the bars for.
+            start: The starting period to retrieve the bars for.
+            end: The ending period to retrieve the bars for.
+            interval_len: The amount of time each bar should represent.
+            prefix: The text to start every bar with.
+            interval_type: The type of time associated with the given
+            interval_len.
+            validate: Whether to check the shape of each bar's fields. Bars
+            that fail the check are logged and skipped.
+            since: The earliest bar end time to include. Bars ending before
+            this time are skipped.
+            timeout: The maximum amount of seconds to wait for the next batch
+            of bars from IQFeed.
+
+        Yields:
+            Batches of formatted bars in the order they were received.
+
+        Raises:
+            asyncio.TimeoutError: If timeout is reached before retrieving the
+            next batch of bars from IQFeed.
+            NoDataError: If there is no data for the requested ticker and the
+            given times.
+            IQFeedError: If there is an error sent back from IQFeed.
+        """
+        req_id = self.get_next_req_id(HISTORY_BAR_PREFIX, ticker)
+        command = self._get_bars_in_period_command(
+            req_id, ticker, start, end, interval_len, interval_type
+        )
+
+        # IQFeed's timestamps have a fixed width, so they sort as text
+        first = since.strftime("%Y-%m-%d %H:%M:%S") if since else ""
+        lines = []  # type: List[str]
+
+        def handle(fields: List[str]) -> None:
+            (
+                _, timestamp, high_p, low_p, open_p, close_p, tot_vlm,
+                prd_vlm, num_trds
+            ) = fields
+
+            if validate:
+                field_readers.check_historical_fields(fields)
+
+            if timestamp < first:
+                return
+
+            lines.append(",".join((
+                prefix, timestamp, open_p, high_p, low_p, close_p, tot_vlm,
+                prd_vlm, num_trds
+            )))
+
+        def flush() -> Optional[List[str]]:
+            nonlocal lines
+
+            if not lines:
+                return None
+
+            batch = lines
+            lines = []
+            return batch
+
+        async for batch in self.stream_command(
+            command, ticker, req_id, handle, flush, timeout
+        ):
+            assert isinstance(batch, list)
+            yield batch
+
+    async def request_ticks_in_period(
+        self, ticker: str, start: datetime.datetime, end: datetime.datetime,
+        timeout: int = 30
+    ) -> TickBatch:
+        """Retrieves the ticks for the given ticker for a specified period as
+        a columnar TickBatch.
+
+        Args:
+            ticker: The ticker to retrieve the ticks for.
+            start: The starting period to retrieve the ticks for.
+            end: The ending period to retrieve the ticks for.
+            timeout: The maximum amount of seconds to wait retrieving data from
+            IQFeed.
+
+        Returns:
+            The ticks for the given ticker and the given time period.
+
+        Raises:
+            asyncio.TimeoutError: If timeout is reached before retrieving the
+            ticks from IQFeed.
+            NoDataError: If there is no data for the requested ticker and the
+            given times.
+            IQFeedError: If there is an error sent back from IQFeed.
+        """
+        req_id = self.get_next_req_id(TICK_PREFIX, ticker)
+        command = self._get_ticks_in_period_command(req_id, ticker, start, end)
+
+        builder = TickBatchBuilder(ticker)
+        await self.wait_for_command(
+            command, ticker, req_id, builder.append_tick_fields, timeout
+        )
+
+        return builder.build()
+
+    async def stream_tick_batches_in_period(
+        self, ticker: str, start: datetime.datetime, end: datetime.datetime,
+        timeout: int = 30
+    ) -> AsyncIterator[TickBatch]:
+        """Retrieves the ticks for the given ticker for a specified period,
+        yielding them in batches as soon as they are received from IQFeed.
+        The ticks are collected in memory while the caller falls behind, until
+        every request on the connection is waiting on its caller. Reading
+        from IQFeed is then paused.
+
+        Args:
+            ticker: The ticker to retrieve the ticks for.
+            start: The starting period to retrieve the ticks for.
+            end: The ending period to retrieve the ticks for.
+            timeout: The maximum amount of seconds to wait for the next batch
+            of ticks from IQFeed.
+
+        Yields:
+            Batches of ticks in the order they were received.
+
+        Raises:
+            asyncio.TimeoutError: If timeout is reached before retrieving the
+            next batch of ticks from IQFeed.
+            NoDataError: If there is no data for the requested ticker and the
+            given times.
+            IQFeedError: If there is an error sent back from IQFeed.
+        """
+        req_id = self.get_next_req_id(TICK_PREFIX, ticker)
+        command = self._get_ticks_in_period_command(req_id, ticker, start, end)
+
+        builder = TickBatchBuilder(ticker)
+
+        def flush() -> Optional[TickBatch]:
+            return builder.take() if len(builder) else None
+
+        async for batch in self.stream_command(
+            command, ticker, req_id, builder.append_tick_fields, flush,
+            timeout
+        ):
+            assert isinstance(batch, TickBatch)
+            yield batch
+
+    async def request_bars_batch(
+        self, requests: Iterable[BarRequest], window: int = DEFAULT_WINDOW,
+        timeout: int = 30
+    ) -> AsyncIterator[BarResult]:
+        """Retrieves the bars for many requests at once. The requests are
+        pipelined over this connection, keeping at most window requests in
+        flight so IQFeed doesn't reject them for being too many simultaneous
+        requests.
+
+        Args:
+            requests: The requests to retrieve the bars for.
+            window: The maximum number of requests to have in flight at once.
+            timeout: The maximum amount of seconds to wait retrieving data from
+            IQFeed for each request.
+
+        Yields:
+            A BarResult for each request, in the order the requests complete.
+            Errors for individual requests are returned in the BarResult
+            rather than raised.
+        """
+        async for result in self._pipeline(
+            requests, window,
+            lambda request: self._request_batch_item(request, timeout)
+        ):
+            yield result
+
     async def request_daily_bar_for_date(
         self, ticker: str, day: datetime.datetime, timeout: int = 30
     ) -> DailyBar:
@@ -117,6 +431,211 @@ class HistoryConn(Conn):
         except (AssertionError, IndexError):
             raise NoDataError("Didn't get valid data for %s" % ticker)
 
+    async def request_daily_bars_in_period(
+        self, ticker: str, start: datetime.date, end: datetime.date,
+        timeout: int = 30
+    ) -> DailyBarTable:
+        """Gets the daily bars for the given ticker over a range of dates with
+        a single request.
+
+        Args:
+            ticker: The ticker to retrieve the daily bars for.
+            start: The first day to retrieve the daily bars for.
+            end: The last day to retrieve the daily bars for.
+            timeout: The maximum amount of seconds to wait retrieving data from
+            IQFeed.
+
+        Returns:
+            The daily bars for the given ticker, with a row for every day in
+            the range.
+
+        Raises:
+            asyncio.TimeoutError: If timeout is reached before retrieving the
+            bars from IQFeed.
+            NoDataError: If there is no data for the requested ticker in the
+            given range.
+            IQFeedError: If there is an error sent back from IQFeed.
+            ValueError: If bad data was returned by IQFeed.
+        """
+        req_id = self.get_next_req_id(DAILY_BAR_PREFIX, ticker)
+
+        command = (
+            "HDT,%s,%s,%s,,1,%s,," % (
+                ticker,
+                field_readers.convert_datetime_to_iqfeed_date_format(start),
+                field_readers.convert_datetime_to_iqfeed_date_format(end),
+                req_id
+            )
+        )
+
+        bars = await self.wait_for_command(
+            command, ticker, req_id, self._handle_daily_bar, timeout
+        )
+
+        if not isinstance(bars, list) or not bars:
+            raise NoDataError("Didn't get valid data for %s" % ticker)
+
+        return DailyBarTable.from_bars(ticker, start, end, bars)
+
+    async def request_daily_bars_batch(
+        self, tickers: Iterable[str], start: datetime.date,
+        end: datetime.date, window: int = DEFAULT_WINDOW, timeout: int = 30
+    ) -> AsyncIterator[DailyBarResult]:
+        """Retrieves the daily bars of many tickers over the same range of
+        dates, sending a single request for each ticker. The requests are
+        pipelined over this connection the same way as request_bars_batch.
+
+        Args:
+            tickers: The tickers to retrieve the daily bars for.
+            start: The first day to retrieve the daily bars for.
+            end: The last day to retrieve the daily bars for.
+            window: The maximum number of requests to have in flight at once.
+            timeout: The maximum amount of seconds to wait retrieving data from
+            IQFeed for each ticker.
+
+        Yields:
+            A DailyBarResult for each ticker, in the order the requests
+            complete. Errors for individual tickers are returned in the
+            DailyBarResult rather than raised.
+        """
+        async def request(ticker: str) -> DailyBarResult:
+            try:
+                table = await self.request_daily_bars_in_period(
+                    ticker, start, end, timeout
+                )
+
+            except Exception as e:
+                return DailyBarResult(ticker, None, e)
+
+            return DailyBarResult(ticker, table, None)
+
+        async for result in self._pipeline(tickers, window, request):
+            yield result
+
+    async def _pipeline(
+        self, items: Iterable[T], window: int,
+        request: Callable[[T], Coroutine[Any, Any, R]]
+    ) -> AsyncIterator[R]:
+        """Runs a request for each item, keeping at most window requests in
+        flight so IQFeed doesn't reject them for being too many simultaneous
+        requests.
+
+        Args:
+            items: The items to run the request for.
+            window: The maximum number of requests to have in flight at once.
+            request: Runs the request for an item. Must not raise.
+
+        Yields:
+            The result of each request, in the order the requests complete.
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1")
+
+        loop = asyncio.get_running_loop()
+        pending = set()  # type: Set[asyncio.Future]
+        remaining = iter(items)
+
+        def submit(item: T) -> None:
+            pending.add(loop.create_task(request(item)))
+
+        try:
+            for item in itertools.islice(remaining, window):
+                submit(item)
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    # Keep the window full as requests complete
+                    for item in itertools.islice(remaining, 1):
+                        submit(item)
+
+                    yield task.result()
+
+        finally:
+            for task in pending:
+                task.cancel()
+
+            # Let the cancelled requests unwind before the loop can close
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _request_batch_item(
+        self, request: BarRequest, timeout: int
+    ) -> BarResult:
+        """Retrieves the bars for a single request of a batch.
+
+        Args:
+            request: The request to retrieve the bars for.
+            timeout: The maximum amount of seconds to wait retrieving data from
+            IQFeed.
+
+        Returns:
+            The result of the request.
+        """
+        try:
+            bars = await self.request_bars_in_period(
+                request.ticker, request.start, request.end,
+                request.interval_len, request.interval_type, timeout
+            )
+
+        except Exception as e:
+            return BarResult(request, [], e)
+
+        return BarResult(request, bars, None)
+
+    @staticmethod
+    def _get_bars_in_period_command(
+        req_id: str, ticker: str, start: datetime.datetime,
+        end: datetime.datetime, interval_len: int, interval_type: IntervalType
+    ) -> str:
+        """Gets the command to request the bars for a specified period.
+
+        Args:
+            req_id: The ID to identify the request.
+            ticker: The ticker to retrieve the bars for.
+            start: The starting period to retrieve the bars for.
+            end: The ending period to retrieve the bars for.
+            interval_len: The amount of time each bar should represent.
+            interval_type: The type of time associated with the given
+            interval_len.
+
+        Returns:
+            The command to send to IQFeed.
+        """
+        return "HIT,%s,%d,%s,%s,,,,1,%s,,%s," % (
+            ticker,
+            interval_len,
+            field_readers.convert_datetime_to_iqfeed_format(start),
+            field_readers.convert_datetime_to_iqfeed_format(end),
+            req_id,
+            interval_type.value
+        )
+
+    @staticmethod
+    def _get_ticks_in_period_command(
+        req_id: str, ticker: str, start: datetime.datetime,
+        end: datetime.datetime
+    ) -> str:
+        """Gets the command to request the ticks for a specified period.
+
+        Args:
+            req_id: The ID to identify the request.
+            ticker: The ticker to retrieve the ticks for.
+            start: The starting period to retrieve the ticks for.
+            end: The ending period to retrieve the ticks for.
+
+        Returns:
+            The command to send to IQFeed.
+        """
+        return "HTT,%s,%s,%s,,,,1,%s," % (
+            ticker,
+            field_readers.convert_datetime_to_iqfeed_format(start),
+            field_readers.convert_datetime_to_iqfeed_format(end),
+            req_id
+        )
+
     def _handle_historical_bar(self, fields: List[str]) -> object:
         """Handles a historical bar message.
 
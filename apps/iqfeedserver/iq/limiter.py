@@ -0,0 +1,218 @@
+from typing import AsyncIterator
+from typing import Deque
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+import asyncio
+import collections
+import contextlib
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_INITIAL_LIMIT: Final = 8
+DEFAULT_MAX_LIMIT: Final = 64
+
+# How much the limit is cut by when IQFeed throttles a request, and when
+# latency rises past the tolerated multiple of the best latency seen
+THROTTLE_BACKOFF: Final = 0.5
+LATENCY_BACKOFF: Final = 0.9
+LATENCY_TOLERANCE: Final = 2.0
+
+# How much the best latency seen is forgotten with each request, so the
+# baseline recovers if IQFeed gets permanently slower
+BASELINE_DRIFT: Final = 0.001
+
+
+class LimiterStats(NamedTuple):
+    """A snapshot of the metrics collected by an AdaptiveLimiter.
+    """
+    limit: float
+    in_flight: int
+    queued: int
+    throttled: int
+    backoffs: int
+
+
+class Permit:
+    """Allows a single request to be sent to IQFeed. The holder reports how
+    the request went so the limiter can adapt.
+    """
+
+    def __init__(self, started: float) -> None:
+        """Instantiates the instance.
+
+        Args:
+            started: The loop time the permit was granted at.
+        """
+        self.latency = None  # type: Optional[float]
+        self.started = started
+        self.throttled = False
+
+    def record_latency(self) -> None:
+        """Records how long IQFeed took to start answering the request. Only
+        the first call counts, so the latency is the time to the first line
+        of the response however large the response is.
+        """
+        if self.latency is None:
+            self.latency = asyncio.get_running_loop().time() - self.started
+
+    def record_throttled(self) -> None:
+        """Records that IQFeed rejected the request for being one too many.
+        """
+        self.throttled = True
+
+
+class AdaptiveLimiter:
+    """Limits the number of requests in flight to IQFeed, adjusting the limit
+    with additive increase, multiplicative decrease (AIMD). Every request that
+    goes well raises the limit by 1 / limit, so the limit grows by about one
+    for each round of requests. The limit is halved when IQFeed throttles a
+    request, and cut slightly when latency rises well past the best latency
+    seen, before IQFeed starts throttling.
+
+    Only requests sent after the last cut can cause another cut, so a burst of
+    errors from one round of requests backs off once. Requests past the limit
+    wait in first in, first out order.
+    """
+
+    def __init__(
+        self, initial_limit: float = DEFAULT_INITIAL_LIMIT,
+        max_limit: float = DEFAULT_MAX_LIMIT, min_limit: float = 1
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            initial_limit: The number of requests allowed in flight to start
+            with.
+            max_limit: The most requests ever allowed in flight.
+            min_limit: The fewest requests ever allowed in flight.
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(
+                "Limits must satisfy 1 <= min_limit <= initial_limit <= "
+                "max_limit"
+            )
+
+        self._backoffs = 0
+        self._baseline = None  # type: Optional[float]
+        self._in_flight = 0
+        self._last_backoff = float("-inf")
+        self._limit = float(initial_limit)
+        self._max_limit = float(max_limit)
+        self._min_limit = float(min_limit)
+        self._throttled = 0
+        self._waiters = collections.deque()  # type: Deque[asyncio.Future]
+
+    @property
+    def limit(self) -> float:
+        """Gets the number of requests currently allowed in flight.
+        """
+        return self._limit
+
+    @property
+    def stats(self) -> LimiterStats:
+        """Gets the current metrics of the limiter.
+        """
+        return LimiterStats(
+            limit=round(self._limit, 2),
+            in_flight=self._in_flight,
+            queued=len(self._waiters),
+            throttled=self._throttled,
+            backoffs=self._backoffs
+        )
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Permit]:
+        """Waits until another request can be sent to IQFeed.
+
+        Yields:
+            The permit to send the request, which is released on exit.
+        """
+        if self._waiters or self._in_flight >= int(self._limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+            try:
+                await waiter
+
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just as the wait was cancelled
+                    self._in_flight -= 1
+                    self._wake()
+
+                else:
+                    self._waiters.remove(waiter)
+
+                raise
+
+        else:
+            self._in_flight += 1
+
+        permit = Permit(asyncio.get_running_loop().time())
+
+        try:
+            yield permit
+
+        finally:
+            self._in_flight -= 1
+            self._release(permit)
+
+    def _release(self, permit: Permit) -> None:
+        """Adjusts the limit based on how a request went, and lets waiting
+        requests through if there is room.
+
+        Args:
+            permit: The permit of the completed request.
+        """
+        now = asyncio.get_running_loop().time()
+        latency = permit.latency
+
+        if permit.throttled:
+            self._throttled += 1
+            self._back_off(permit, now, THROTTLE_BACKOFF)
+
+        elif latency is not None:
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                self._baseline *= 1 + BASELINE_DRIFT
+
+            if latency > self._baseline * LATENCY_TOLERANCE:
+                self._back_off(permit, now, LATENCY_BACKOFF)
+
+            else:
+                self._limit = min(
+                    self._max_limit, self._limit + 1 / self._limit
+                )
+
+        self._wake()
+
+    def _back_off(self, permit: Permit, now: float, factor: float) -> None:
+        """Cuts the limit, unless it was already cut after the request was
+        sent.
+
+        Args:
+            permit: The permit of the request that went badly.
+            now: The current loop time.
+            factor: The factor to cut the limit by.
+        """
+        if permit.started <= self._last_backoff:
+            return
+
+        self._limit = max(self._min_limit, self._limit * factor)
+        self._last_backoff = now
+        self._backoffs += 1
+        logger.info("Backing off IQFeed requests to %.1f", self._limit)
+
+    def _wake(self) -> None:
+        """Lets waiting requests through while there is room under the limit.
+        """
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
@@ -0,0 +1,214 @@
+from typing import Deque
+from typing import Final
+from typing import List
+from typing import Optional
+from typing import cast
+import asyncio
+import collections
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# Stop reading from the socket once this many lines are waiting to be handled
+DEFAULT_MAX_PENDING_LINES: Final = 100000
+
+
+class LineProtocol(asyncio.Protocol):
+    """Reads lines sent by IQFeed. Complete lines are split out of each chunk
+    of data in bulk and queued as a batch, and a single idle timer is shared
+    by every read rather than creating one per line.
+    """
+
+    def __init__(
+        self, idle_timeout: float,
+        max_pending_lines: int = DEFAULT_MAX_PENDING_LINES
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            idle_timeout: The number of seconds without data before
+            read_lines() raises asyncio.TimeoutError.
+            max_pending_lines: The number of queued lines at which reading
+            from the socket is paused until the lines are handled.
+        """
+        self._batches = collections.deque()  # type: Deque[List[str]]
+        self._buffer = bytearray()
+        self._closed = False
+        self._drain_waiter = None  # type: Optional[asyncio.Future]
+        self._idle_timeout = idle_timeout
+        self._idle_timer = None  # type: Optional[asyncio.TimerHandle]
+        self._last_received = 0.0
+        self._loop = asyncio.get_running_loop()
+        self._max_pending_lines = max_pending_lines
+        self._pending_lines = 0
+        self._read_waiter = None  # type: Optional[asyncio.Future]
+        self._reading_paused = False
+        self._transport = None  # type: Optional[asyncio.Transport]
+        self._writing_paused = False
+
+    @property
+    def transport(self) -> asyncio.Transport:
+        """Gets the transport the protocol is connected to.
+
+        Raises:
+            RuntimeError: If the protocol isn't connected.
+        """
+        if not self._transport:
+            raise RuntimeError("Not connected")
+
+        return self._transport
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        # uvloop's transports don't subclass asyncio.Transport, so this can't
+        # be checked with isinstance()
+        self._transport = cast(asyncio.Transport, transport)
+        self._last_received = self._loop.time()
+        self._idle_timer = self._loop.call_later(
+            self._idle_timeout, self._check_idle
+        )
+
+    def data_received(self, data: bytes) -> None:
+        self._last_received = self._loop.time()
+        self._buffer += data
+
+        end = self._buffer.rfind(b"\n")
+        if end < 0:
+            return
+
+        lines = self._buffer[:end].decode("latin-1").split("\n")
+        del self._buffer[:end + 1]
+
+        self._batches.append(lines)
+        self._pending_lines += len(lines)
+
+        if (
+            self._pending_lines >= self._max_pending_lines and
+            not self._reading_paused
+        ):
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+        self._wake_reader()
+
+    def eof_received(self) -> Optional[bool]:
+        # The last line doesn't have to end with a newline
+        if self._buffer:
+            self._batches.append([self._buffer.decode("latin-1")])
+            self._pending_lines += 1
+            self._buffer.clear()
+
+        self._close()
+        return None
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._close()
+
+        if self._drain_waiter and not self._drain_waiter.done():
+            self._drain_waiter.set_exception(
+                ConnectionResetError("Connection lost")
+            )
+
+    def pause_writing(self) -> None:
+        self._writing_paused = True
+
+    def resume_writing(self) -> None:
+        self._writing_paused = False
+
+        if self._drain_waiter and not self._drain_waiter.done():
+            self._drain_waiter.set_result(None)
+
+    async def read_lines(self) -> List[str]:
+        """Gets the next batch of lines. Lines still have any trailing
+        carriage return.
+
+        Returns:
+            The next batch of lines. An empty list if the connection has been
+            closed.
+
+        Raises:
+            asyncio.TimeoutError: If no data is received within the idle
+            timeout.
+        """
+        while not self._batches:
+            if self._closed:
+                return []
+
+            self._read_waiter = self._loop.create_future()
+
+            try:
+                await self._read_waiter
+
+            finally:
+                self._read_waiter = None
+
+        lines = self._batches.popleft()
+        self._pending_lines -= len(lines)
+
+        if self._reading_paused and (
+            self._pending_lines < self._max_pending_lines // 2
+        ):
+            self._reading_paused = False
+            self.transport.resume_reading()
+
+        return lines
+
+    async def drain(self) -> None:
+        """Waits until it is appropriate to write more data to the transport.
+        Only one caller may wait at a time.
+
+        Raises:
+            ConnectionResetError: If the connection is lost.
+        """
+        if self._closed:
+            raise ConnectionResetError("Connection lost")
+
+        if not self._writing_paused:
+            return
+
+        self._drain_waiter = self._loop.create_future()
+
+        try:
+            await self._drain_waiter
+
+        finally:
+            self._drain_waiter = None
+
+    def _check_idle(self) -> None:
+        """Called by the idle timer. Signals a timeout to the reader if nothing
+        has been received for the idle timeout, otherwise waits for the
+        remainder of the timeout.
+        """
+        if self._closed:
+            return
+
+        remaining = self._last_received + self._idle_timeout - \
+            self._loop.time()
+
+        if remaining <= 0:
+            if self._read_waiter and not self._read_waiter.done():
+                self._read_waiter.set_exception(asyncio.TimeoutError())
+
+            # Give the reader a full timeout after the signal
+            self._last_received = self._loop.time()
+            remaining = self._idle_timeout
+
+        self._idle_timer = self._loop.call_later(remaining, self._check_idle)
+
+    def _close(self) -> None:
+        """Marks the connection as closed and wakes up the reader.
+        """
+        self._closed = True
+
+        if self._idle_timer:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+        self._wake_reader()
+
+    def _wake_reader(self) -> None:
+        """Wakes up the reader if it is waiting for data.
+        """
+        if self._read_waiter and not self._read_waiter.done():
+            self._read_waiter.set_result(None)
@@ -0,0 +1,221 @@
+from typing import AsyncIterator
+from typing import Deque
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+import asyncio
+import collections
+import contextlib
+import logging
+
+from iqfeedserver.iq import AdaptiveLimiter
+from iqfeedserver.iq import ConnectionState
+from iqfeedserver.iq import IQFeedError
+from iqfeedserver.iq import NoDataError
+from iqfeedserver.iq.limiter import DEFAULT_MAX_LIMIT
+from iqfeedserver.iq.history_conn import HistoryConn
+
+
+logger = logging.getLogger(__name__)
+
+
+# A request holds its connection until it completes, so the pool is as
+# large as the limiter can grow
+DEFAULT_POOL_SIZE: Final = DEFAULT_MAX_LIMIT
+
+
+class PoolStats(NamedTuple):
+    """A snapshot of the metrics collected by a HistoryConnPool.
+    """
+    hits: int
+    misses: int
+    waits: int
+    reconnects: int
+    discards: int
+    idle: int
+    in_use: int
+
+
+class HistoryConnPool:
+    """Maintains a bounded set of long-lived HistoryConn instances connected to
+    a single IQFeed lookup host. Connections are borrowed with acquire() and
+    returned to the pool once the caller is done with them, so the connect and
+    protocol handshake only happen when the pool grows or a connection dies.
+
+    Every connection in the pool shares an AdaptiveLimiter, which controls how
+    many requests are in flight to the host across all of them. The pool size
+    only caps the number of open connections. A request holds its connection
+    until it completes, so the pool should be at least as large as the
+    limiter can grow, or the pool caps requests in flight before the limiter
+    does.
+    """
+
+    def __init__(
+        self, host: str, port: int, max_size: int = DEFAULT_POOL_SIZE,
+        limiter: Optional[AdaptiveLimiter] = None
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            host: The IQFeed host to connect to.
+            port: The IQFeed lookup port to connect to.
+            max_size: The maximum number of connections that can be open to
+            the host at the same time.
+            limiter: Limits the number of requests in flight to the host. A
+            new limiter with the default limits is created if None.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self._host = host
+        self._limiter = limiter or AdaptiveLimiter()
+        self._port = port
+        self._max_size = max_size
+        self._idle = collections.deque()  # type: Deque[HistoryConn]
+        self._in_use = 0
+        self._semaphore = None  # type: Optional[asyncio.Semaphore]
+
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._reconnects = 0
+        self._discards = 0
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        """Gets the limiter shared by the connections in the pool.
+        """
+        return self._limiter
+
+    @property
+    def stats(self) -> PoolStats:
+        """Gets the current metrics of the pool.
+        """
+        return PoolStats(
+            hits=self._hits,
+            misses=self._misses,
+            waits=self._waits,
+            reconnects=self._reconnects,
+            discards=self._discards,
+            idle=len(self._idle),
+            in_use=self._in_use
+        )
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[HistoryConn]:
+        """Borrows a healthy connection from the pool, opening a new one if
+        no idle connection is available. Waits if the pool is at capacity.
+
+        Yields:
+            A connected HistoryConn instance.
+
+        Raises:
+            OSError: If a new connection to IQFeed could not be established.
+        """
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            self._waits += 1
+
+        async with semaphore:
+            conn = await self._checkout()
+            self._in_use += 1
+
+            try:
+                yield conn
+
+            except (NoDataError, IQFeedError):
+                # IQFeed answered the request, so the connection is fine
+                await self._release(conn)
+                raise
+
+            except BaseException:
+                # The connection may still receive replies for an abandoned
+                # request so it can't be handed to anyone else
+                self._discards += 1
+                await self._close(conn)
+                raise
+
+            else:
+                await self._release(conn)
+
+            finally:
+                self._in_use -= 1
+
+    async def close(self) -> None:
+        """Disconnects all idle connections in the pool.
+        """
+        while self._idle:
+            await self._close(self._idle.popleft())
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Gets the semaphore limiting concurrency to the host. The semaphore
+        is created lazily so that it is bound to the running loop.
+
+        Returns:
+            The semaphore for this pool.
+        """
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self._max_size)
+
+        return self._semaphore
+
+    async def _checkout(self) -> HistoryConn:
+        """Takes a healthy idle connection or opens a new one.
+
+        Returns:
+            A connected HistoryConn instance.
+        """
+        while self._idle:
+            conn = self._idle.pop()
+            if self._is_healthy(conn):
+                self._hits += 1
+                return conn
+
+            logger.info("Replacing dead IQFeed connection to %s", self._host)
+            self._reconnects += 1
+            await self._close(conn)
+
+        self._misses += 1
+        conn = HistoryConn(self._limiter)
+        await conn.connect(self._host, self._port)
+        return conn
+
+    async def _release(self, conn: HistoryConn) -> None:
+        """Returns a connection to the pool if it is still healthy, or
+        disconnects it otherwise.
+
+        Args:
+            conn: The connection to return.
+        """
+        if self._is_healthy(conn):
+            self._idle.append(conn)
+
+        else:
+            self._discards += 1
+            await self._close(conn)
+
+    @staticmethod
+    def _is_healthy(conn: HistoryConn) -> bool:
+        """Checks whether a connection can still be used.
+
+        Args:
+            conn: The connection to check.
+
+        Returns:
+            True if the connection is still reading messages from IQFeed.
+        """
+        return conn.state == ConnectionState.READING_MESSAGES
+
+    @staticmethod
+    async def _close(conn: HistoryConn) -> None:
+        """Disconnects a connection, ignoring any errors since the connection
+        may already be broken.
+
+        Args:
+            conn: The connection to disconnect.
+        """
+        try:
+            await conn.disconnect()
+
+        except Exception:
+            logger.debug("Error disconnecting from IQFeed", exc_info=True)
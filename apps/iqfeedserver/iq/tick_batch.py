@@ -0,0 +1,221 @@
+from typing import Final
+from typing import List
+from typing import Sequence
+import array
+
+import numpy
+
+from iqfeedserver.iq import field_readers
+
+
+# Column name and array typecode, in the order they are stored
+TICK_COLUMNS: Final = (
+    ("timestamps", "q"),
+    ("last_p", "d"),
+    ("last_size", "q"),
+    ("tot_vlm", "q"),
+    ("bid_p", "d"),
+    ("ask_p", "d"),
+    ("tick_id", "q"),
+)
+
+
+class TickBatch:
+    """Stores the ticks of a single ticker as columns of NumPy arrays. A day
+    of ticks for a liquid ticker runs to millions of rows, so ticks are never
+    turned into Python objects. Timestamps are the number of microseconds
+    since the epoch, kept in IQFeed's time zone.
+
+    Prices are kept as float64 rather than float32, since float32 can't hold
+    every price to the cent.
+    """
+
+    def __init__(
+        self, ticker: str, timestamps: numpy.ndarray, last_p: numpy.ndarray,
+        last_size: numpy.ndarray, tot_vlm: numpy.ndarray,
+        bid_p: numpy.ndarray, ask_p: numpy.ndarray, tick_id: numpy.ndarray
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            ticker: The ticker the ticks belong to.
+            timestamps: The int64 time of each tick.
+            last_p: The float64 price of each trade.
+            last_size: The int64 size of each trade.
+            tot_vlm: The int64 total volume for the day as of each tick.
+            bid_p: The float64 bid at the time of each tick.
+            ask_p: The float64 ask at the time of each tick.
+            tick_id: The int64 ID IQFeed gave each tick.
+        """
+        self.ticker = ticker
+        self.timestamps = timestamps
+        self.last_p = last_p
+        self.last_size = last_size
+        self.tot_vlm = tot_vlm
+        self.bid_p = bid_p
+        self.ask_p = ask_p
+        self.tick_id = tick_id
+
+    @classmethod
+    def concatenate(
+        cls, ticker: str, batches: Sequence["TickBatch"]
+    ) -> "TickBatch":
+        """Joins batches of ticks together into a single batch.
+
+        Args:
+            ticker: The ticker the ticks belong to.
+            batches: The batches to join, in order.
+
+        Returns:
+            The joined batch.
+        """
+        if not batches:
+            return cls(ticker, *(
+                numpy.empty(0, dtype=typecode) for _, typecode in TICK_COLUMNS
+            ))
+
+        if len(batches) == 1:
+            return batches[0]
+
+        return cls(ticker, *(
+            numpy.concatenate(columns)
+            for columns in zip(*(batch.columns for batch in batches))
+        ))
+
+    @property
+    def columns(self) -> List[numpy.ndarray]:
+        """Gets the columns of the batch in the order listed in TICK_COLUMNS.
+        """
+        return [getattr(self, name) for name, _ in TICK_COLUMNS]
+
+    @property
+    def nbytes(self) -> int:
+        """Gets the number of bytes used by the columns of the batch.
+        """
+        return sum(column.nbytes for column in self.columns)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def slice(self, start: int, stop: int) -> "TickBatch":
+        """Gets a batch of a range of ticks. The columns of the returned batch
+        are views of this batch's columns, so no data is copied.
+
+        Args:
+            start: The index of the first tick to include.
+            stop: The index after the last tick to include.
+
+        Returns:
+            The batch containing the range of ticks.
+        """
+        return TickBatch(self.ticker, *(
+            column[start:stop] for column in self.columns
+        ))
+
+    def between(self, start: int, end: int) -> "TickBatch":
+        """Gets the ticks in a period. Timestamps are sorted, so the ticks are
+        found with binary searches and no data is copied.
+
+        Args:
+            start: The earliest timestamp to include, in microseconds since
+            the epoch.
+            end: The latest timestamp to include, in microseconds since the
+            epoch.
+
+        Returns:
+            The batch containing the ticks in the period.
+        """
+        return self.slice(
+            int(numpy.searchsorted(self.timestamps, start)),
+            int(numpy.searchsorted(self.timestamps, end, side="right"))
+        )
+
+
+class TickBatchBuilder:
+    """Accumulates ticks into growable typed buffers and turns them into a
+    TickBatch.
+    """
+
+    def __init__(self, ticker: str) -> None:
+        """Instantiates the instance.
+
+        Args:
+            ticker: The ticker of the ticks being built.
+        """
+        self._ticker = ticker
+        self._timestamps = array.array("q")
+        self._last_p = array.array("d")
+        self._last_size = array.array("q")
+        self._tot_vlm = array.array("q")
+        self._bid_p = array.array("d")
+        self._ask_p = array.array("d")
+        self._tick_id = array.array("q")
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def append_tick_fields(self, fields: List[str]) -> None:
+        """Adds a tick from the fields of an IQFeed tick message. Fields after
+        the tick ID, such as the trade conditions, are ignored.
+
+        Args:
+            fields: The fields of the message, starting with the ticker.
+
+        Raises:
+            ValueError: If invalid fields were provided.
+        """
+        (
+            _, timestamp, last_p, last_size, tot_vlm, bid_p, ask_p, tick_id
+        ) = fields[:8]
+
+        # Convert everything before appending so a bad field can't leave the
+        # columns with different lengths
+        values = (
+            field_readers.convert_iqfeed_tick_timestamp_to_epoch_micros(
+                timestamp
+            ),
+            float(last_p),
+            int(last_size),
+            int(tot_vlm),
+            float(bid_p),
+            float(ask_p),
+            int(tick_id)
+        )
+
+        self._timestamps.append(values[0])
+        self._last_p.append(values[1])
+        self._last_size.append(values[2])
+        self._tot_vlm.append(values[3])
+        self._bid_p.append(values[4])
+        self._ask_p.append(values[5])
+        self._tick_id.append(values[6])
+
+    def take(self) -> TickBatch:
+        """Creates a batch from the ticks added since the last call and starts
+        collecting a new batch.
+
+        Returns:
+            The batch of ticks added since the last call.
+        """
+        batch = TickBatch(self._ticker, *(
+            numpy.array(getattr(self, "_" + name), dtype=typecode)
+            for name, typecode in TICK_COLUMNS
+        ))
+
+        for name, _ in TICK_COLUMNS:
+            del getattr(self, "_" + name)[:]
+
+        return batch
+
+    def build(self) -> TickBatch:
+        """Creates the batch from the ticks added so far. The NumPy arrays
+        share memory with the builder's buffers, so the builder must not be
+        used after calling this.
+
+        Returns:
+            The batch of ticks.
+        """
+        return TickBatch(self._ticker, *(
+            numpy.frombuffer(getattr(self, "_" + name), dtype=typecode)
+            for name, typecode in TICK_COLUMNS
+        ))
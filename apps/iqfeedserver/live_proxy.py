@@ -0,0 +1,461 @@
+from typing import AsyncGenerator
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+import asyncio
+import datetime
+import functools
+import logging
+
+from iqfeedserver import iq
+
+
+logger = logging.getLogger(__name__)
+
+
+HISTORY_BAR: Final = "BH"
+LIVE_BAR: Final = "BC"
+
+# The most bars a watch keeps for subscribers joining late. A day of 1 second
+# bars, which takes around 35MB
+MAX_WATCH_BARS: Final = 86400
+
+
+class LiveStats(NamedTuple):
+    """A snapshot of the metrics collected by a LiveProxy.
+    """
+    watches: int
+    subscribers: int
+    upstream_watches: int
+    shared: int
+    lost: int
+
+
+class _Watch:
+    """An upstream watch of a ticker at an interval. The last MAX_WATCH_BARS
+    bars received are kept, with only the latest version of the bar in
+    progress, and each subscriber reads the bars through its own cursor. A
+    subscriber that falls behind skips straight to the latest version of
+    each bar, so slow subscribers never buffer anything and never hold up
+    the others.
+    """
+
+    def __init__(self) -> None:
+        """Instantiates the instance.
+        """
+        self.bars = []  # type: List[Tuple[str, iq.Bar]]
+        self.ended = False
+        self.error = None  # type: Optional[Exception]
+        self.started = None  # type: Optional[asyncio.Task]
+        self.subscribers = 0
+        self.version = 0
+        self._dropped = 0
+        self._versions = []  # type: List[int]
+        self._waiters = []  # type: List[asyncio.Future]
+
+    def add(self, bar_type: str, bar: iq.Bar) -> None:
+        """Records a bar and wakes every subscriber.
+
+        Args:
+            bar_type: Whether the bar is a history bar or a live bar.
+            bar: The bar received from IQFeed.
+        """
+        self.version += 1
+
+        # IQFeed updates the bar in progress several times, so only its
+        # latest version is kept
+        last = self.bars[-1][1] if self.bars else None
+        if last and (last.date, last.time) == (bar.date, bar.time):
+            self.bars[-1] = (bar_type, bar)
+            self._versions[-1] = self.version
+        else:
+            self.bars.append((bar_type, bar))
+            self._versions.append(self.version)
+
+        # Drop the oldest bars in bulk so each bar isn't moved every time
+        if len(self.bars) > MAX_WATCH_BARS:
+            dropped = len(self.bars) - MAX_WATCH_BARS + MAX_WATCH_BARS // 10
+            del self.bars[:dropped]
+            del self._versions[:dropped]
+            self._dropped += dropped
+
+        self._wake()
+
+    def end(self, error: Optional[Exception] = None) -> None:
+        """Ends the streams of every subscriber once they have read the bars
+        received so far.
+
+        Args:
+            error: The error to raise from the streams. None to end them
+            cleanly.
+        """
+        self.ended = True
+        self.error = error
+        self._wake()
+
+    async def wait(self, version: int) -> None:
+        """Waits until the watch changes or ends.
+
+        Args:
+            version: The version of the watch last read by the subscriber.
+        """
+        while self.version == version and not self.ended:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    def read(
+        self, position: int, version: int
+    ) -> Tuple[List[Tuple[str, iq.Bar]], int]:
+        """Gets the bars a subscriber hasn't read yet.
+
+        Args:
+            position: The number of bars the subscriber has read.
+            version: The version of the watch last read by the subscriber.
+
+        Returns:
+            The bars added since the subscriber last read, preceded by the
+            last bar it read if that bar has been updated since, and the new
+            position of the subscriber. A subscriber that fell behind the
+            bars kept skips the bars dropped since.
+        """
+        index = position - self._dropped
+        if index > 0 and self._versions[index - 1] > version:
+            index -= 1
+
+        return self.bars[max(index, 0):], self._dropped + len(self.bars)
+
+    def _wake(self) -> None:
+        """Wakes every subscriber waiting for the watch to change.
+        """
+        waiters = self._waiters
+        self._waiters = []
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class LiveProxy:
+    """Shares upstream IQFeed watches between every client watching the same
+    ticker at the same interval. The first subscriber of a ticker starts a
+    watch with IQFeed, backfilled from the start of the day, and the bars it
+    receives are fanned out to every subscriber. Subscribers joining later
+    are sent the bars received so far. The watch is stopped once the last
+    subscriber leaves.
+
+    A single connection per interval is opened to IQFeed's derivative port,
+    since IQFeed only keeps one watch per ticker on each connection. If the
+    connection is lost, or IQFeed has no data for a ticker, the streams of
+    the affected watches end with an error, and the next subscriber opens a
+    new connection.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        """Instantiates the instance.
+
+        Args:
+            host: The IQFeed host to connect to.
+            port: The IQFeed derivative port to connect to.
+        """
+        self._closing = set()  # type: Set[asyncio.Task]
+        self._conns = {}  # type: Dict[int, iq.BarConn]
+        self._connect_lock = asyncio.Lock()
+        self._host = host
+        self._lost = 0
+        self._port = port
+        self._shared = 0
+        self._upstream_watches = 0
+        self._watches = {}  # type: Dict[Tuple[str, int], _Watch]
+
+    @property
+    def stats(self) -> LiveStats:
+        """Gets the current metrics of the proxy.
+        """
+        return LiveStats(
+            watches=len(self._watches),
+            subscribers=sum(
+                watch.subscribers for watch in self._watches.values()
+            ),
+            upstream_watches=self._upstream_watches,
+            shared=self._shared,
+            lost=self._lost
+        )
+
+    async def stream(
+        self, ticker: str, interval: int, start: datetime.datetime
+    ) -> AsyncGenerator[List[Tuple[str, iq.Bar]], None]:
+        """Watches a ticker until the stream is closed.
+
+        Args:
+            ticker: The ticker to watch.
+            interval: The number of seconds in each bar.
+            start: The time to send bars from. Bars ending at or before this
+            time are skipped.
+
+        Yields:
+            Lists of the bars received since the last list, each with its bar
+            type, in order. A bar updated since it was last yielded is
+            yielded again.
+
+        Raises:
+            NoDataError: If IQFeed has no data for the ticker.
+            ConnectionError: If the connection to IQFeed was lost.
+        """
+        key = (ticker, interval)
+        watch = self._subscribe(key, start)
+        position = version = 0
+
+        try:
+            while True:
+                await watch.wait(version)
+
+                ended = watch.ended
+                items, position = watch.read(position, version)
+                version = watch.version
+
+                # Bars are timestamped with their end time
+                bars = [
+                    item for item in items if
+                    datetime.datetime.combine(item[1].date, item[1].time)
+                    > start
+                ]
+                if bars:
+                    yield bars
+
+                if ended:
+                    if watch.error:
+                        raise watch.error
+
+                    return
+
+        finally:
+            await self._unsubscribe(key, watch)
+
+    async def close(self) -> None:
+        """Ends every stream and disconnects from IQFeed.
+        """
+        for watch in self._watches.values():
+            if watch.started:
+                watch.started.cancel()
+
+            watch.end()
+
+        self._watches.clear()
+
+        for conn in self._conns.values():
+            await conn.disconnect()
+
+        self._conns.clear()
+
+        # Wait for lost connections that are still being closed
+        await asyncio.gather(*self._closing)
+
+    def _subscribe(
+        self, key: Tuple[str, int], start: datetime.datetime
+    ) -> _Watch:
+        """Adds a subscriber to the watch of a ticker, starting the watch if
+        it's the first subscriber. The watch is started in a task of its own,
+        so a subscriber leaving while it starts can't leave it half started.
+
+        Args:
+            key: The ticker and interval to watch.
+            start: The time to send bars from. The watch is backfilled from
+            the start of its day.
+
+        Returns:
+            The watch to read the bars from.
+        """
+        watch = self._watches.get(key)
+        if watch:
+            self._shared += 1
+            watch.subscribers += 1
+            return watch
+
+        watch = _Watch()
+        watch.subscribers = 1
+        watch.started = asyncio.get_running_loop().create_task(
+            self._start_watch(key, watch, start)
+        )
+        self._watches[key] = watch
+        return watch
+
+    async def _start_watch(
+        self, key: Tuple[str, int], watch: _Watch, start: datetime.datetime
+    ) -> None:
+        """Asks IQFeed to watch a ticker. The streams of the watch's
+        subscribers end with the error if IQFeed can't be asked.
+
+        Args:
+            key: The ticker and interval to watch.
+            watch: The watch to start.
+            start: The time to send bars from. The watch is backfilled from
+            the start of its day.
+        """
+        ticker, interval = key
+
+        try:
+            conn = await self._get_conn(interval)
+            await conn.watch(
+                ticker,
+                datetime.datetime.combine(start.date(), datetime.time()),
+                interval, req_id="L-%s-%04d" % (ticker, interval)
+            )
+
+        except Exception as e:
+            if self._watches.get(key) is watch:
+                del self._watches[key]
+
+            watch.end(e)
+            return
+
+        self._upstream_watches += 1
+        logger.info("Watching %s at %d seconds", ticker, interval)
+
+    async def _unsubscribe(self, key: Tuple[str, int], watch: _Watch) -> None:
+        """Removes a subscriber from the watch of a ticker, stopping the watch
+        if it was the last subscriber.
+
+        Args:
+            key: The ticker and interval being watched.
+            watch: The watch the subscriber read from.
+        """
+        if self._watches.get(key) is not watch:
+            return
+
+        watch.subscribers -= 1
+        if watch.subscribers:
+            return
+
+        ticker, interval = key
+        del self._watches[key]
+
+        # The watch can only be stopped once IQFeed has been asked for it.
+        # Waiting doesn't cancel the start if this subscriber is cancelled
+        assert watch.started
+        await asyncio.wait({watch.started})
+
+        # A new watch of the ticker replaced this one in the meantime
+        if watch.ended or key in self._watches:
+            return
+
+        conn = self._conns.get(interval)
+        if conn and conn.state == iq.ConnectionState.READING_MESSAGES:
+            logger.info("Unwatching %s at %d seconds", ticker, interval)
+            await conn.unwatch(ticker)
+
+    def _end_watch(
+        self, key: Tuple[str, int], error: Optional[Exception]
+    ) -> None:
+        """Stops tracking a watch and ends the streams of its subscribers.
+
+        Args:
+            key: The ticker and interval being watched.
+            error: The error to end the streams with.
+        """
+        watch = self._watches.pop(key, None)
+        if watch:
+            watch.end(error)
+
+    async def _get_conn(self, interval: int) -> iq.BarConn:
+        """Gets the connection watching tickers at an interval, connecting to
+        IQFeed if needed.
+
+        Args:
+            interval: The number of seconds in each bar.
+
+        Returns:
+            The connection to IQFeed.
+        """
+        async with self._connect_lock:
+            conn = self._conns.get(interval)
+            if conn:
+                return conn
+
+            conn = iq.BarConn()
+            conn.register_history_bar_callback(
+                functools.partial(self._handle_bar, interval, HISTORY_BAR)
+            )
+            conn.register_live_bar_callback(
+                functools.partial(self._handle_bar, interval, LIVE_BAR)
+            )
+            conn.register_no_data_callback(
+                functools.partial(self._handle_no_data, interval)
+            )
+            conn.register_disconnect_callback(
+                functools.partial(self._handle_disconnect, interval, conn)
+            )
+
+            await conn.connect(self._host, self._port)
+            self._conns[interval] = conn
+            return conn
+
+    async def _handle_bar(
+        self, interval: int, bar_type: str, bar: iq.Bar
+    ) -> None:
+        """Fans a bar received from IQFeed out to its subscribers.
+
+        Args:
+            interval: The interval of the connection the bar was received on.
+            bar_type: Whether the bar is a history bar or a live bar.
+            bar: The bar received from IQFeed.
+        """
+        watch = self._watches.get((bar.ticker, interval))
+        if watch:
+            watch.add(bar_type, bar)
+
+    async def _handle_no_data(self, interval: int, ticker: str) -> None:
+        """Ends the watch of a ticker IQFeed has no data for.
+
+        Args:
+            interval: The interval of the connection the message was received
+            on.
+            ticker: The ticker IQFeed has no data for.
+        """
+        logger.info("No live data for %s at %d seconds", ticker, interval)
+        self._end_watch(
+            (ticker, interval), iq.NoDataError("No data for %s" % ticker)
+        )
+
+    async def _handle_disconnect(
+        self, interval: int, conn: iq.BarConn
+    ) -> None:
+        """Forgets a connection IQFeed closed and ends the watches it served.
+
+        Args:
+            interval: The interval of the connection.
+            conn: The connection that was lost.
+        """
+        if self._conns.get(interval) is not conn:
+            return
+
+        logger.warning("Lost the live connection to IQFeed at %d", interval)
+        del self._conns[interval]
+        self._lost += 1
+
+        for key in [key for key in self._watches if key[1] == interval]:
+            self._end_watch(
+                key, ConnectionError("Lost the connection to IQFeed")
+            )
+
+        # The connection can't be closed from its own reading task
+        task = asyncio.get_running_loop().create_task(self._close_conn(conn))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_conn(conn: iq.BarConn) -> None:
+        """Releases what's left of a lost connection.
+
+        Args:
+            conn: The connection to close.
+        """
+        try:
+            await conn.disconnect()
+
+        except Exception:
+            logger.debug("Error closing lost IQFeed connection", exc_info=True)
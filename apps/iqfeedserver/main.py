@@ -1,11 +1,17 @@
 from typing import Final
 import asyncio
+import functools
 import logging
+import os
+import signal
 import sys
 
 import uvloop
 
 import iqfeedserver.handler
+import iqfeedserver.session
+import iqfeedserver.supervisor
+import iqfeedserver.worker
 
 
 logger = logging.getLogger(__name__)
@@ -16,26 +22,64 @@ PORT: Final = 9999
 
 
 def main() -> None:
-    """Runs the server.
+    """Runs the server. Runs IQFEED_WORKERS worker processes sharing the port
+    when set to more than 1, or one per CPU when set to 0.
     """
     logging.basicConfig(
         stream=sys.stdout, level=logging.INFO, format="%(message)s"
     )
 
+    workers = get_worker_count()
+    if workers == 1:
+        run_worker()
+        return
+
+    supervisor = iqfeedserver.supervisor.Supervisor(
+        workers, functools.partial(run_worker, reuse_port=True)
+    )
+
+    def stop(signum: int, frame: object) -> None:
+        supervisor.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info("Running %d IQFeed Server workers", workers)
+    supervisor.run()
+    logger.info("Goodbye")
+
+
+def run_worker(reuse_port: bool = False) -> None:
+    """Runs the server in the current process until interrupted.
+
+    Args:
+        reuse_port: Whether to let other processes listen on the same port.
+    """
+    # Shut down cleanly when the supervisor stops the worker
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
     uvloop.install()
 
     try:
-        asyncio.run(run_server())
+        asyncio.run(run_server(reuse_port))
 
     except KeyboardInterrupt:
         logger.info("Goodbye")
 
 
-async def run_server() -> None:
+async def run_server(reuse_port: bool = False) -> None:
     """Runs the server async.
+
+    Args:
+        reuse_port: Whether to let other processes listen on the same port.
     """
-    handler = iqfeedserver.handler.IQFeedServerHandler()
-    server = await asyncio.start_server(handler.handle, HOST, PORT)
+    handler = iqfeedserver.handler.IQFeedServerHandler(int(os.environ.get(
+        "IQFEED_CLIENT_MAX_JOBS", iqfeedserver.session.DEFAULT_MAX_JOBS
+    )))
+    server = await asyncio.start_server(
+        handler.handle, HOST, PORT, reuse_port=reuse_port or None
+    )
 
     logger.info("Running IQFeed Server")
 
@@ -50,6 +94,21 @@ async def run_server() -> None:
         logger.info("Shutting down IQFeed Server")
         server.close()
         await server.wait_closed()
+        await iqfeedserver.worker.close()
+
+
+def get_worker_count() -> int:
+    """Gets the number of worker processes to run from the IQFEED_WORKERS
+    environment variable.
+
+    Returns:
+        The number of worker processes to run.
+    """
+    workers = int(os.environ.get("IQFEED_WORKERS", 1))
+    if workers < 0:
+        raise ValueError("IQFEED_WORKERS must not be negative")
+
+    return workers or os.cpu_count() or 1
 
 
 if __name__ == "__main__":
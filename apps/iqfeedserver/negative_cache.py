@@ -0,0 +1,190 @@
+from typing import Dict
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TTL: Final = 7 * 24 * 60 * 60
+FILE_NAME: Final = "no_data.json"
+SAVE_INTERVAL: Final = 60
+TICKS_FILE_NAME: Final = "no_ticks.json"
+
+# The interval recorded for days without ticks
+TICKS: Final = 0
+
+# Recent days may still be getting their data, so they are only remembered
+# for a short while
+RECENT_DAYS: Final = 3
+RECENT_TTL: Final = 15 * 60
+
+
+class NegativeCacheStats(NamedTuple):
+    """A snapshot of the metrics collected by a NegativeCache.
+    """
+    hits: int
+    entries: int
+
+
+class NegativeCache:
+    """Remembers the tickers and dates IQFeed had no data for so requests for
+    them can be answered without another round trip to IQFeed. Entries expire
+    after a TTL, which is shorter for recent days.
+
+    IQFeed keeps less history of short intervals than of long ones, so each
+    entry is only for the interval that was pulled.
+
+    When given a path, entries are persisted to a JSON file so they survive
+    restarts. The file is written at most every SAVE_INTERVAL seconds and
+    when the cache is flushed, and entries written to it by other processes
+    are merged in whenever it is written. Methods that write the file block
+    on disk I/O and are safe to call from executor threads.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, ttl: float = DEFAULT_TTL,
+        recent_ttl: float = RECENT_TTL
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            path: The file to persist entries to. Entries are only kept in
+            memory if None.
+            ttl: The number of seconds to remember a day without data for.
+            recent_ttl: The number of seconds to remember a recent day without
+            data for.
+        """
+        self._hits = 0
+        self._lock = threading.Lock()
+        self._next_save = time.time() + SAVE_INTERVAL
+        self._path = path
+        self._recent_ttl = recent_ttl
+        self._ttl = ttl
+        self._expiries = self._load()
+
+    @property
+    def stats(self) -> NegativeCacheStats:
+        """Gets the current metrics of the cache.
+        """
+        return NegativeCacheStats(hits=self._hits, entries=len(self._expiries))
+
+    def get(self, ticker: str, date: datetime.date, interval: int) -> bool:
+        """Checks whether IQFeed is known to have no data for a ticker on a
+        given date.
+
+        Args:
+            ticker: The ticker to check.
+            date: The date to check.
+            interval: The number of seconds in each bar pulled from IQFeed,
+            or TICKS for ticks.
+
+        Returns:
+            True if there is no data. False if there may be data.
+        """
+        # Looking up a single key is atomic, so it can be done without the
+        # lock
+        expiry = self._expiries.get((ticker, date, interval))
+        if expiry is None or expiry <= time.time():
+            return False
+
+        self._hits += 1
+        return True
+
+    def put(self, ticker: str, date: datetime.date, interval: int) -> None:
+        """Remembers that IQFeed has no data for a ticker on a given date.
+
+        Args:
+            ticker: The ticker without data.
+            date: The date without data.
+            interval: The number of seconds in each bar pulled from IQFeed,
+            or TICKS for ticks.
+        """
+        recent = date >= datetime.date.today() - datetime.timedelta(
+            days=RECENT_DAYS
+        )
+
+        with self._lock:
+            self._expiries[(ticker, date, interval)] = time.time() + (
+                self._recent_ttl if recent else self._ttl
+            )
+
+            if time.time() >= self._next_save:
+                self._save()
+
+    def flush(self) -> None:
+        """Writes the entries to disk.
+        """
+        with self._lock:
+            self._save()
+
+    def _load(self) -> Dict[Tuple[str, datetime.date, int], float]:
+        """Loads the entries that haven't expired from disk.
+
+        Returns:
+            The mapping of ticker, date and interval to expiry time.
+        """
+        expiries = {}  # type: Dict[Tuple[str, datetime.date, int], float]
+        if not self._path:
+            return expiries
+
+        try:
+            with open(self._path) as f:
+                entries = json.load(f)
+
+            now = time.time()
+            for ticker, date, interval, expiry in entries:
+                if float(expiry) > now:
+                    expiries[(
+                        ticker, datetime.date.fromisoformat(date),
+                        int(interval)
+                    )] = float(expiry)
+
+        except FileNotFoundError:
+            pass
+
+        except (OSError, ValueError, TypeError):
+            logger.exception("Unable to read the negative cache")
+
+        return expiries
+
+    def _save(self) -> None:
+        """Drops the expired entries, then writes the rest to disk along with
+        the entries written by other processes.
+        """
+        now = time.time()
+        self._next_save = now + SAVE_INTERVAL
+        expiries = {
+            key: expiry for key, expiry in self._expiries.items()
+            if expiry > now
+        }
+
+        if not self._path:
+            self._expiries = expiries
+            return
+
+        for key, expiry in self._load().items():
+            expiries[key] = max(expiry, expiries.get(key, 0.0))
+
+        self._expiries = expiries
+        temp_path = "%s.%d.tmp" % (self._path, os.getpid())
+
+        try:
+            with open(temp_path, "w") as f:
+                json.dump([
+                    (ticker, date.isoformat(), interval, expiry)
+                    for (ticker, date, interval), expiry in expiries.items()
+                ], f)
+
+            os.replace(temp_path, self._path)
+
+        except OSError:
+            logger.exception("Unable to write the negative cache")
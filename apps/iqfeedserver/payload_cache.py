@@ -0,0 +1,97 @@
+from typing import Final
+from typing import Hashable
+from typing import NamedTuple
+from typing import Optional
+import collections
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_BYTES: Final = 256 * 1024 ** 2
+
+
+class PayloadCacheStats(NamedTuple):
+    """A snapshot of the metrics collected by a PayloadCache.
+    """
+    hits: int
+    misses: int
+    hit_ratio: float
+    size: int
+    entries: int
+
+
+class PayloadCache:
+    """An in-memory LRU cache of encoded responses, bounded by the total number
+    of bytes held. Lets popular responses be sent to many clients without
+    pulling or formatting them again.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """Instantiates the instance.
+
+        Args:
+            max_bytes: The maximum number of bytes the cache can hold.
+        """
+        self._max_bytes = max_bytes
+        self._payloads = collections.OrderedDict(
+        )  # type: collections.OrderedDict[Hashable, bytes]
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self) -> PayloadCacheStats:
+        """Gets the current metrics of the cache.
+        """
+        requests = self._hits + self._misses
+
+        return PayloadCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            hit_ratio=self._hits / requests if requests else 0.0,
+            size=self._size,
+            entries=len(self._payloads)
+        )
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """Gets a cached payload.
+
+        Args:
+            key: The key of the payload.
+
+        Returns:
+            The cached payload. None if the payload isn't cached.
+        """
+        payload = self._payloads.get(key)
+
+        if payload is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._payloads.move_to_end(key)
+        return payload
+
+    def put(self, key: Hashable, payload: bytes) -> None:
+        """Caches a payload, evicting the least recently used payloads if the
+        cache grows too large. Payloads larger than the cache are ignored.
+
+        Args:
+            key: The key of the payload.
+            payload: The payload to cache.
+        """
+        if len(payload) > self._max_bytes:
+            return
+
+        previous = self._payloads.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+
+        self._payloads[key] = payload
+        self._size += len(payload)
+
+        while self._size > self._max_bytes:
+            _, evicted = self._payloads.popitem(last=False)
+            self._size -= len(evicted)
@@ -0,0 +1,191 @@
+from typing import AsyncGenerator
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import Set
+import asyncio
+import functools
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_JOBS: Final = 8
+
+
+class ClientSession:
+    """Tracks the state of a single client connection. Jobs requested by the
+    client run concurrently, at most max_jobs at a time. Each job streams its
+    response to the client in blocks of complete lines tagged with the job's
+    request ID, so responses for different tickers can interleave safely.
+
+    Jobs that run until the client stops them, like live watches, can be
+    submitted without a limit so they don't starve every other job.
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+        max_jobs: int = DEFAULT_MAX_JOBS
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            reader: The reader to receive messages from the client.
+            writer: The writer to send messages to the client.
+            max_jobs: The maximum number of jobs to run at the same time.
+        """
+        if max_jobs < 1:
+            raise ValueError("max_jobs must be at least 1")
+
+        self._jobs = {}  # type: Dict[str, Set[asyncio.Task]]
+        self._reader = reader
+        self._semaphore = asyncio.Semaphore(max_jobs)
+        self._write_lock = asyncio.Lock()
+        self._writer = writer
+
+    @property
+    def reader(self) -> asyncio.StreamReader:
+        """Gets the reader to receive messages from the client.
+        """
+        return self._reader
+
+    @property
+    def writer(self) -> asyncio.StreamWriter:
+        """Gets the writer to send messages to the client.
+        """
+        return self._writer
+
+    @property
+    def outstanding_jobs(self) -> int:
+        """Gets the number of jobs that haven't completed yet.
+        """
+        return sum(len(tasks) for tasks in self._jobs.values())
+
+    def submit(
+        self, ticker: str, job: Callable[[], AsyncGenerator[bytes, None]],
+        limited: bool = True
+    ) -> None:
+        """Runs a job in the background and streams its response to the
+        client.
+
+        Args:
+            ticker: The ticker the job is for.
+            job: Called to run the job. Yields chunks of the encoded response.
+            limited: Whether the job counts towards max_jobs.
+        """
+        task = asyncio.get_running_loop().create_task(
+            self._run_job(ticker, job, limited)
+        )
+        self._jobs.setdefault(ticker, set()).add(task)
+        task.add_done_callback(functools.partial(self._forget, ticker))
+
+    def cancel(self, ticker: str) -> None:
+        """Cancels all outstanding jobs for a ticker.
+
+        Args:
+            ticker: The ticker to cancel the jobs for.
+        """
+        for task in self._jobs.get(ticker, ()):
+            task.cancel()
+
+    async def close(self) -> None:
+        """Cancels all outstanding jobs and waits for them to finish.
+        """
+        tasks = [task for tasks in self._jobs.values() for task in tasks]
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def send(self, payload: bytes) -> bool:
+        """Sends already encoded messages back to the client with a single
+        write, waiting for the socket to drain only once.
+
+        Args:
+            payload: The encoded messages to send to the client.
+
+        Returns:
+            True if the messages were sent successfully. False otherwise.
+        """
+        logger.debug("Sending %d bytes", len(payload))
+
+        if self._writer.is_closing():
+            logger.info("Client disconnected")
+            return False
+
+        try:
+            # The payload is written in one go so it can't be split up by other
+            # responses, but only one job can wait for the socket to drain
+            self._writer.write(payload)
+
+            async with self._write_lock:
+                await self._writer.drain()
+
+        except Exception:
+            logger.info("Client disconnected")
+            return False
+
+        return True
+
+    async def _run_job(
+        self, ticker: str, job: Callable[[], AsyncGenerator[bytes, None]],
+        limited: bool
+    ) -> None:
+        """Runs a job and streams its response to the client. Waiting for each
+        chunk to be sent before taking the next one lets a slow client slow
+        down the job.
+
+        Args:
+            ticker: The ticker the job is for.
+            job: Called to run the job. Yields chunks of the encoded response.
+            limited: Whether to wait for one of the max_jobs slots first.
+        """
+        try:
+            if limited:
+                async with self._semaphore:
+                    await self._stream_job(job)
+
+            else:
+                await self._stream_job(job)
+
+        except asyncio.CancelledError:
+            logger.info("Cancelled job for %s", ticker)
+            raise
+
+        except Exception:
+            logger.exception("Error processing job for %s", ticker)
+
+    async def _stream_job(
+        self, job: Callable[[], AsyncGenerator[bytes, None]]
+    ) -> None:
+        """Streams the response of a job to the client until the job ends or
+        the client disconnects.
+
+        Args:
+            job: Called to run the job. Yields chunks of the encoded response.
+        """
+        chunks = job()
+
+        try:
+            async for chunk in chunks:
+                if not await self.send(chunk):
+                    return
+
+        finally:
+            await chunks.aclose()
+
+    def _forget(self, ticker: str, task: asyncio.Task) -> None:
+        """Stops tracking a completed job.
+
+        Args:
+            ticker: The ticker the job was for.
+            task: The task that ran the job.
+        """
+        tasks = self._jobs.get(ticker)
+        if tasks is None:
+            return
+
+        tasks.discard(task)
+        if not tasks:
+            del self._jobs[ticker]
@@ -0,0 +1,155 @@
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import Generic
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import TypeVar
+import asyncio
+import itertools
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# The number of chunks the slowest consumer of a stream can fall behind before
+# the producer waits for it to catch up
+MAX_STREAM_LAG: Final = 8
+
+T = TypeVar("T")
+
+
+class _Broadcast(Generic[T]):
+    """An in-flight stream and the position of each of its consumers.
+    """
+
+    def __init__(self) -> None:
+        """Instantiates the instance.
+        """
+        self.changed = asyncio.Event()
+        self.chunks = []  # type: List[T]
+        self.done = False
+        self.error = None  # type: Optional[Exception]
+        self.positions = {}  # type: Dict[int, int]
+        self.task = None  # type: Optional[asyncio.Task]
+
+    def notify(self) -> None:
+        """Wakes up everything waiting for the broadcast to change.
+        """
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent streams for the same key so that only one of them
+    runs, and every caller receives its chunks.
+    """
+
+    def __init__(self) -> None:
+        """Instantiates the instance.
+        """
+        self._broadcasts = {}  # type: Dict[Hashable, _Broadcast[T]]
+        self._coalesced = 0
+        self._consumer_ids = itertools.count()
+
+    @property
+    def coalesced(self) -> int:
+        """Gets the number of calls that joined another caller's stream.
+        """
+        return self._coalesced
+
+    async def stream(
+        self, key: Hashable, fn: Callable[[], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        """Streams the chunks produced by fn unless a stream for the same key
+        is already in flight, in which case streams that stream's chunks
+        instead. Callers that join late first receive every chunk produced so
+        far. The producer waits whenever the slowest caller falls too far
+        behind.
+
+        Args:
+            key: Identifies the stream.
+            fn: Called to produce the chunks.
+
+        Yields:
+            The chunks of the stream.
+        """
+        broadcast = self._broadcasts.get(key)
+
+        if broadcast:
+            self._coalesced += 1
+            logger.debug("Joining in-flight stream for %s", key)
+
+        else:
+            broadcast = _Broadcast()
+            broadcast.task = asyncio.get_running_loop().create_task(
+                self._produce(key, broadcast, fn)
+            )
+            self._broadcasts[key] = broadcast
+
+        consumer_id = next(self._consumer_ids)
+        broadcast.positions[consumer_id] = 0
+        position = 0
+
+        try:
+            while True:
+                while position >= len(broadcast.chunks) and not broadcast.done:
+                    await broadcast.changed.wait()
+
+                if position >= len(broadcast.chunks):
+                    break
+
+                chunk = broadcast.chunks[position]
+                position += 1
+                broadcast.positions[consumer_id] = position
+                broadcast.notify()
+
+                yield chunk
+
+            if broadcast.error:
+                raise broadcast.error
+
+        finally:
+            del broadcast.positions[consumer_id]
+            broadcast.notify()
+
+            # Nobody wants the stream anymore so stop producing it
+            if not broadcast.positions and not broadcast.done:
+                assert broadcast.task
+                broadcast.task.cancel()
+                if self._broadcasts.get(key) is broadcast:
+                    del self._broadcasts[key]
+
+    async def _produce(
+        self, key: Hashable, broadcast: _Broadcast[T],
+        fn: Callable[[], AsyncIterator[T]]
+    ) -> None:
+        """Produces the chunks of a stream for its consumers.
+
+        Args:
+            key: Identifies the stream.
+            broadcast: The stream to produce the chunks for.
+            fn: Called to produce the chunks.
+        """
+        try:
+            async for chunk in fn():
+                broadcast.chunks.append(chunk)
+                broadcast.notify()
+
+                while broadcast.positions and min(
+                    broadcast.positions.values()
+                ) < len(broadcast.chunks) - MAX_STREAM_LAG:
+                    await broadcast.changed.wait()
+
+        except Exception as e:
+            broadcast.error = e
+
+        finally:
+            broadcast.done = True
+            broadcast.notify()
+
+            if self._broadcasts.get(key) is broadcast:
+                del self._broadcasts[key]
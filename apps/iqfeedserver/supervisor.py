@@ -0,0 +1,193 @@
+from typing import Callable
+from typing import Final
+from typing import List
+import logging
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+MAX_RESTART_DELAY: Final = 30.0
+RESTART_DELAY: Final = 1.0
+
+# A worker that stays up this long is considered healthy again
+STABLE_SECONDS: Final = 60.0
+
+
+class _Worker:
+    """A worker process and its restart history.
+    """
+
+    def __init__(self, index: int, process: multiprocessing.Process) -> None:
+        """Instantiates the instance.
+
+        Args:
+            index: The slot the worker occupies.
+            process: The running worker process.
+        """
+        self.index = index
+        self.process = process
+        self.restart_at = 0.0
+        self.restart_delay = 0.0
+        self.started_at = time.monotonic()
+
+
+class Supervisor:
+    """Runs a number of identical worker processes and restarts any of them
+    that exit. Workers that keep crashing are restarted with an increasing
+    delay so a broken configuration doesn't spin the CPU.
+    """
+
+    def __init__(
+        self, workers: int, target: Callable[[], None],
+        restart_delay: float = RESTART_DELAY,
+        max_restart_delay: float = MAX_RESTART_DELAY
+    ) -> None:
+        """Instantiates the instance.
+
+        Args:
+            workers: The number of worker processes to run.
+            target: Called in each worker process to do its work. Must be
+            picklable.
+            restart_delay: The number of seconds to wait before restarting a
+            worker that exited.
+            max_restart_delay: The maximum number of seconds to wait before
+            restarting a worker that keeps exiting.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self._max_restart_delay = max_restart_delay
+        self._restart_delay = restart_delay
+        self._restarts = 0
+        self._stopping = threading.Event()
+        self._target = target
+        self._workers = []  # type: List[_Worker]
+        self._worker_count = workers
+
+    @property
+    def pids(self) -> List[int]:
+        """Gets the process IDs of the running workers.
+        """
+        return [
+            worker.process.pid for worker in self._workers
+            if worker.process.pid is not None and worker.process.is_alive()
+        ]
+
+    @property
+    def restarts(self) -> int:
+        """Gets the number of times a worker has been restarted.
+        """
+        return self._restarts
+
+    def run(self) -> None:
+        """Starts the workers and keeps them running until stop() is called.
+        Returns once every worker has exited.
+        """
+        try:
+            for index in range(self._worker_count):
+                self._workers.append(_Worker(index, self._start(index)))
+
+            while not self._stopping.is_set():
+                self._wait()
+
+        finally:
+            self._stop_workers()
+
+    def stop(self) -> None:
+        """Signals run() to stop the workers and return. Safe to call from a
+        signal handler or another thread.
+        """
+        self._stopping.set()
+
+    def _start(self, index: int) -> multiprocessing.Process:
+        """Starts a worker process.
+
+        Args:
+            index: The slot the worker occupies.
+
+        Returns:
+            The started process.
+        """
+        process = multiprocessing.Process(
+            target=self._target, name="iqfeedserver-%d" % index, daemon=True
+        )
+        process.start()
+
+        logger.info("Started worker %d with PID %d", index, process.pid)
+        return process
+
+    def _wait(self) -> None:
+        """Waits for a worker to exit or to be due for a restart, then restarts
+        any workers that are due.
+        """
+        now = time.monotonic()
+        sentinels = []  # type: List[int]
+        timeout = 1.0
+
+        for worker in self._workers:
+            if worker.process.is_alive():
+                sentinels.append(worker.process.sentinel)
+            else:
+                timeout = min(timeout, max(0.0, worker.restart_at - now))
+
+        multiprocessing.connection.wait(sentinels, timeout)
+
+        now = time.monotonic()
+        for worker in self._workers:
+            if worker.process.is_alive() or self._stopping.is_set():
+                continue
+
+            if not worker.restart_at:
+                self._schedule_restart(worker, now)
+
+            if now >= worker.restart_at:
+                worker.process.close()
+                worker.process = self._start(worker.index)
+                worker.restart_at = 0.0
+                worker.started_at = time.monotonic()
+                self._restarts += 1
+
+    def _schedule_restart(self, worker: _Worker, now: float) -> None:
+        """Decides when to restart a worker that exited.
+
+        Args:
+            worker: The worker that exited.
+            now: The current monotonic time.
+        """
+        if now - worker.started_at >= STABLE_SECONDS:
+            worker.restart_delay = self._restart_delay
+        else:
+            worker.restart_delay = min(
+                max(worker.restart_delay * 2, self._restart_delay),
+                self._max_restart_delay
+            )
+
+        worker.restart_at = now + worker.restart_delay
+
+        logger.error(
+            "Worker %d exited with code %s. Restarting in %.1fs",
+            worker.index, worker.process.exitcode, worker.restart_delay
+        )
+
+    def _stop_workers(self) -> None:
+        """Asks every worker to exit and waits for them to do so.
+        """
+        processes = [
+            worker.process for worker in self._workers
+            if worker.process.is_alive()
+        ]  # type: List[multiprocessing.Process]
+
+        for process in processes:
+            process.terminate()
+
+        for process in processes:
+            process.join(10)
+            if process.is_alive():
+                logger.error("Worker %d didn't exit, killing it", process.pid)
+                process.kill()
+                process.join()
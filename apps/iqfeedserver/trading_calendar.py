@@ -0,0 +1,212 @@
+from typing import FrozenSet
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+import datetime
+import functools
+
+
+EARLY_CLOSE: Final = datetime.time(13, 0)
+MARKET_CLOSE: Final = datetime.time(16, 0)
+MARKET_OPEN: Final = datetime.time(9, 30)
+
+# Days the exchange closed outside of its regular holiday rules
+SPECIAL_CLOSURES: Final = frozenset((
+    datetime.date(1994, 4, 27),
+    datetime.date(2001, 9, 11),
+    datetime.date(2001, 9, 12),
+    datetime.date(2001, 9, 13),
+    datetime.date(2001, 9, 14),
+    datetime.date(2004, 6, 11),
+    datetime.date(2007, 1, 2),
+    datetime.date(2012, 10, 29),
+    datetime.date(2012, 10, 30),
+    datetime.date(2018, 12, 5),
+    datetime.date(2025, 1, 9),
+))
+
+
+class Session(NamedTuple):
+    """The regular trading hours of a day.
+    """
+    open: datetime.datetime
+    close: datetime.datetime
+
+
+def get_session(day: datetime.date) -> Optional[Session]:
+    """Gets the regular trading hours of a day on the New York Stock
+    Exchange.
+
+    Args:
+        day: The day to get the trading hours of.
+
+    Returns:
+        The trading hours, closing early on half-days. None if the exchange is
+        closed.
+    """
+    if not is_trading_day(day):
+        return None
+
+    close = EARLY_CLOSE if day in get_early_closes(day.year) \
+        else MARKET_CLOSE
+
+    return Session(
+        datetime.datetime.combine(day, MARKET_OPEN),
+        datetime.datetime.combine(day, close)
+    )
+
+
+def is_trading_day(day: datetime.date) -> bool:
+    """Checks whether the exchange is open on a day.
+
+    Args:
+        day: The day to check.
+
+    Returns:
+        True if the exchange is open. False on weekends and holidays.
+    """
+    return day.weekday() < 5 and day not in get_holidays(day.year) and \
+        day not in SPECIAL_CLOSURES
+
+
+def get_next_trading_day(day: datetime.date) -> datetime.date:
+    """Gets the first trading day on or after a day.
+
+    Args:
+        day: The day to start looking from.
+
+    Returns:
+        The first trading day.
+    """
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+
+    return day
+
+
+@functools.lru_cache(maxsize=None)
+def get_holidays(year: int) -> FrozenSet[datetime.date]:
+    """Gets the regular exchange holidays of a year.
+
+    Args:
+        year: The year to get the holidays of.
+
+    Returns:
+        The days the exchange is closed for a holiday, moved to the day they
+        are observed on.
+    """
+    holidays = {
+        _observe(datetime.date(year, 7, 4)),
+        _observe(datetime.date(year, 12, 25)),
+        _get_easter(year) - datetime.timedelta(days=2),
+        _get_nth_weekday(year, 2, 0, 3),
+        _get_nth_weekday(year, 5, 0, -1),
+        _get_nth_weekday(year, 9, 0, 1),
+        _get_nth_weekday(year, 11, 3, 4),
+    }
+
+    # New Year's Day isn't moved back into the previous year
+    new_year = _observe(datetime.date(year, 1, 1))
+    if new_year.year == year:
+        holidays.add(new_year)
+
+    if year >= 1998:
+        holidays.add(_get_nth_weekday(year, 1, 0, 3))
+
+    if year >= 2022:
+        holidays.add(_observe(datetime.date(year, 6, 19)))
+
+    return frozenset(holidays)
+
+
+@functools.lru_cache(maxsize=None)
+def get_early_closes(year: int) -> FrozenSet[datetime.date]:
+    """Gets the days of a year the exchange closes at 13:00.
+
+    Args:
+        year: The year to get the early closes of.
+
+    Returns:
+        The days before Independence Day and Christmas when they fall from
+        Monday to Thursday, and the day after Thanksgiving.
+    """
+    early_closes = {
+        _get_nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1),
+    }
+
+    for day in (datetime.date(year, 7, 3), datetime.date(year, 12, 24)):
+        if day.weekday() < 4:
+            early_closes.add(day)
+
+    return frozenset(early_closes)
+
+
+def _observe(holiday: datetime.date) -> datetime.date:
+    """Moves a holiday that falls on a weekend to the weekday it is observed
+    on.
+
+    Args:
+        holiday: The date of the holiday.
+
+    Returns:
+        The Friday before for Saturdays, the Monday after for Sundays, and the
+        holiday itself otherwise.
+    """
+    if holiday.weekday() == 5:
+        return holiday - datetime.timedelta(days=1)
+
+    if holiday.weekday() == 6:
+        return holiday + datetime.timedelta(days=1)
+
+    return holiday
+
+
+def _get_nth_weekday(
+    year: int, month: int, weekday: int, n: int
+) -> datetime.date:
+    """Gets the nth occurrence of a weekday in a month.
+
+    Args:
+        year: The year of the month.
+        month: The month to look in.
+        weekday: The weekday to find, where Monday is 0.
+        n: Which occurrence to get, starting from 1. -1 gets the last one.
+
+    Returns:
+        The date of the weekday.
+    """
+    if n < 0:
+        first_of_next = datetime.date(
+            year + month // 12, month % 12 + 1, 1
+        )
+        last = first_of_next - datetime.timedelta(days=1)
+        return last - datetime.timedelta(
+            days=(last.weekday() - weekday) % 7
+        )
+
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(
+        days=(weekday - first.weekday()) % 7 + 7 * (n - 1)
+    )
+
+
+def _get_easter(year: int) -> datetime.date:
+    """Gets the date of Easter Sunday using the anonymous Gregorian
+    algorithm.
+
+    Args:
+        year: The year to get Easter of.
+
+    Returns:
+        The date of Easter Sunday.
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    f = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * f) // 451
+    month, day = divmod(h + f - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
@@ -1,93 +1,1034 @@
+from typing import AsyncGenerator
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
 from typing import Final
 from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+import asyncio
 import datetime
+import functools
 import logging
 import os
 
+from iqfeedserver import bar_cache
 from iqfeedserver import iq
+from iqfeedserver import live_proxy
+from iqfeedserver import negative_cache
+from iqfeedserver import payload_cache
+from iqfeedserver import trading_calendar
+from iqfeedserver.iq import field_readers
+from iqfeedserver.single_flight import SingleFlight
 
 
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_IQFEED_PORT_DERIVATIVE: Final = 9400
 DEFAULT_IQFEED_PORT_LOOKUP: Final = 9100
-INTERVAL: Final = 60
-MARKET_CLOSE_HOUR: Final = 16
-MARKET_CLOSE_MINUTE: Final = 0
-MARKET_OPEN_HOUR: Final = 9
-MARKET_OPEN_MINUTE: Final = 30
+DEFAULT_IQFEED_MAX_REQUESTS: Final = iq.limiter.DEFAULT_MAX_LIMIT
+DEFAULT_INTERVAL: Final = 60
+DEFAULT_MAX_DAYS: Final = 30
 
+# The number of days a multi-day replay pulls ahead of the day being streamed
+MAX_PREFETCH_DAYS: Final = 4
 
-async def process_job(ticker: str, date: str) -> List[str]:
-    """Pulls information from IQFeed and returns it back to the client.
+# The most ticks encoded into each chunk of a tick replay
+TICK_CHUNK_SIZE: Final = 10000
+
+_bar_flights = SingleFlight()  # type: SingleFlight[iq.BarBatch]
+_cache = None  # type: Optional[bar_cache.BarCache]
+_flights = SingleFlight()  # type: SingleFlight[bytes]
+_live = None  # type: Optional[live_proxy.LiveProxy]
+_negatives = None  # type: Optional[negative_cache.NegativeCache]
+_payloads = None  # type: Optional[payload_cache.PayloadCache]
+_pools = {}  # type: Dict[Tuple[str, int], iq.HistoryConnPool]
+_tick_negatives = None  # type: Optional[negative_cache.NegativeCache]
+
+
+async def process_job(
+    ticker: str, start: datetime.datetime, interval: int = DEFAULT_INTERVAL,
+    days: int = 1
+) -> AsyncGenerator[bytes, None]:
+    """Pulls information from IQFeed and streams it back to the client. A
+    replay spanning several trading days pulls the days concurrently, but
+    streams them in order. When live mode is enabled, watches of the current
+    session are streamed live instead of replayed.
+
+    Days without bars are skipped, and a replay is only answered with
+    n,<ticker> when it has no bars at all. A replay that fails ends with an
+    error message instead, even if some of its bars were already sent.
 
     Args:
         ticker: The ticker to pull information for.
-        date: The date to pull information for.
+        start: The time to start replaying bars from.
+        interval: The number of seconds in each bar.
+        days: The number of trading days to replay, starting with the day of
+        the start time.
+
+    Yields:
+        Chunks of encoded messages to send back to the client, as soon as they
+        are available.
+    """
+    if is_live_job(start, days):
+        async for chunk in _stream_live(ticker, start, interval):
+            yield chunk
+
+        return
+
+    streams = [
+        functools.partial(_stream_day, ticker, day_start, interval)
+        for day_start in get_day_starts(start, days)
+    ]
+
+    if len(streams) == 1:
+        chunks = streams[0]()
+
+    else:
+        chunks = _stream_in_order(streams)
+
+    sent = False
+
+    try:
+        async for chunk in chunks:
+            sent = sent or bool(chunk)
+            yield chunk
+
+    except Exception as e:
+        logger.exception("Error retrieving bars for %s", ticker)
+        yield encode_messages([format_error(e, ticker, interval)])
+        return
+
+    if not sent:
+        yield encode_messages(["n," + ticker])
+
+
+async def process_tick_job(
+    ticker: str, start: datetime.datetime, end: datetime.datetime,
+    request_id: str
+) -> AsyncGenerator[bytes, None]:
+    """Streams the ticks of a ticker in a period back to the client in the
+    format IQFeed answers HTT requests with, ending with !ENDMSG!. Ticks are
+    pulled a trading day at a time and encoded in chunks of TICK_CHUNK_SIZE,
+    so only a few chunks are held as text at once.
+
+    Args:
+        ticker: The ticker to pull the ticks for.
+        start: The start of the period.
+        end: The end of the period.
+        request_id: The request ID to tag the messages with.
+
+    Yields:
+        Chunks of encoded messages to send back to the client, as soon as they
+        are available.
+    """
+    sent = False
+    day = start.date()
+
+    while day <= end.date():
+        if (
+            not trading_calendar.is_trading_day(day) or
+            get_tick_negative_cache().get(ticker, day, negative_cache.TICKS)
+        ):
+            day += datetime.timedelta(days=1)
+            continue
+
+        day_start = max(start, datetime.datetime.combine(day, datetime.time()))
+        day_end = min(end, datetime.datetime.combine(day, datetime.time.max))
+
+        try:
+            async for ticks in stream_ticks(ticker, day_start, day_end):
+                for offset in range(0, len(ticks), TICK_CHUNK_SIZE):
+                    yield encode_messages(format_ticks(
+                        ticks.slice(offset, offset + TICK_CHUNK_SIZE),
+                        request_id
+                    ))
+
+                sent = True
+
+        except iq.NoDataError:
+            logger.info("No ticks for %s on %s", ticker, day)
+
+            # A part of the day without ticks says nothing about the rest
+            if is_whole_day_pulled(day_start, day_end):
+                await asyncio.get_running_loop().run_in_executor(
+                    None, get_tick_negative_cache().put, ticker, day,
+                    negative_cache.TICKS
+                )
+
+        except Exception as e:
+            logger.exception("Error retrieving ticks for %s", ticker)
+            yield encode_messages([
+                "%s,E,%s," % (request_id, e), request_id + ",!ENDMSG!,"
+            ])
+            return
+
+        day += datetime.timedelta(days=1)
+
+    messages = [] if sent else [request_id + ",E,!NO_DATA!,"]
+    yield encode_messages(messages + [request_id + ",!ENDMSG!,"])
+
+
+def get_day_starts(
+    start: datetime.datetime, days: int
+) -> List[datetime.datetime]:
+    """Gets the time to start replaying each day of a replay from. The day of
+    the start time is always replayed, even if the market was closed, so it
+    can be answered as a day without data. Closed days after it are skipped.
+
+    Args:
+        start: The time to start replaying bars from.
+        days: The number of days to replay.
 
     Returns:
-        The messages to send back to the client.
+        The start time for the first day, followed by midnight of each
+        following trading day.
     """
-    day = datetime.datetime(int(date[:4]), int(date[4:6]), int(date[6:]))
+    day_starts = [start]
+    day = start.date()
+
+    while len(day_starts) < days:
+        day += datetime.timedelta(days=1)
+
+        if trading_calendar.is_trading_day(day):
+            day_starts.append(datetime.datetime.combine(day, datetime.time()))
+
+    return day_starts
+
 
-    market_open = datetime.datetime(
-        day.year, day.month, day.day, MARKET_OPEN_HOUR, MARKET_OPEN_MINUTE
+async def stream_resampled_bars(
+    ticker: str, start: datetime.datetime, end: datetime.datetime,
+    interval: int
+) -> AsyncIterator[iq.BarBatch]:
+    """Streams the bars for a ticker during a single trading day at any
+    interval. The bars are pulled at the base interval returned by
+    get_base_interval() and resampled locally, so replays of the same day at
+    different intervals share a single pull from IQFeed.
+
+    Args:
+        ticker: The ticker to get the bars for.
+        start: The start of the trading day.
+        end: The end of the trading day.
+        interval: The number of seconds in each bar.
+
+    Yields:
+        Batches of bars for the ticker, in order.
+    """
+    base = get_base_interval(interval)
+
+    # Share the pull with concurrent replays of the day at other intervals
+    batches = _bar_flights.stream(
+        (ticker, start, end, base),
+        functools.partial(stream_bars, ticker, start, end, base)
     )
-    market_close = market_open.replace(
-        hour=MARKET_CLOSE_HOUR, minute=MARKET_CLOSE_MINUTE
+
+    if interval == base:
+        async for bars in batches:
+            yield bars
+
+        return
+
+    # Count the intervals from the start of the pull like IQFeed does
+    resampler = iq.BarResampler(
+        ticker, interval, field_readers.convert_datetime_to_epoch(start)
     )
 
-    logger.info("Getting bars for %s", ticker)
+    async for bars in batches:
+        resampled = resampler.feed(bars)
+        if resampled:
+            yield resampled
+
+    resampled = resampler.flush()
+    if resampled:
+        yield resampled
+
+
+async def stream_bars(
+    ticker: str, start: datetime.datetime, end: datetime.datetime,
+    interval: int = DEFAULT_INTERVAL
+) -> AsyncIterator[iq.BarBatch]:
+    """Streams the bars for a ticker during a single trading day. Looks in the
+    bar cache first and only pulls the bars from IQFeed when they aren't
+    cached.
+
+    Args:
+        ticker: The ticker to get the bars for.
+        start: The start of the trading day.
+        end: The end of the trading day.
+        interval: The number of seconds in each bar.
+
+    Yields:
+        Batches of bars for the ticker, in order.
+    """
+    cache = get_cache()
+    loop = asyncio.get_running_loop()
+
+    if cache:
+        cached_bars = await loop.run_in_executor(
+            None, cache.get, ticker, start.date(), interval,
+            iq.IntervalType.SECONDS
+        )
+
+        if cached_bars is not None:
+            logger.info("Got cached bars for %s", ticker)
+            yield cached_bars
+            return
+
+    batches = []  # type: List[iq.BarBatch]
+
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        async for bars in conn.stream_bar_batches_in_period(
+            ticker, start, end, interval
+        ):
+            if cache:
+                batches.append(bars)
+
+            yield bars
+
+    logger.info("Got bars for %s", ticker)
+    logger.debug("IQFeed pool stats: %s", pool.stats)
+
+    if cache and batches:
+        await loop.run_in_executor(
+            None, cache.put, ticker, start.date(), interval,
+            iq.IntervalType.SECONDS, iq.BarBatch.concatenate(ticker, batches)
+        )
+
+
+async def stream_ticks(
+    ticker: str, start: datetime.datetime, end: datetime.datetime
+) -> AsyncIterator[iq.TickBatch]:
+    """Streams the ticks for a ticker in a period within a single day. When
+    the bar cache is enabled, the ticks of completed days are pulled for the
+    whole day and cached, and later requests are served from the memory
+    mapped cache.
+
+    Args:
+        ticker: The ticker to get the ticks for.
+        start: The start of the period.
+        end: The end of the period, which must be on the same day as the
+        start.
+
+    Yields:
+        Batches of ticks for the ticker, in order.
+    """
+    cache = get_cache()
+    day = start.date()
+    loop = asyncio.get_running_loop()
+
+    first = field_readers.convert_datetime_to_epoch(start) * \
+        field_readers.MICROSECONDS_PER_SECOND
+    last = (field_readers.convert_datetime_to_epoch(end) + 1) * \
+        field_readers.MICROSECONDS_PER_SECOND - 1
+
+    pull_start, pull_end = start, end
+
+    if cache and day < datetime.date.today():
+        cached_ticks = await loop.run_in_executor(
+            None, cache.get_ticks, ticker, day
+        )
+
+        if cached_ticks is not None:
+            logger.info("Got cached ticks for %s", ticker)
+
+            for ticks in cached_ticks:
+                ticks = ticks.between(first, last)
+                if ticks:
+                    yield ticks
+
+            return
+
+        pull_start = datetime.datetime.combine(day, datetime.time())
+        pull_end = datetime.datetime.combine(day, datetime.time.max)
 
-    conn = iq.HistoryConn()
-    await conn.connect(
-        os.environ["IQFEED_HOST"],
-        int(os.environ.get("IQFEED_PORT_LOOKUP", DEFAULT_IQFEED_PORT_LOOKUP))
+    batches = []  # type: List[iq.TickBatch]
+
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        async for ticks in conn.stream_tick_batches_in_period(
+            ticker, pull_start, pull_end
+        ):
+            if cache:
+                batches.append(ticks)
+
+            ticks = ticks.between(first, last)
+            if ticks:
+                yield ticks
+
+    logger.info("Got ticks for %s", ticker)
+
+    if cache and batches:
+        await loop.run_in_executor(
+            None, cache.put_ticks, ticker, day, batches
+        )
+
+
+async def stream_passthrough(
+    ticker: str, start: datetime.datetime, end: datetime.datetime,
+    interval: int, request_id: str, since: datetime.datetime
+) -> AsyncGenerator[bytes, None]:
+    """Streams the bars for a ticker during a single trading day as encoded BC
+    messages. Bars already in the bar cache are formatted from the cache.
+    Otherwise the text sent by IQFeed is rewritten straight into BC messages
+    without converting any of the fields, which also means the bars aren't
+    added to the bar cache. Since the text can't be resampled, the bars are
+    pulled from IQFeed at the requested interval.
+
+    The whole trading day is always pulled, like every other replay, so a
+    day without data is known to have none at all.
+
+    Args:
+        ticker: The ticker to get the bars for.
+        start: The start of the trading day.
+        end: The end of the trading day.
+        interval: The number of seconds in each bar.
+        request_id: The request ID to tag the messages with.
+        since: The time to start replaying bars from. Bars ending at or
+        before this time are skipped.
+
+    Yields:
+        Chunks of encoded BC messages, in order.
+    """
+    cache = get_cache()
+
+    if cache:
+        cached_bars = await asyncio.get_running_loop().run_in_executor(
+            None, cache.get, ticker, start.date(), interval,
+            iq.IntervalType.SECONDS
+        )
+
+        if cached_bars is not None:
+            logger.info("Got cached bars for %s", ticker)
+            yield encode_messages(format_bars(cached_bars.since(
+                field_readers.convert_datetime_to_epoch(since) + 1
+            ), request_id))
+            return
+
+    validate = os.environ.get("IQFEED_PASSTHROUGH_VALIDATE") == "1"
+
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        async for lines in conn.stream_raw_bars_in_period(
+            ticker, start, end, interval, "%s,BC,%s" % (request_id, ticker),
+            validate=validate,
+            # Bars are timestamped with their end time
+            since=since + datetime.timedelta(seconds=1)
+        ):
+            yield encode_messages(lines)
+
+    logger.info("Got bars for %s", ticker)
+    logger.debug("IQFeed pool stats: %s", pool.stats)
+
+
+def get_base_interval(interval: int) -> int:
+    """Gets the interval to pull from IQFeed in order to resample bars of the
+    given interval. Whole minutes are resampled from minute bars, and
+    everything else from second bars.
+
+    Args:
+        interval: The number of seconds in each bar requested by the client.
+
+    Returns:
+        The number of seconds in each bar to pull from IQFeed.
+    """
+    return 60 if interval % 60 == 0 else 1
+
+
+def get_pulled_interval(interval: int) -> int:
+    """Gets the interval pulled from IQFeed to replay bars of the given
+    interval. Passthrough replays pull the requested interval, and other
+    replays the base interval they're resampled from.
+
+    Args:
+        interval: The number of seconds in each bar requested by the client.
+
+    Returns:
+        The number of seconds in each bar pulled from IQFeed.
+    """
+    if is_passthrough_enabled():
+        return interval
+
+    return get_base_interval(interval)
+
+
+def get_max_days() -> int:
+    """Gets the most trading days a single BW request can replay. Set with
+    the IQFEED_MAX_DAYS environment variable.
+
+    Returns:
+        The maximum number of trading days to replay.
+    """
+    return int(os.environ.get("IQFEED_MAX_DAYS", DEFAULT_MAX_DAYS))
+
+
+def get_cache() -> Optional[bar_cache.BarCache]:
+    """Gets the on-disk bar cache. The cache is only enabled when the
+    IQFEED_CACHE_DIR environment variable is set.
+
+    Returns:
+        The bar cache. None if the cache is disabled.
+    """
+    global _cache
+
+    directory = os.environ.get("IQFEED_CACHE_DIR")
+    if not directory:
+        return None
+
+    if not _cache:
+        _cache = bar_cache.BarCache(
+            directory,
+            int(os.environ.get(
+                "IQFEED_CACHE_MAX_BYTES", bar_cache.DEFAULT_MAX_BYTES
+            )),
+            # Worker processes share the cache directory
+            shared=os.environ.get("IQFEED_WORKERS", "1") != "1"
+        )
+
+    return _cache
+
+
+def get_negative_cache() -> negative_cache.NegativeCache:
+    """Gets the cache of tickers and dates IQFeed has no bars for. Entries are
+    persisted in IQFEED_CACHE_DIR if it is set.
+
+    Returns:
+        The negative cache.
+    """
+    global _negatives
+
+    if not _negatives:
+        _negatives = _open_negative_cache(negative_cache.FILE_NAME)
+
+    return _negatives
+
+
+def get_tick_negative_cache() -> negative_cache.NegativeCache:
+    """Gets the cache of tickers and dates IQFeed has no ticks for. A day can
+    have bars without having ticks, since IQFeed keeps fewer days of ticks, so
+    it's kept apart from the cache of days without bars.
+
+    Returns:
+        The negative cache.
+    """
+    global _tick_negatives
+
+    if not _tick_negatives:
+        _tick_negatives = _open_negative_cache(
+            negative_cache.TICKS_FILE_NAME
+        )
+
+    return _tick_negatives
+
+
+def _open_negative_cache(file_name: str) -> negative_cache.NegativeCache:
+    """Opens a negative cache, persisted in IQFEED_CACHE_DIR if it is set.
+
+    Args:
+        file_name: The name of the file to persist the entries to.
+
+    Returns:
+        The negative cache.
+    """
+    directory = os.environ.get("IQFEED_CACHE_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    return negative_cache.NegativeCache(
+        os.path.join(directory, file_name) if directory else None,
+        float(os.environ.get(
+            "IQFEED_NEGATIVE_CACHE_TTL", negative_cache.DEFAULT_TTL
+        ))
     )
 
-    try:
-        bars = await conn.request_bars_in_period(
-            ticker, market_open, market_close, INTERVAL
+
+def get_payload_cache() -> payload_cache.PayloadCache:
+    """Gets the in-memory cache of encoded responses.
+
+    Returns:
+        The payload cache.
+    """
+    global _payloads
+
+    if not _payloads:
+        _payloads = payload_cache.PayloadCache(int(os.environ.get(
+            "IQFEED_PAYLOAD_CACHE_MAX_BYTES", payload_cache.DEFAULT_MAX_BYTES
+        )))
+
+    return _payloads
+
+
+def is_passthrough_enabled() -> bool:
+    """Checks whether bars from IQFeed should be passed through to clients as
+    text rather than parsed. Enabled by setting the IQFEED_PASSTHROUGH
+    environment variable to 1.
+
+    Returns:
+        True if passthrough is enabled. False otherwise.
+    """
+    return os.environ.get("IQFEED_PASSTHROUGH") == "1"
+
+
+def is_live(start: datetime.datetime) -> bool:
+    """Checks whether a watch should be streamed live. Enabled by setting the
+    IQFEED_LIVE environment variable to 1, for watches starting during
+    today's session.
+
+    Args:
+        start: The time the watch starts from.
+
+    Returns:
+        True if the watch should be streamed live. False if it should be
+        replayed.
+    """
+    if os.environ.get("IQFEED_LIVE") != "1":
+        return False
+
+    session = trading_calendar.get_session(start.date())
+    if not session or start.date() != datetime.date.today():
+        return False
+
+    return start < session.close
+
+
+def is_live_job(start: datetime.datetime, days: int) -> bool:
+    """Checks whether a BW request is streamed live. Live jobs run until the
+    client stops watching the ticker.
+
+    Args:
+        start: The time the watch starts from.
+        days: The number of trading days requested.
+
+    Returns:
+        True if the request is streamed live. False if it is replayed.
+    """
+    return days == 1 and is_live(start)
+
+
+def is_whole_day_pulled(
+    start: datetime.datetime, end: datetime.datetime
+) -> bool:
+    """Checks whether stream_ticks() pulls the ticks of a whole day from
+    IQFeed for a period. Completed days are pulled whole when the bar cache is
+    enabled, so they can be cached.
+
+    Args:
+        start: The start of the period.
+        end: The end of the period, which must be on the same day as the
+        start.
+
+    Returns:
+        True if the whole day is pulled. False if only the period is.
+    """
+    day = start.date()
+    if get_cache() and day < datetime.date.today():
+        return True
+
+    return start == datetime.datetime.combine(day, datetime.time()) and \
+        end == datetime.datetime.combine(day, datetime.time.max)
+
+
+def get_live_proxy() -> live_proxy.LiveProxy:
+    """Gets the proxy sharing live watches of the configured IQFeed host.
+
+    Returns:
+        The live proxy.
+    """
+    global _live
+
+    if not _live:
+        _live = live_proxy.LiveProxy(
+            os.environ["IQFEED_HOST"],
+            int(os.environ.get(
+                "IQFEED_PORT_DERIVATIVE", DEFAULT_IQFEED_PORT_DERIVATIVE
+            ))
         )
-        logger.info("Got bars for %s", ticker)
 
-    except Exception:
-        logger.exception("Error retrieving bars for %s", ticker)
+    return _live
 
-        return ["n," + ticker]
 
-    else:
-        return [
-            (
-                "%(request_id)s,BC,%(ticker)s,%(date_time)s,%(open)s,%(high)s,"
-                "%(low)s,%(last)s,%(cummulative_volume)s,%(interval_volume)s,"
-                "%(number_of_trades)s"
-            ) % {
-                "request_id": "B-%s-0060-s" % ticker,
-                "ticker": ticker,
-                "date_time": format_datetime(
-                    datetime.datetime.combine(bar.date, bar.time)),
-                "open": bar.open_p,
-                "high": bar.high_p,
-                "low": bar.low_p,
-                "last": bar.close_p,
-                "cummulative_volume": bar.tot_vlm,
-                "interval_volume": bar.prd_vlm,
-                "number_of_trades": bar.num_trds
-            } for bar in bars
-        ]
+def get_pool() -> iq.HistoryConnPool:
+    """Gets the pool of IQFeed lookup connections for the configured host.
 
-    finally:
-        await conn.disconnect()
+    Returns:
+        The connection pool for the IQFeed host.
+    """
+    host = os.environ["IQFEED_HOST"]
+    port = int(
+        os.environ.get("IQFEED_PORT_LOOKUP", DEFAULT_IQFEED_PORT_LOOKUP)
+    )
+
+    pool = _pools.get((host, port))
+    if not pool:
+        # The limiter decides how many requests are in flight. Every request
+        # holds a connection, so the pool defaults to the limiter's maximum
+        # to stay out of its way
+        max_requests = int(os.environ.get(
+            "IQFEED_MAX_REQUESTS", DEFAULT_IQFEED_MAX_REQUESTS
+        ))
+        size = int(os.environ.get("IQFEED_POOL_SIZE", max_requests))
+
+        pool = iq.HistoryConnPool(
+            host, port, size,
+            iq.AdaptiveLimiter(
+                min(iq.limiter.DEFAULT_INITIAL_LIMIT, max_requests),
+                max_requests
+            )
+        )
+        _pools[(host, port)] = pool
+
+    return pool
+
+
+async def close() -> None:
+    """Closes all open connections to IQFeed.
+    """
+    global _live
+
+    if _live:
+        logger.info("Live proxy stats: %s", _live.stats)
+        await _live.close()
+        _live = None
+
+    for pool in _pools.values():
+        logger.info("IQFeed pool stats: %s", pool.stats)
+        logger.info("IQFeed limiter stats: %s", pool.limiter.stats)
+        await pool.close()
+
+    _pools.clear()
+
+    if _cache:
+        _cache.flush()
+
+    if _payloads:
+        logger.info("Payload cache stats: %s", _payloads.stats)
+
+    if _negatives:
+        _negatives.flush()
+        logger.info("Negative cache stats: %s", _negatives.stats)
+
+    if _tick_negatives:
+        _tick_negatives.flush()
+        logger.info("Tick negative cache stats: %s", _tick_negatives.stats)
+
+    logger.info(
+        "Coalesced requests: %d, coalesced pulls: %d", _flights.coalesced,
+        _bar_flights.coalesced
+    )
+
+
+def encode_messages(messages: List[str]) -> bytes:
+    """Encodes messages into the format sent to the client.
+
+    Args:
+        messages: The messages to encode.
+
+    Returns:
+        The encoded messages.
+    """
+    return "".join(message + "\r\n" for message in messages).encode(
+        "latin-1"
+    )
+
+
+def format_error(e: Exception, ticker: str, interval: int) -> str:
+    """Formats the error a BW request failed with as a message for the
+    client.
+
+    Args:
+        e: The error the request failed with.
+        ticker: The ticker of the request.
+        interval: The number of seconds in each bar of the request.
+
+    Returns:
+        The error message.
+    """
+    return "B-%s-%04d-s,E,%s" % (
+        ticker, interval, str(e) or type(e).__name__
+    )
+
+
+def format_bars(bars: iq.BarBatch, request_id: str) -> List[str]:
+    """Formats bars as BC messages.
+
+    Args:
+        bars: The bars to format.
+        request_id: The request ID to tag the messages with.
+
+    Returns:
+        The formatted messages.
+    """
+    prefix = "%s,BC,%s," % (request_id, bars.ticker)
+
+    return [
+        "%s%s,%s,%s,%s,%s,%d,%d,%d" % (
+            prefix,
+            field_readers.convert_epoch_to_iqfeed_timestamp(timestamp),
+            open_p, high_p, low_p, close_p, tot_vlm, prd_vlm, num_trds
+        ) for (
+            timestamp, open_p, high_p, low_p, close_p, tot_vlm, prd_vlm,
+            num_trds
+        ) in zip(*(column.tolist() for column in bars.columns))
+    ]
 
 
-def format_datetime(date: datetime.datetime) -> str:
-    """Formats the given datetime value to IQFeed format.
+def format_live_bars(
+    bars: List[Tuple[str, iq.Bar]], request_id: str
+) -> List[str]:
+    """Formats bars received from a live watch as BH or BC messages.
 
     Args:
-        date: The value to format.
+        bars: The bars to format, each with its bar type.
+        request_id: The request ID to tag the messages with.
 
     Returns:
-        The date in IQFeed format.
+        The formatted messages.
     """
-    return date.strftime("%Y-%m-%d %H:%M:%S")
+    return [
+        "%s,%s,%s,%s %s,%s,%s,%s,%s,%d,%d,%d" % (
+            request_id, bar_type, bar.ticker, bar.date.isoformat(),
+            bar.time.strftime("%H:%M:%S"), bar.open_p, bar.high_p,
+            bar.low_p, bar.close_p, bar.tot_vlm, bar.prd_vlm, bar.num_trds
+        ) for bar_type, bar in bars
+    ]
+
+
+def format_ticks(ticks: iq.TickBatch, request_id: str) -> List[str]:
+    """Formats ticks as IQFeed tick messages.
+
+    Args:
+        ticks: The ticks to format.
+        request_id: The request ID to tag the messages with.
+
+    Returns:
+        The formatted messages.
+    """
+    return [
+        "%s,%s,%s,%d,%d,%s,%s,%d" % (
+            request_id,
+            field_readers.convert_epoch_micros_to_iqfeed_timestamp(timestamp),
+            last_p, last_size, tot_vlm, bid_p, ask_p, tick_id
+        ) for (
+            timestamp, last_p, last_size, tot_vlm, bid_p, ask_p, tick_id
+        ) in zip(*(column.tolist() for column in ticks.columns))
+    ]
+
+
+async def _stream_in_order(
+    streams: Sequence[Callable[[], AsyncGenerator[bytes, None]]]
+) -> AsyncGenerator[bytes, None]:
+    """Streams the chunks of several streams one stream after another. Up to
+    MAX_PREFETCH_DAYS of the following streams run ahead of time, with their
+    chunks buffered until it's their turn. An error raised by a stream is
+    raised once its buffered chunks have been streamed.
+
+    Args:
+        streams: Called to start each stream, in order.
+
+    Yields:
+        The chunks of every stream, in order.
+    """
+    loop = asyncio.get_running_loop()
+    queues = []  # type: List[asyncio.Queue[Optional[bytes]]]
+    tasks = []  # type: List[asyncio.Task]
+
+    def start_next() -> None:
+        if len(tasks) < len(streams):
+            queue = asyncio.Queue()  # type: asyncio.Queue[Optional[bytes]]
+            queues.append(queue)
+            tasks.append(loop.create_task(
+                _buffer(streams[len(tasks)](), queue)
+            ))
+
+    try:
+        for _ in range(MAX_PREFETCH_DAYS + 1):
+            start_next()
+
+        for index, queue in enumerate(queues):
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+
+                yield chunk
+
+            # Raises the error the stream ended with, if any
+            await tasks[index]
+            start_next()
+
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _buffer(
+    stream: AsyncGenerator[bytes, None],
+    queue: "asyncio.Queue[Optional[bytes]]"
+) -> None:
+    """Buffers the chunks of a stream in a queue, followed by None once the
+    stream ends.
+
+    Args:
+        stream: The stream to buffer.
+        queue: The queue to buffer the chunks in.
+    """
+    try:
+        async for chunk in stream:
+            queue.put_nowait(chunk)
+
+    finally:
+        await stream.aclose()
+        queue.put_nowait(None)
+
+
+async def _stream_day(
+    ticker: str, start: datetime.datetime, interval: int
+) -> AsyncGenerator[bytes, None]:
+    """Streams the encoded bars of a single trading day, from the payload
+    cache if possible. Days known to have no data have no bars, without
+    asking IQFeed.
+
+    Args:
+        ticker: The ticker to pull information for.
+        start: The time to start replaying bars from.
+        interval: The number of seconds in each bar.
+
+    Yields:
+        Chunks of encoded messages to send back to the client.
+    """
+    session = trading_calendar.get_session(start.date())
+
+    if not session or get_negative_cache().get(
+        ticker, start.date(), get_pulled_interval(interval)
+    ):
+        logger.info("No data for %s on %s", ticker, start.date())
+        return
+
+    # Every replay from the open or earlier has the same bars
+    start = max(start, session.open)
+    if start >= session.close:
+        return
+
+    key = (ticker, start, interval)
+
+    payload = get_payload_cache().get(key)
+    if payload is not None:
+        logger.info("Got cached response for %s", ticker)
+        yield payload
+        return
+
+    # Share the work with any identical requests that are already running
+    async for chunk in _flights.stream(
+        key, functools.partial(_stream_payload, ticker, start, interval)
+    ):
+        yield chunk
+
+
+async def _stream_live(
+    ticker: str, start: datetime.datetime, interval: int
+) -> AsyncGenerator[bytes, None]:
+    """Streams the bars of today's session as IQFeed sends them, sharing the
+    upstream watch with every other client watching the ticker at the same
+    interval. The stream runs until the client stops watching the ticker.
+
+    Args:
+        ticker: The ticker to watch.
+        start: The time to start sending bars from.
+        interval: The number of seconds in each bar.
+
+    Yields:
+        Chunks of encoded messages to send back to the client.
+    """
+    session = trading_calendar.get_session(start.date())
+    assert session
+
+    request_id = "B-%s-%04d-s" % (ticker, interval)
+    stream = get_live_proxy().stream(
+        ticker, interval, max(start, session.open)
+    )
+
+    logger.info("Streaming live bars for %s", ticker)
+
+    try:
+        async for bars in stream:
+            yield encode_messages(format_live_bars(bars, request_id))
+
+    except iq.NoDataError:
+        logger.info("No live data for %s", ticker)
+        yield encode_messages(["n," + ticker])
+
+    except Exception as e:
+        logger.exception("Error streaming live bars for %s", ticker)
+        yield encode_messages([format_error(e, ticker, interval)])
+
+    finally:
+        await stream.aclose()
+
+
+async def _stream_payload(
+    ticker: str, start: datetime.datetime, interval: int
+) -> AsyncIterator[bytes]:
+    """Pulls information from IQFeed and encodes it for the client as it
+    arrives. The whole trading day is pulled, and bars ending at or before the
+    start time are skipped. A day without data has no bars, and errors are
+    raised.
+
+    Args:
+        ticker: The ticker to pull information for.
+        start: The time to start replaying bars from.
+        interval: The number of seconds in each bar.
+
+    Yields:
+        Chunks of encoded messages to send back to the client.
+    """
+    session = trading_calendar.get_session(start.date())
+    assert session
+
+    # Bars are timestamped with their end time. Intervals are counted from
+    # the open, so the first bar can cover time before the start
+    first_timestamp = field_readers.convert_datetime_to_epoch(start) + 1
+
+    request_id = "B-%s-%04d-s" % (ticker, interval)
+    chunks = []  # type: List[bytes]
+
+    logger.info("Getting bars for %s", ticker)
+
+    if is_passthrough_enabled():
+        encoded = stream_passthrough(
+            ticker, session.open, session.close, interval, request_id, start
+        )  # type: AsyncGenerator[bytes, None]
+
+    else:
+        encoded = (
+            encode_messages(format_bars(bars, request_id))
+            async for bars in (
+                bars.since(first_timestamp)
+                async for bars in stream_resampled_bars(
+                    ticker, session.open, session.close, interval
+                )
+            ) if bars
+        )
+
+    try:
+        async for chunk in encoded:
+            chunks.append(chunk)
+            yield chunk
+
+    except iq.NoDataError:
+        logger.info("No data for %s on %s", ticker, start.date())
+        await asyncio.get_running_loop().run_in_executor(
+            None, get_negative_cache().put, ticker, start.date(),
+            get_pulled_interval(interval)
+        )
+        return
+
+    finally:
+        await encoded.aclose()
+
+    # Today's bars are still changing so they can't be reused
+    if start.date() < datetime.date.today():
+        get_payload_cache().put((ticker, start, interval), b"".join(chunks))
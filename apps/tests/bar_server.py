@@ -0,0 +1,111 @@
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+import asyncio
+import datetime
+
+
+class BarServer:
+    """A minimal stand-in for IQFeed's derivative port that answers BW
+    requests with generated history bars, and sends live bars on demand.
+    """
+
+    def __init__(self, bars: int = 2) -> None:
+        self.bars = bars
+        self.commands = []  # type: List[str]
+        self.connections = 0
+        self._server = None  # type: Optional[asyncio.Server]
+        self._writers = []  # type: List[asyncio.StreamWriter]
+        self._watches = {
+        }  # type: Dict[str, Tuple[asyncio.StreamWriter, str]]
+
+    @property
+    def port(self) -> int:
+        assert self._server
+        return self._server.sockets[0].getsockname()[1]
+
+    @property
+    def watches(self) -> List[str]:
+        return sorted(self._watches)
+
+    async def start(self) -> "BarServer":
+        self._server = await asyncio.start_server(
+            self._handle, "127.0.0.1", 0
+        )
+        return self
+
+    async def stop(self) -> None:
+        assert self._server
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self) -> None:
+        for writer in self._writers:
+            writer.close()
+
+        self._watches.clear()
+
+    async def send_no_data(self, ticker: str) -> None:
+        writer, _ = self._watches.pop(ticker)
+        writer.write(("n,%s\r\n" % ticker).encode("latin-1"))
+        await writer.drain()
+
+    async def send_live_bar(
+        self, ticker: str, timestamp: datetime.datetime, close_p: float,
+        tot_vlm: int = 1000
+    ) -> None:
+        writer, req_id = self._watches[ticker]
+        writer.write(self._format_bar(
+            req_id, "BC", ticker, timestamp, close_p, tot_vlm
+        ))
+        await writer.drain()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        self._writers.append(writer)
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            command = line.decode("latin-1").strip()
+            fields = command.split(",")
+            self.commands.append(command)
+
+            if fields[0] == "S" and fields[1] == "SET PROTOCOL":
+                writer.write(b"S,CURRENT PROTOCOL,6.1\r\n")
+
+            elif fields[0] == "BW":
+                ticker = fields[1]
+                self._watches[ticker] = (writer, fields[8])
+                start = datetime.datetime.strptime(fields[3], "%Y%m%d %H%M%S")
+                start = start.replace(hour=9, minute=30)
+
+                for i in range(self.bars):
+                    writer.write(self._format_bar(
+                        fields[8], "BH", ticker,
+                        start + datetime.timedelta(minutes=i + 1), 267.9 + i,
+                        1000 * (i + 1)
+                    ))
+
+            elif fields[0] == "BR":
+                self._watches.pop(fields[1], None)
+
+            await writer.drain()
+
+        writer.close()
+
+    @staticmethod
+    def _format_bar(
+        req_id: str, bar_type: str, ticker: str,
+        timestamp: datetime.datetime, close_p: float, tot_vlm: int
+    ) -> bytes:
+        return ("%s,%s,%s,%s,%.2f,%.2f,%.2f,%.2f,%d,100,10,\r\n" % (
+            req_id, bar_type, ticker,
+            timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            close_p, close_p, close_p, close_p, tot_vlm
+        )).encode("latin-1")
@@ -0,0 +1,102 @@
+from typing import AsyncIterator
+from typing import Union
+import contextlib
+
+import pytest
+
+from benchmarks.fake_iqfeed import FakeIQFeed
+from iqfeedserver import iq
+from iqfeedserver import worker
+from tests.bar_server import BarServer
+from tests.lookup_server import LookupServer
+
+
+class IQFeed:
+    """Starts stand-ins for IQFeed and points the worker at them. Every
+    server is stopped, and the worker's connections closed, when its context
+    exits.
+    """
+
+    def __init__(self, monkeypatch) -> None:
+        self._monkeypatch = monkeypatch
+
+    @contextlib.asynccontextmanager
+    async def lookup(self, **kwargs) -> AsyncIterator[LookupServer]:
+        """Serves the lookup port with a LookupServer.
+        """
+        async with self._serve(
+            await LookupServer(**kwargs).start(), "IQFEED_PORT_LOOKUP"
+        ) as server:
+            yield server
+
+    @contextlib.asynccontextmanager
+    async def fake(self, **kwargs) -> AsyncIterator[FakeIQFeed]:
+        """Serves the lookup port with the benchmarks' FakeIQFeed.
+        """
+        async with self._serve(
+            await FakeIQFeed(**kwargs).start(), "IQFEED_PORT_LOOKUP"
+        ) as server:
+            yield server
+
+    @contextlib.asynccontextmanager
+    async def derivative(self, **kwargs) -> AsyncIterator[BarServer]:
+        """Serves the derivative port with a BarServer.
+        """
+        async with self._serve(
+            await BarServer(**kwargs).start(), "IQFEED_PORT_DERIVATIVE"
+        ) as server:
+            yield server
+
+    @contextlib.asynccontextmanager
+    async def connect(self, port: int) -> AsyncIterator[iq.HistoryConn]:
+        """Opens a HistoryConn to a stand-in lookup port.
+        """
+        conn = iq.HistoryConn()
+        await conn.connect("127.0.0.1", port)
+
+        try:
+            yield conn
+
+        finally:
+            await conn.disconnect()
+
+    @contextlib.asynccontextmanager
+    async def pool(
+        self, port: int, **kwargs
+    ) -> AsyncIterator[iq.HistoryConnPool]:
+        """Opens a HistoryConnPool to a stand-in lookup port.
+        """
+        pool = iq.HistoryConnPool("127.0.0.1", port, **kwargs)
+
+        try:
+            yield pool
+
+        finally:
+            await pool.close()
+
+    @contextlib.asynccontextmanager
+    async def _serve(
+        self, server: Union[LookupServer, FakeIQFeed, BarServer], env: str
+    ) -> AsyncIterator:
+        self._monkeypatch.setenv(env, str(server.port))
+
+        try:
+            yield server
+
+        finally:
+            await worker.close()
+            await server.stop()
+
+
+@pytest.fixture
+def iqfeed(monkeypatch) -> IQFeed:
+    """Points the worker at stand-ins for IQFeed, with its caches reset and
+    the disk cache disabled.
+    """
+    monkeypatch.setenv("IQFEED_HOST", "127.0.0.1")
+    monkeypatch.delenv("IQFEED_CACHE_DIR", raising=False)
+    monkeypatch.setattr(worker, "_cache", None)
+    monkeypatch.setattr(worker, "_negatives", None)
+    monkeypatch.setattr(worker, "_payloads", None)
+    monkeypatch.setattr(worker, "_tick_negatives", None)
+    return IQFeed(monkeypatch)
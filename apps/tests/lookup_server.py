@@ -0,0 +1,128 @@
+from typing import List
+from typing import Optional
+from typing import Sequence
+import asyncio
+import datetime
+
+
+class LookupServer:
+    """A minimal stand-in for IQFeed's lookup port that answers HIT requests
+    with generated minute bars. HIT requests for intervals shorter than
+    min_interval have no data, like days IQFeed no longer keeps second bars
+    for, and neither do HIT requests for the missing days. When error is
+    set, IQFeed fails each request with it after sending the bars.
+    """
+
+    def __init__(
+        self, bars: int = 1, delay: float = 0, throttle: int = 0,
+        ticks: int = 3, min_interval: int = 0,
+        missing: Sequence[datetime.date] = (), error: str = ""
+    ) -> None:
+        self.bars = bars
+        self.delay = delay
+        self.error = error
+        self.min_interval = min_interval
+        self.missing = missing
+        self.throttle = throttle
+        self.ticks = ticks
+        self.commands = []  # type: List[str]
+        self.connections = 0
+        self._server = None  # type: Optional[asyncio.Server]
+
+    @property
+    def port(self) -> int:
+        assert self._server
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> "LookupServer":
+        self._server = await asyncio.start_server(
+            self._handle, "127.0.0.1", 0
+        )
+        return self
+
+    async def stop(self) -> None:
+        assert self._server
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            command = line.decode("latin-1").strip()
+            fields = command.split(",")
+            self.commands.append(command)
+
+            if fields[0] == "S" and fields[1] == "SET PROTOCOL":
+                writer.write(b"S,CURRENT PROTOCOL,6.1\r\n")
+
+            elif fields[0] == "HIT":
+                await asyncio.sleep(self.delay)
+                start = datetime.datetime.strptime(fields[3], "%Y%m%d %H%M%S")
+
+                # Reject the first requests like a busy IQFeed would
+                if self.throttle:
+                    self.throttle -= 1
+                    writer.write((
+                        "%s,E,Too many simultaneous history requests.,\r\n"
+                        % fields[9]
+                    ).encode("latin-1"))
+
+                else:
+                    writer.write(self._get_bars(
+                        fields[9], start,
+                        self.bars if int(fields[2]) >= self.min_interval and
+                        start.date() not in self.missing else 0
+                    ))
+
+            elif fields[0] == "HTT":
+                start = datetime.datetime.strptime(fields[2], "%Y%m%d %H%M%S")
+                writer.write(self._get_ticks(fields[8], start))
+
+            await writer.drain()
+
+        writer.close()
+
+    def _get_ticks(self, req_id: str, start: datetime.datetime) -> bytes:
+        lines = []
+
+        # IQFeed only sends ticks during the day's trading
+        start = max(start, start.replace(hour=9, minute=30, second=0))
+        for i in range(self.ticks):
+            timestamp = start + datetime.timedelta(seconds=i, microseconds=5)
+            lines.append("%s,%s,%.2f,%d,%d,%.2f,%.2f,%d,0,11,17,," % (
+                req_id, timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                267.9 + i, 100, 100 * (i + 1), 267.89 + i, 267.91 + i, i + 1
+            ))
+
+        if not lines:
+            lines.append("%s,E,!NO_DATA!," % req_id)
+
+        lines.append("%s,!ENDMSG!," % req_id)
+        return "".join(line + "\r\n" for line in lines).encode("latin-1")
+
+    def _get_bars(
+        self, req_id: str, start: datetime.datetime, bars: int
+    ) -> bytes:
+        lines = []
+        for i in range(bars):
+            timestamp = start + datetime.timedelta(minutes=i + 1)
+            lines.append("%s,%s,%.2f,%.2f,%.2f,%.2f,%d,100,10," % (
+                req_id, timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                268.0 + i, 267.5 + i, 267.6 + i, 267.9 + i, 100 * (i + 1)
+            ))
+
+        if not lines:
+            lines.append("%s,E,!NO_DATA!," % req_id)
+
+        elif self.error:
+            lines.append("%s,E,%s," % (req_id, self.error))
+
+        lines.append("%s,!ENDMSG!," % req_id)
+        return "".join(line + "\r\n" for line in lines).encode("latin-1")
@@ -0,0 +1,155 @@
+import datetime
+
+from iqfeedserver import iq
+from iqfeedserver.iq.bar_batch import BarBatchBuilder
+
+
+def test_builds_from_historical_fields() -> None:
+    builder = BarBatchBuilder("AAPL")
+    builder.append_historical_fields([
+        "AAPL", "2019-11-29 11:37:00", "268.0", "267.5", "267.6", "267.9",
+        "1000", "100", "10"
+    ])
+    batch = builder.build()
+
+    assert len(batch) == 1
+    assert batch.timestamps.dtype.kind == "i"
+    assert batch.close_p.dtype.kind == "f"
+    assert batch[0] == iq.Bar(
+        date=datetime.date(2019, 11, 29),
+        time=datetime.time(11, 37),
+        open_p=267.6,
+        high_p=268.0,
+        low_p=267.5,
+        close_p=267.9,
+        tot_vlm=1000,
+        prd_vlm=100,
+        num_trds=10,
+        ticker="AAPL"
+    )
+
+
+def test_converts_to_and_from_bars() -> None:
+    bars = [
+        iq.Bar(
+            date=datetime.date(2019, 11, 29),
+            time=datetime.time(9, 31 + i),
+            open_p=1.0 + i,
+            high_p=2.0 + i,
+            low_p=0.5 + i,
+            close_p=1.5 + i,
+            tot_vlm=100 * (i + 1),
+            prd_vlm=100,
+            num_trds=1,
+            ticker="SPY"
+        ) for i in range(5)
+    ]
+
+    batch = iq.BarBatch.from_bars("SPY", bars)
+
+    assert batch.to_bars() == bars
+    assert batch.slice(1, 3).to_bars() == bars[1:3]
+    assert len(iq.BarBatch.empty("SPY")) == 0
+
+
+def test_resamples_bars() -> None:
+    bars = iq.BarBatch.from_bars("SPY", [
+        iq.Bar(
+            date=datetime.date(2019, 11, 29),
+            time=datetime.time(9, 31 + i),
+            open_p=1.0 + i,
+            high_p=2.0 + i,
+            low_p=0.5 + i,
+            close_p=1.5 + i,
+            tot_vlm=100 * (i + 1),
+            prd_vlm=100,
+            num_trds=1,
+            ticker="SPY"
+        ) for i in range(7)
+    ])
+    resampler = iq.BarResampler("SPY", 300)
+
+    # 09:35 is only complete once its last bar has been fed
+    assert len(resampler.feed(bars.slice(0, 3))) == 0
+    first = resampler.feed(bars.slice(3, 6))
+    last = resampler.flush()
+
+    assert first.to_bars() == [iq.Bar(
+        date=datetime.date(2019, 11, 29),
+        time=datetime.time(9, 35),
+        open_p=1.0,
+        high_p=6.0,
+        low_p=0.5,
+        close_p=5.5,
+        tot_vlm=500,
+        prd_vlm=500,
+        num_trds=5,
+        ticker="SPY"
+    )]
+    assert last.to_bars() == [iq.Bar(
+        date=datetime.date(2019, 11, 29),
+        time=datetime.time(9, 40),
+        open_p=6.0,
+        high_p=7.0,
+        low_p=5.5,
+        close_p=6.5,
+        tot_vlm=600,
+        prd_vlm=100,
+        num_trds=1,
+        ticker="SPY"
+    )]
+
+
+def test_resamples_intervals_from_origin() -> None:
+    origin = datetime.datetime(2019, 11, 29, 9, 30)
+    bars = iq.BarBatch.from_bars("SPY", [
+        iq.Bar(
+            date=origin.date(),
+            time=(origin + datetime.timedelta(minutes=i + 1)).time(),
+            open_p=1.0,
+            high_p=1.0,
+            low_p=1.0,
+            close_p=1.0,
+            tot_vlm=i + 1,
+            prd_vlm=1,
+            num_trds=1,
+            ticker="SPY"
+        ) for i in range(90)
+    ])
+    resampler = iq.BarResampler(
+        "SPY", 3600, iq.field_readers.convert_datetime_to_epoch(origin)
+    )
+
+    resampled = resampler.feed(bars).to_bars() + resampler.flush().to_bars()
+    assert [(bar.time, bar.prd_vlm) for bar in resampled] == [
+        (datetime.time(10, 30), 60),
+        (datetime.time(11, 30), 30),
+    ]
+
+
+def test_resamples_intervals_from_midnight() -> None:
+    resampler = iq.BarResampler("SPY", 7)
+
+    for day in (datetime.date(2019, 11, 29), datetime.date(2019, 12, 2)):
+        bars = iq.BarBatch.from_bars("SPY", [
+            iq.Bar(
+                date=day,
+                time=datetime.time(9, 30, i + 1),
+                open_p=1.0,
+                high_p=1.0,
+                low_p=1.0,
+                close_p=1.0,
+                tot_vlm=i + 1,
+                prd_vlm=1,
+                num_trds=1,
+                ticker="SPY"
+            ) for i in range(9)
+        ])
+
+        # 09:30:00 is 4885 intervals and 5 seconds past midnight, so every
+        # day's intervals end 2 seconds past the multiples of 7
+        resampled = resampler.feed(bars).to_bars()
+        assert [(bar.date, bar.time, bar.prd_vlm) for bar in resampled] == [
+            (day, datetime.time(9, 30, 2), 2),
+            (day, datetime.time(9, 30, 9), 7),
+        ]
@@ -0,0 +1,145 @@
+from typing import List
+from typing import Optional
+import datetime
+import json
+import os
+
+from iqfeedserver import iq
+from iqfeedserver.bar_cache import BarCache
+from iqfeedserver.bar_cache import INDEX_FILE
+
+
+DAY = datetime.date(2019, 11, 29)
+
+
+def _make_bars(ticker: str, day: datetime.date, count: int) -> iq.BarBatch:
+    start = datetime.datetime.combine(day, datetime.time(9, 31))
+    return iq.BarBatch.from_bars(ticker, [
+        iq.Bar(
+            date=day,
+            time=(start + datetime.timedelta(minutes=i)).time(),
+            open_p=267.6 + i,
+            high_p=268.0 + i,
+            low_p=267.5 + i,
+            close_p=267.9 + i,
+            tot_vlm=1000 * (i + 1),
+            prd_vlm=1000,
+            num_trds=10,
+            ticker=ticker
+        ) for i in range(count)
+    ])
+
+
+def _to_bars(bars: Optional[iq.BarBatch]) -> List[iq.Bar]:
+    assert bars is not None
+    return bars.to_bars()
+
+
+def test_round_trip(tmp_path) -> None:
+    cache = BarCache(str(tmp_path))
+    bars = _make_bars("BRK.A", DAY, 390)
+
+    assert cache.get("BRK.A", DAY, 60) is None
+    assert cache.put("BRK.A", DAY, 60, iq.IntervalType.SECONDS, bars)
+    assert _to_bars(cache.get("BRK.A", DAY, 60)) == bars.to_bars()
+
+    # The index survives a restart
+    assert _to_bars(BarCache(str(tmp_path)).get("BRK.A", DAY, 60)) == \
+        bars.to_bars()
+
+
+def test_today_is_not_cached(tmp_path) -> None:
+    cache = BarCache(str(tmp_path))
+    today = datetime.date.today()
+
+    assert not cache.put(
+        "AAPL", today, 60, iq.IntervalType.SECONDS,
+        _make_bars("AAPL", today, 10)
+    )
+    assert cache.get("AAPL", today, 60) is None
+
+
+def test_evicts_least_recently_used(tmp_path) -> None:
+    bars = _make_bars("AAPL", DAY, 100)
+    cache = BarCache(str(tmp_path))
+    cache.put("AAPL", DAY, 60, iq.IntervalType.SECONDS, bars)
+    file_size = cache.size
+
+    cache = BarCache(str(tmp_path), max_bytes=file_size * 2)
+    cache.put("MSFT", DAY, 60, iq.IntervalType.SECONDS, bars)
+    assert cache.get("AAPL", DAY, 60)
+
+    cache.put("SPY", DAY, 60, iq.IntervalType.SECONDS, bars)
+
+    assert cache.get("AAPL", DAY, 60)
+    assert cache.get("MSFT", DAY, 60) is None
+    assert cache.get("SPY", DAY, 60)
+    assert cache.size <= file_size * 2
+
+
+def test_index_written_on_flush(tmp_path) -> None:
+    bars = _make_bars("AAPL", DAY, 100)
+    cache = BarCache(str(tmp_path))
+    cache.put("AAPL", DAY, 60, iq.IntervalType.SECONDS, bars)
+    file_size = cache.size
+
+    # Storing a file again replaces its size rather than adding to it
+    cache.put("AAPL", DAY, 60, iq.IntervalType.SECONDS, bars)
+    assert cache.size == file_size
+    assert not (tmp_path / INDEX_FILE).exists()
+
+    cache.flush()
+    assert list(json.loads((tmp_path / INDEX_FILE).read_text())) == [
+        "AAPL_20191129_60s.bars"
+    ]
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch) -> None:
+    def fail(src: str, dst: str) -> None:
+        raise OSError("disk full")
+
+    cache = BarCache(str(tmp_path))
+    monkeypatch.setattr(os, "replace", fail)
+
+    assert not cache.put(
+        "AAPL", DAY, 60, iq.IntervalType.SECONDS, _make_bars("AAPL", DAY, 10)
+    )
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shared_between_processes(tmp_path) -> None:
+    bars = _make_bars("AAPL", DAY, 100)
+    first = BarCache(str(tmp_path), shared=True)
+    second = BarCache(str(tmp_path), shared=True)
+
+    first.put("AAPL", DAY, 60, iq.IntervalType.SECONDS, bars)
+    assert _to_bars(second.get("AAPL", DAY, 60)) == bars.to_bars()
+
+    second.put("MSFT", DAY, 60, iq.IntervalType.SECONDS, bars)
+    assert second.size == first.size * 2
+
+
+def test_ticks_round_trip(tmp_path) -> None:
+    cache = BarCache(str(tmp_path))
+    builder = iq.TickBatchBuilder("SPY")
+    for i in range(5):
+        builder.append_tick_fields([
+            "SPY", "2019-11-29 09:30:0%d.25" % i, "314.31", "100",
+            str(100 * (i + 1)), "314.30", "314.32", str(i + 1), "C", "11"
+        ])
+
+    ticks = builder.build()
+    blocks = [ticks.slice(0, 2), ticks.slice(2, 2), ticks.slice(2, 5)]
+
+    assert cache.get_ticks("SPY", DAY) is None
+    assert cache.put_ticks("SPY", DAY, blocks)
+
+    cached = cache.get_ticks("SPY", DAY)
+    assert cached is not None
+    assert [len(block) for block in cached] == [2, 3]
+
+    joined = iq.TickBatch.concatenate("SPY", cached)
+    assert joined.timestamps[-1] == ticks.timestamps[-1]
+    assert joined.timestamps[0] % 1000000 == 250000
+    for column, expected in zip(joined.columns, ticks.columns):
+        assert column.tolist() == expected.tolist()
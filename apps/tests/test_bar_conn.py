@@ -0,0 +1,117 @@
+from typing import List
+import asyncio
+import datetime
+
+import pytest
+
+from iqfeedserver import iq
+from tests.bar_server import BarServer
+
+
+DAY = datetime.datetime(2019, 11, 26)
+
+
+async def _connect(
+    server: BarServer, received: List[iq.Bar]
+) -> iq.BarConn:
+    conn = iq.BarConn()
+
+    async def handle(bar: iq.Bar) -> None:
+        received.append(bar)
+
+    conn.register_live_bar_callback(handle)
+    await conn.connect("127.0.0.1", server.port)
+    return conn
+
+
+@pytest.mark.asyncio
+async def test_repeated_live_bars_are_dropped() -> None:
+    server = await BarServer(bars=0).start()
+    received = []  # type: List[iq.Bar]
+    conn = await _connect(server, received)
+
+    try:
+        await conn.watch("AAPL", DAY, req_id="R")
+        await asyncio.sleep(0.05)
+
+        for close_p in (267.9, 267.9, 268.1):
+            await server.send_live_bar(
+                "AAPL", DAY.replace(hour=9, minute=31), close_p
+            )
+
+        await server.send_live_bar(
+            "AAPL", DAY.replace(hour=9, minute=32), 268.1
+        )
+        await asyncio.sleep(0.05)
+
+        # Bars with the same timestamp and total volume are repeats
+        assert [bar.time.minute for bar in received] == [31, 32]
+
+        # Unwatching forgets the last bar
+        await conn.unwatch("AAPL")
+        await conn.watch("AAPL", DAY, req_id="R")
+        await asyncio.sleep(0.05)
+        await server.send_live_bar(
+            "AAPL", DAY.replace(hour=9, minute=32), 268.1
+        )
+        await asyncio.sleep(0.05)
+
+        assert len(received) == 3
+
+    finally:
+        await conn.disconnect()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_connections_keep_separate_state() -> None:
+    server = await BarServer(bars=0).start()
+    first_received = []  # type: List[iq.Bar]
+    second_received = []  # type: List[iq.Bar]
+    first = await _connect(server, first_received)
+    second = await _connect(server, second_received)
+
+    try:
+        await first.watch("AAPL", DAY, req_id="R")
+        await asyncio.sleep(0.05)
+        await server.send_live_bar(
+            "AAPL", DAY.replace(hour=9, minute=31), 267.9
+        )
+
+        await second.watch("AAPL", DAY, req_id="R")
+        await asyncio.sleep(0.05)
+        await server.send_live_bar(
+            "AAPL", DAY.replace(hour=9, minute=31), 267.9
+        )
+        await asyncio.sleep(0.05)
+
+        assert len(first_received) == 1
+        assert len(second_received) == 1
+
+    finally:
+        await first.disconnect()
+        await second.disconnect()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_live_bars_of_unwatched_tickers_are_passed_on() -> None:
+    received = []  # type: List[iq.Bar]
+    conn = iq.BarConn()
+
+    async def handle(bar: iq.Bar) -> None:
+        received.append(bar)
+
+    conn.register_live_bar_callback(handle)
+
+    for ticker in ("AAPL", "MSFT", "MSFT"):
+        await conn.handle_fields([
+            "R", "BC", ticker, "2019-11-26 09:31:00", "1", "1", "1", "1",
+            "1000", "100", "10"
+        ])
+
+    await asyncio.sleep(0.05)
+
+    # Nothing is kept to spot repeats of bars that aren't watched
+    assert [bar.ticker for bar in received] == ["AAPL", "MSFT", "MSFT"]
+    assert conn._slots == {}
@@ -0,0 +1,119 @@
+from typing import List
+import asyncio
+import datetime
+
+import pytest
+
+from iqfeedserver import iq
+
+
+def _bar(ticker: str, minute: int) -> iq.Bar:
+    return iq.Bar(
+        date=datetime.date(2019, 11, 26),
+        time=datetime.time(9, minute),
+        open_p=267.9, high_p=267.9, low_p=267.9, close_p=267.9,
+        tot_vlm=100, prd_vlm=100, num_trds=10, ticker=ticker
+    )
+
+
+@pytest.mark.asyncio
+async def test_slow_callback_does_not_delay_others() -> None:
+    dispatcher = iq.BarDispatcher()
+    release = asyncio.Event()
+    fast = []  # type: List[int]
+    slow = []  # type: List[int]
+
+    async def handle_slowly(bar: iq.Bar) -> None:
+        await release.wait()
+        slow.append(bar.time.minute)
+
+    async def handle_quickly(bar: iq.Bar) -> None:
+        fast.append(bar.time.minute)
+
+    dispatcher.subscribe(
+        handle_slowly, max_size=2, policy=iq.OverflowPolicy.DROP_OLDEST
+    )
+    dispatcher.subscribe(handle_quickly)
+
+    try:
+        for minute in range(31, 36):
+            await asyncio.wait_for(
+                dispatcher.dispatch(_bar("AAPL", minute)), 1
+            )
+
+        await asyncio.sleep(0)
+        assert fast == [31, 32, 33, 34, 35]
+
+        stats = dispatcher.stats[0]
+        assert stats.queued == 2
+        assert stats.dropped == 2
+        assert stats.lag > 0
+
+        # The first bar was already being handled when the queue filled up
+        release.set()
+        await asyncio.sleep(0.01)
+        assert slow == [31, 34, 35]
+
+    finally:
+        await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_coalesces_to_latest_bar_per_ticker() -> None:
+    dispatcher = iq.BarDispatcher()
+    release = asyncio.Event()
+    bars = []  # type: List[iq.Bar]
+
+    async def handle(bar: iq.Bar) -> None:
+        await release.wait()
+        bars.append(bar)
+
+    dispatcher.subscribe(handle, max_size=2, policy=iq.OverflowPolicy.COALESCE)
+
+    try:
+        await dispatcher.dispatch(_bar("SPY", 30))
+        await asyncio.sleep(0)
+
+        for minute in range(31, 35):
+            await dispatcher.dispatch(_bar("AAPL", minute))
+            await dispatcher.dispatch(_bar("MSFT", minute))
+
+        assert dispatcher.stats[0].coalesced == 6
+
+        release.set()
+        await asyncio.sleep(0.01)
+        assert [(bar.ticker, bar.time.minute) for bar in bars] == [
+            ("SPY", 30), ("AAPL", 34), ("MSFT", 34)
+        ]
+
+    finally:
+        await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_blocks_until_callback_catches_up() -> None:
+    dispatcher = iq.BarDispatcher()
+    release = asyncio.Event()
+
+    async def handle(bar: iq.Bar) -> None:
+        await release.wait()
+
+    dispatcher.subscribe(handle, max_size=1)
+
+    try:
+        await dispatcher.dispatch(_bar("AAPL", 31))
+        await asyncio.sleep(0)
+        await dispatcher.dispatch(_bar("AAPL", 32))
+
+        blocked = asyncio.ensure_future(dispatcher.dispatch(_bar("AAPL", 33)))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        release.set()
+        await asyncio.wait_for(blocked, 1)
+        await asyncio.sleep(0.01)
+        assert dispatcher.stats[0].delivered == 3
+        assert dispatcher.stats[0].dropped == 0
+
+    finally:
+        await dispatcher.close()
@@ -0,0 +1,75 @@
+import datetime
+
+import pytest
+
+from iqfeedserver import iq
+
+
+@pytest.mark.asyncio
+async def test_serves_deterministic_bars(iqfeed) -> None:
+    start = datetime.datetime(2019, 11, 26, 9, 30)
+
+    async with iqfeed.fake() as server, \
+            iqfeed.connect(server.port) as conn:
+        first = await conn.request_bar_batch_in_period(
+            "AAPL", start, start.replace(hour=16), 60
+        )
+        second = await conn.request_bar_batch_in_period(
+            "AAPL", start, start.replace(hour=16), 60
+        )
+        daily = await conn.request_daily_bar_for_date("AAPL", start)
+
+        assert len(first) == 390
+        assert first.to_bars() == second.to_bars()
+        assert first[0].time == datetime.time(9, 31)
+        assert first[-1].time == datetime.time(16, 0)
+        assert daily.date == start.date()
+
+        # No bars on Thanksgiving
+        with pytest.raises(iq.NoDataError):
+            await conn.request_bar_batch_in_period(
+                "AAPL", start.replace(day=28), start.replace(day=28, hour=16),
+                60
+            )
+
+
+@pytest.mark.asyncio
+async def test_requests_daily_bars_for_ranges(iqfeed) -> None:
+    start = datetime.date(2019, 11, 1)
+    end = datetime.date(2019, 11, 30)
+
+    async with iqfeed.fake() as server, \
+            iqfeed.connect(server.port) as conn:
+        table = await conn.request_daily_bars_in_period("AAPL", start, end)
+        daily = await conn.request_daily_bar_for_date(
+            "AAPL", datetime.datetime(2019, 11, 26)
+        )
+
+        assert server.requests == 2
+        assert len(table) == 20
+        assert table.get(daily.date) == daily
+        assert datetime.date(2019, 11, 28) not in table
+        assert table.get(datetime.date(2019, 12, 2)) is None
+        assert [bar.date for bar in table][0] == start
+
+        results = [
+            result async for result in conn.request_daily_bars_batch(
+                ["AAPL", "MSFT", "TSLA"], start, end, window=2
+            )
+        ]
+        assert server.requests == 5
+        assert sorted(result.ticker for result in results) == [
+            "AAPL", "MSFT", "TSLA"
+        ]
+        assert all(result.table and len(result.table) == 20
+                   for result in results)
+
+        # No bars over a weekend
+        results = [
+            result async for result in conn.request_daily_bars_batch(
+                ["AAPL"], datetime.date(2019, 11, 2),
+                datetime.date(2019, 11, 3)
+            )
+        ]
+        assert results[0].table is None
+        assert isinstance(results[0].error, iq.NoDataError)
@@ -0,0 +1,68 @@
+from typing import List
+import datetime
+
+import pytest
+
+from iqfeedserver.iq import field_readers
+
+
+def test_converts_timestamp() -> None:
+    assert field_readers.convert_iqfeed_timestamp_to_date_and_time(
+        "2019-11-29 11:37:05"
+    ) == (datetime.date(2019, 11, 29), datetime.time(11, 37, 5))
+
+
+@pytest.mark.parametrize("timestamp", [
+    "2019-11-29 11:37",
+    "2019-11-29T11:37:05",
+    "2019-13-29 11:37:05",
+    "2019-11-29 24:00:00",
+    "2019-+1-29 11:37:05",
+    "not a timestamp",
+])
+def test_rejects_invalid_timestamp(timestamp: str) -> None:
+    with pytest.raises(ValueError):
+        field_readers.convert_iqfeed_timestamp_to_date_and_time(timestamp)
+
+
+def test_converts_tick_timestamp() -> None:
+    micros = field_readers.convert_iqfeed_tick_timestamp_to_epoch_micros(
+        "2019-11-29 11:37:05.0125"
+    )
+
+    assert micros % 1000000 == 12500
+    assert field_readers.convert_epoch_micros_to_iqfeed_timestamp(micros) == \
+        "2019-11-29 11:37:05.012500"
+
+    with pytest.raises(ValueError):
+        field_readers.convert_iqfeed_tick_timestamp_to_epoch_micros(
+            "2019-11-29 11:37:05,0125"
+        )
+
+
+def test_converts_date() -> None:
+    assert field_readers.convert_iqfeed_date_to_date("2019-11-29") == \
+        datetime.date(2019, 11, 29)
+
+    with pytest.raises(ValueError):
+        field_readers.convert_iqfeed_date_to_date("2019-11-31")
+
+
+@pytest.mark.parametrize("fields", [
+    ["AAPL", "2019-11-29 09:31:00", "268.0", "267.5", "267.6", "267.9"],
+    ["AAPL", "2019-11-29", "268.0", "267.5", "267.6", "267.9", "1", "1", "1"],
+    ["AAPL", "2019-11-29 09:31:00", "", "267.5", "267.6", "267.9", "1", "1",
+     "1"],
+    ["AAPL", "2019-11-29 09:31:00", "268.0", "267.5", "267.6", "267.9", "1",
+     "1.5", "1"],
+])
+def test_rejects_invalid_historical_fields(fields: List[str]) -> None:
+    with pytest.raises(ValueError):
+        field_readers.check_historical_fields(fields)
+
+
+def test_accepts_historical_fields() -> None:
+    field_readers.check_historical_fields([
+        "AAPL", "2019-11-29 09:31:00", "268.00", "267.50", "-0.5", "267.90",
+        "1000", "100", "10"
+    ])
@@ -0,0 +1,186 @@
+from typing import AsyncGenerator
+from typing import AsyncIterator
+from typing import List
+from typing import Tuple
+import asyncio
+import contextlib
+import datetime
+import time
+
+import pytest
+
+from iqfeedserver import handler
+from iqfeedserver import worker
+
+
+JOB_SECONDS = 0.2
+
+
+async def _slow_job(
+    ticker: str, start: datetime.datetime, interval: int, days: int
+) -> AsyncGenerator[bytes, None]:
+    await asyncio.sleep(JOB_SECONDS)
+    yield worker.encode_messages(
+        ["B-%s-%04d-s,BC,%s" % (ticker, interval, ticker)]
+    )
+
+
+@contextlib.asynccontextmanager
+async def _connect(
+    monkeypatch
+) -> AsyncIterator[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+    monkeypatch.setattr(worker, "process_job", _slow_job)
+
+    server = await asyncio.start_server(
+        handler.IQFeedServerHandler(max_jobs=4).handle, "127.0.0.1", 0
+    )
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", server.sockets[0].getsockname()[1]
+    )
+
+    try:
+        yield reader, writer
+
+    finally:
+        writer.close()
+        server.close()
+        await server.wait_closed()
+
+
+async def _read_lines(reader: asyncio.StreamReader, count: int) -> List[str]:
+    return [
+        (await reader.readline()).decode("latin-1").strip()
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_requests_run_concurrently(monkeypatch) -> None:
+    tickers = ["AAPL", "MSFT", "SPY", "QQQ"]
+
+    async with _connect(monkeypatch) as (reader, writer):
+        start = time.monotonic()
+        for ticker in tickers:
+            writer.write(("BW,%s,60,20191129 093000\r\n" % ticker).encode())
+
+        lines = await _read_lines(reader, len(tickers))
+
+    assert time.monotonic() - start < JOB_SECONDS * len(tickers) / 2
+    assert sorted(line.split(",")[2] for line in lines) == sorted(tickers)
+
+
+@pytest.mark.asyncio
+async def test_unwatch_cancels_request(monkeypatch) -> None:
+    async with _connect(monkeypatch) as (reader, writer):
+        writer.write(b"BW,AAPL,60,20191129 093000\r\n")
+        writer.write(b"BW,MSFT,60,20191129 093000\r\n")
+        writer.write(b"BR,AAPL\r\n")
+
+        assert await _read_lines(reader, 1) == ["B-MSFT-0060-s,BC,MSFT"]
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(reader.readline(), timeout=JOB_SECONDS * 2)
+
+
+@pytest.mark.asyncio
+async def test_watch_honours_interval(monkeypatch) -> None:
+    async with _connect(monkeypatch) as (reader, writer):
+        writer.write(b"BW,AAPL,300,20191129 093000,,,,,,s,,\r\n")
+        writer.write(b"BW,MSFT,10,20191129 093000,,,,,,v,,\r\n")
+
+        assert sorted(await _read_lines(reader, 2)) == [
+            "B-AAPL-0300-s,BC,AAPL", "n,MSFT"
+        ]
+
+
+@pytest.mark.asyncio
+async def test_live_watches_dont_block_replays(monkeypatch) -> None:
+    async def watch(
+        ticker: str, start: datetime.datetime, interval: int, days: int
+    ) -> AsyncGenerator[bytes, None]:
+        if not worker.is_live_job(start, days):
+            async for chunk in _slow_job(ticker, start, interval, days):
+                yield chunk
+
+            return
+
+        yield worker.encode_messages(["B-%s-0060-s,BH,%s" % (ticker, ticker)])
+        await asyncio.Event().wait()
+
+    async with _connect(monkeypatch) as (reader, writer):
+        monkeypatch.setattr(worker, "process_job", watch)
+        monkeypatch.setattr(worker, "is_live", lambda start: start.year > 2019)
+
+        # More live watches than the client's job limit
+        for ticker in ["A", "B", "C", "D", "E", "F"]:
+            writer.write(("BW,%s,60,20201130 093000\r\n" % ticker).encode())
+
+        assert len(await _read_lines(reader, 6)) == 6
+
+        writer.write(b"BW,AAPL,60,20191129 093000\r\n")
+        assert await asyncio.wait_for(
+            _read_lines(reader, 1), JOB_SECONDS * 5
+        ) == ["B-AAPL-0060-s,BC,AAPL"]
+
+
+def test_parses_watch_request(monkeypatch) -> None:
+    monkeypatch.setenv("IQFEED_MAX_DAYS", "10")
+
+    assert handler.IQFeedServerHandler._parse_watch(
+        "BW,AAPL,300,20191129 100500,5,,,,,s,,".split(",")
+    ) == (datetime.datetime(2019, 11, 29, 10, 5), 300, 5)
+
+    assert handler.IQFeedServerHandler._parse_watch(
+        "BW,AAPL,60,20191129".split(",")
+    ) == (datetime.datetime(2019, 11, 29), 60, 1)
+
+    assert handler.IQFeedServerHandler._parse_watch(
+        "BW,AAPL,60,20191129,5000".split(",")
+    ) == (datetime.datetime(2019, 11, 29), 60, 10)
+
+
+def test_parses_tick_request() -> None:
+    assert handler.IQFeedServerHandler._parse_ticks(
+        "HTT,SPY,20191129 093000,20191129 100000,,,,1,T1,".split(",")
+    ) == (
+        datetime.datetime(2019, 11, 29, 9, 30),
+        datetime.datetime(2019, 11, 29, 10), "T1"
+    )
+
+    assert handler.IQFeedServerHandler._parse_ticks(
+        "HTT,SPY,20191129 093000".split(",")
+    ) == (
+        datetime.datetime(2019, 11, 29, 9, 30),
+        datetime.datetime.combine(
+            datetime.date(2019, 11, 29), datetime.time.max
+        ), "SPY"
+    )
+
+    with pytest.raises(ValueError):
+        handler.IQFeedServerHandler._parse_ticks(
+            "HTT,SPY,20191129 100000,20191129 093000".split(",")
+        )
+
+
+@pytest.mark.asyncio
+async def test_idle_client_gets_heartbeats() -> None:
+    server = await asyncio.start_server(
+        handler.IQFeedServerHandler(heartbeat_interval=0.1).handle,
+        "127.0.0.1", 0
+    )
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", server.sockets[0].getsockname()[1]
+    )
+
+    try:
+        assert await _read_lines(reader, 2) == [
+            "S,SERVER CONNECTED", "S,SERVER CONNECTED"
+        ]
+
+        # Closing the connection ends the session straight away
+        writer.close()
+        assert await asyncio.wait_for(reader.read(), 1) == b""
+
+    finally:
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pytest
+
+from iqfeedserver.heartbeat import HeartbeatScheduler
+
+
+INTERVAL = 0.2
+
+
+@pytest.mark.asyncio
+async def test_sends_heartbeats_to_idle_clients() -> None:
+    heartbeats = HeartbeatScheduler(INTERVAL, b"HEARTBEAT\r\n")
+
+    async def handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        heartbeats.register(writer)
+
+        try:
+            while await reader.readline():
+                heartbeats.touch(writer)
+
+        finally:
+            heartbeats.unregister(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    idle_reader, idle_writer = await asyncio.open_connection("127.0.0.1", port)
+    busy_reader, busy_writer = await asyncio.open_connection("127.0.0.1", port)
+
+    try:
+        start = time.monotonic()
+
+        # Keep one client active so it never falls due
+        for _ in range(5):
+            busy_writer.write(b"PING\r\n")
+            await asyncio.sleep(INTERVAL / 2)
+
+        assert await asyncio.wait_for(idle_reader.readline(), 1) == \
+            b"HEARTBEAT\r\n"
+        assert time.monotonic() - start >= INTERVAL
+
+        # The active client was never sent a heartbeat
+        busy_writer.close()
+        assert await busy_reader.read() == b""
+        await asyncio.sleep(0.05)
+        assert heartbeats.clients == 1
+
+    finally:
+        idle_writer.close()
+        server.close()
+        await server.wait_closed()
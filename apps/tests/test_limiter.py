@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from iqfeedserver import iq
+
+
+@pytest.mark.asyncio
+async def test_backs_off_once_per_round_of_throttling() -> None:
+    limiter = iq.AdaptiveLimiter(initial_limit=8)
+
+    async def request(throttled: bool) -> None:
+        async with limiter.acquire() as permit:
+            await asyncio.sleep(0.01)
+            if throttled:
+                permit.record_throttled()
+            else:
+                permit.record_latency()
+
+    # Every request in the round was sent before the first cut
+    await asyncio.gather(*(request(True) for _ in range(8)))
+    assert limiter.limit == 4
+    assert limiter.stats.throttled == 8
+
+    await asyncio.gather(*(request(False) for _ in range(4)))
+    assert limiter.limit == pytest.approx(4.9, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_requests_past_limit_wait_in_order() -> None:
+    limiter = iq.AdaptiveLimiter(initial_limit=1, max_limit=1)
+    order = []
+
+    async def request(index: int) -> None:
+        async with limiter.acquire():
+            order.append(index)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(request(index) for index in range(4)))
+
+    assert order == [0, 1, 2, 3]
+    assert limiter.stats.in_flight == 0
@@ -0,0 +1,111 @@
+from typing import List
+import asyncio
+
+import pytest
+
+from iqfeedserver.iq.line_protocol import LineProtocol
+
+
+async def _serve(chunks, delay):
+    # type: (List[bytes], float) -> asyncio.Server
+    async def handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        for chunk in chunks:
+            writer.write(chunk)
+            await writer.drain()
+            await asyncio.sleep(delay)
+
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+@pytest.mark.asyncio
+async def test_splits_lines_across_chunks() -> None:
+    server = await _serve(
+        [b"S,SERVER CON", b"NECTED\r\nH_1,", b"!ENDMSG!,\r\n"], 0.01
+    )
+    _, protocol = await asyncio.get_running_loop().create_connection(
+        lambda: LineProtocol(1), "127.0.0.1",
+        server.sockets[0].getsockname()[1]
+    )
+
+    lines = []  # type: List[str]
+    while True:
+        batch = await protocol.read_lines()
+        if not batch:
+            break
+
+        lines += [line.strip() for line in batch]
+
+    assert lines == ["S,SERVER CONNECTED", "H_1,!ENDMSG!,"]
+
+    protocol.transport.close()
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_reads_last_line_without_newline() -> None:
+    server = await _serve([b"S,SERVER CONNECTED\r\nH_1,!ENDMSG!,"], 0)
+    _, protocol = await asyncio.get_running_loop().create_connection(
+        lambda: LineProtocol(1), "127.0.0.1",
+        server.sockets[0].getsockname()[1]
+    )
+
+    lines = []  # type: List[str]
+    while True:
+        batch = await protocol.read_lines()
+        if not batch:
+            break
+
+        lines += batch
+
+    assert lines == ["S,SERVER CONNECTED\r", "H_1,!ENDMSG!,"]
+
+    protocol.transport.close()
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_times_out_when_idle() -> None:
+    server = await _serve([b"S,SERVER CONNECTED\r\n"], 1)
+    _, protocol = await asyncio.get_running_loop().create_connection(
+        lambda: LineProtocol(0.1), "127.0.0.1",
+        server.sockets[0].getsockname()[1]
+    )
+
+    assert await protocol.read_lines() == ["S,SERVER CONNECTED\r"]
+
+    with pytest.raises(asyncio.TimeoutError):
+        await protocol.read_lines()
+
+    protocol.transport.close()
+    server.close()
+    await server.wait_closed()
+
+
+def test_reads_lines_with_uvloop() -> None:
+    uvloop = pytest.importorskip("uvloop")
+
+    async def read() -> List[str]:
+        server = await _serve([b"H_1,!ENDMSG!,\r\n"], 0)
+        _, protocol = await asyncio.get_running_loop().create_connection(
+            lambda: LineProtocol(1), "127.0.0.1",
+            server.sockets[0].getsockname()[1]
+        )
+
+        lines = await asyncio.wait_for(protocol.read_lines(), 5)
+        server.close()
+        await server.wait_closed()
+        return lines
+
+    loop = uvloop.new_event_loop()
+
+    try:
+        assert loop.run_until_complete(read()) == ["H_1,!ENDMSG!,\r"]
+
+    finally:
+        loop.close()
@@ -0,0 +1,179 @@
+from typing import AsyncGenerator
+from typing import List
+from typing import Tuple
+import asyncio
+import datetime
+
+import pytest
+
+from iqfeedserver import iq
+from iqfeedserver import live_proxy
+from iqfeedserver.live_proxy import LiveProxy
+from tests.bar_server import BarServer
+
+
+DAY = datetime.datetime(2019, 11, 26)
+
+
+async def _next(
+    stream: AsyncGenerator[List[Tuple[str, iq.Bar]], None], count: int
+) -> List[Tuple[str, str, float]]:
+    bars = []  # type: List[Tuple[str, str, float]]
+    while len(bars) < count:
+        for bar_type, bar in await asyncio.wait_for(stream.__anext__(), 5):
+            bars.append((bar_type, bar.time.strftime("%H:%M"), bar.close_p))
+
+    return bars
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_one_watch() -> None:
+    server = await BarServer().start()
+    proxy = LiveProxy("127.0.0.1", server.port)
+
+    first = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+    second = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+
+    try:
+        history = [("BH", "09:31", 267.9), ("BH", "09:32", 268.9)]
+        assert await _next(first, 2) == history
+        assert await _next(second, 2) == history
+
+        await server.send_live_bar("AAPL", DAY.replace(hour=9, minute=33), 270)
+        assert await _next(first, 1) == [("BC", "09:33", 270.0)]
+        assert await _next(second, 1) == [("BC", "09:33", 270.0)]
+
+        assert [
+            command for command in server.commands
+            if command.startswith("BW,")
+        ] == ["BW,AAPL,60,20191126 000000,,,,,L-AAPL-0060,s,,"]
+        assert proxy.stats.shared == 1
+
+        # The watch is only stopped once the last subscriber leaves
+        await first.aclose()
+        assert "BR,AAPL" not in server.commands
+
+        await second.aclose()
+        await asyncio.sleep(0.05)
+        assert server.commands[-1] == "BR,AAPL"
+        assert proxy.stats.watches == 0
+
+    finally:
+        await proxy.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_gets_bars_since_start() -> None:
+    server = await BarServer(bars=3).start()
+    proxy = LiveProxy("127.0.0.1", server.port)
+
+    first = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+    late = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=32))
+
+    try:
+        await _next(first, 3)
+        await server.send_live_bar("AAPL", DAY.replace(hour=9, minute=34), 1)
+        await server.send_live_bar(
+            "AAPL", DAY.replace(hour=9, minute=34), 2, 2000
+        )
+
+        # A subscriber that falls behind only gets the latest update
+        while (await _next(first, 1))[-1][2] != 2.0:
+            pass
+
+        # Only the latest update of a bar is kept for late subscribers
+        assert await _next(late, 2) == [
+            ("BH", "09:33", 269.9), ("BC", "09:34", 2.0)
+        ]
+        assert server.connections == 1
+
+    finally:
+        await first.aclose()
+        await late.aclose()
+        await proxy.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_streams_end_when_upstream_is_lost() -> None:
+    server = await BarServer(bars=1).start()
+    proxy = LiveProxy("127.0.0.1", server.port)
+
+    stream = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+    missing = proxy.stream("MISSING", 60, DAY.replace(hour=9, minute=30))
+
+    try:
+        await _next(stream, 1)
+        await _next(missing, 1)
+
+        await server.send_no_data("MISSING")
+        with pytest.raises(iq.NoDataError):
+            await _next(missing, 1)
+
+        server.drop_connections()
+        with pytest.raises(ConnectionError):
+            await _next(stream, 1)
+
+        assert proxy.stats.lost == 1
+        assert proxy.stats.watches == 0
+
+        # The next subscriber reconnects
+        await stream.aclose()
+        stream = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+        assert await _next(stream, 1) == [("BH", "09:31", 267.9)]
+        assert server.connections == 2
+
+    finally:
+        await stream.aclose()
+        await missing.aclose()
+        await proxy.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_first_subscriber_stops_watch() -> None:
+    server = await BarServer().start()
+    proxy = LiveProxy("127.0.0.1", server.port)
+
+    stream = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+
+    try:
+        # Give up while the watch is still being started
+        task = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        await asyncio.sleep(0.05)
+        assert proxy.stats.watches == 0
+        assert server.commands[-1] == "BR,AAPL"
+
+    finally:
+        await stream.aclose()
+        await proxy.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_watch_keeps_latest_bars(monkeypatch) -> None:
+    monkeypatch.setattr(live_proxy, "MAX_WATCH_BARS", 10)
+    server = await BarServer(bars=15).start()
+    proxy = LiveProxy("127.0.0.1", server.port)
+
+    first = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+    late = proxy.stream("AAPL", 60, DAY.replace(hour=9, minute=30))
+
+    try:
+        while (await _next(first, 1))[-1] != ("BH", "09:45", 281.9):
+            pass
+
+        # Late subscribers only get the bars that were kept
+        assert (await _next(late, 1))[0] == ("BH", "09:37", 273.9)
+
+    finally:
+        await first.aclose()
+        await late.aclose()
+        await proxy.close()
+        await server.stop()
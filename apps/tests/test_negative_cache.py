@@ -0,0 +1,38 @@
+import datetime
+import os
+import time
+
+from iqfeedserver.negative_cache import NegativeCache
+
+
+DAY = datetime.date(2019, 11, 29)
+
+
+def test_remembers_days_without_data(tmpdir) -> None:
+    path = os.path.join(str(tmpdir), "no_data.json")
+    cache = NegativeCache(path)
+
+    assert not cache.get("AAPL", DAY, 60)
+    cache.put("AAPL", DAY, 60)
+
+    assert cache.get("AAPL", DAY, 60)
+    assert not cache.get("MSFT", DAY, 60)
+    assert not cache.get("AAPL", DAY, 1)
+
+    # Entries are written to disk when the cache is flushed
+    assert not os.path.exists(path)
+    cache.flush()
+    assert NegativeCache(path).get("AAPL", DAY, 60)
+    assert cache.stats.hits == 1
+
+
+def test_entries_expire() -> None:
+    today = datetime.date.today()
+    cache = NegativeCache(ttl=60, recent_ttl=0.05)
+
+    cache.put("AAPL", DAY, 60)
+    cache.put("AAPL", today, 60)
+    time.sleep(0.1)
+
+    assert cache.get("AAPL", DAY, 60)
+    assert not cache.get("AAPL", today, 60)
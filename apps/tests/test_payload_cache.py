@@ -0,0 +1,38 @@
+from iqfeedserver.payload_cache import PayloadCache
+
+
+def test_evicts_by_size() -> None:
+    cache = PayloadCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+
+    cache.put("c", b"1234")
+
+    assert cache.get("a") == b"1234"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"1234"
+    assert cache.stats.size == 8
+    assert cache.stats.entries == 2
+
+
+def test_reports_hit_ratio() -> None:
+    cache = PayloadCache()
+    cache.put("a", b"payload")
+
+    cache.get("a")
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+
+    assert cache.stats.hits == 3
+    assert cache.stats.misses == 1
+    assert cache.stats.hit_ratio == 0.75
+
+
+def test_ignores_oversized_payloads() -> None:
+    cache = PayloadCache(max_bytes=4)
+    cache.put("a", b"12345")
+
+    assert cache.get("a") is None
+    assert cache.stats.size == 0
@@ -0,0 +1,149 @@
+import asyncio
+import datetime
+
+import pytest
+
+from iqfeedserver import iq
+
+
+START = datetime.datetime(2019, 11, 29, 9, 30)
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_connections(iqfeed) -> None:
+    async with iqfeed.lookup() as server, \
+            iqfeed.pool(server.port, max_size=2) as pool:
+        for _ in range(3):
+            async with pool.acquire() as conn:
+                bars = await conn.request_bars_in_period(
+                    "AAPL", START, START.replace(hour=16), 60
+                )
+                assert bars[0].close_p == 267.9
+
+        assert server.connections == 1
+        assert pool.stats.misses == 1
+        assert pool.stats.hits == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_limits_concurrency(iqfeed) -> None:
+    async with iqfeed.lookup() as server, \
+            iqfeed.pool(server.port, max_size=2) as pool:
+        async def request() -> None:
+            async with pool.acquire() as conn:
+                await conn.request_bars_in_period(
+                    "AAPL", START, START.replace(hour=16), 60
+                )
+
+        await asyncio.gather(*(request() for _ in range(6)))
+
+        assert server.connections <= 2
+        assert pool.stats.waits > 0
+        assert pool.stats.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_requests_share_connection(iqfeed) -> None:
+    tickers = ["AAPL", "MSFT", "SPY", "QQQ", "AAPL"]
+
+    async with iqfeed.lookup() as server, \
+            iqfeed.connect(server.port) as conn:
+        results = [
+            result async for result in conn.request_bars_batch(
+                (
+                    iq.BarRequest(ticker, START, START.replace(hour=16), 60)
+                    for ticker in tickers
+                ),
+                window=2
+            )
+        ]
+
+        assert server.connections == 1
+        assert sorted(result.request.ticker for result in results) == \
+            sorted(tickers)
+        assert all(result.error is None for result in results)
+        assert all(result.bars[0].ticker == result.request.ticker
+                   for result in results)
+
+
+@pytest.mark.asyncio
+async def test_batch_requests_waiting_for_limiter_keep_their_ids(
+    iqfeed
+) -> None:
+    starts = [START - datetime.timedelta(days=i) for i in range(300)]
+
+    async with iqfeed.lookup() as server, \
+            iqfeed.pool(
+                server.port, max_size=2, limiter=iq.AdaptiveLimiter(4, 4)
+            ) as pool, \
+            pool.acquire() as conn:
+        # Most of the window waits on the limiter before being registered
+        results = [
+            result async for result in conn.request_bars_batch(
+                (
+                    iq.BarRequest(
+                        "AAPL", start, start.replace(hour=16), 60
+                    )
+                    for start in starts
+                ),
+                window=20
+            )
+        ]
+
+        assert len(results) == len(starts)
+        assert all(result.error is None for result in results)
+        assert all(result.bars[0].date == result.request.start.date()
+                   for result in results)
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_does_not_block_connection(iqfeed) -> None:
+    async with iqfeed.lookup(bars=50000) as server, \
+            iqfeed.connect(server.port) as conn:
+        batches = conn.stream_bar_batches_in_period(
+            "AAPL", START, START.replace(hour=16), 60
+        )
+
+        try:
+            # Stop reading the stream after its first batch
+            assert await batches.__anext__()
+
+            bars = await asyncio.wait_for(conn.request_bars_in_period(
+                "MSFT", START, START.replace(hour=16), 60
+            ), 5)
+            assert len(bars) == 50000
+
+        finally:
+            await batches.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_retries_throttled_requests(iqfeed) -> None:
+    async with iqfeed.lookup(throttle=3) as server, \
+            iqfeed.pool(server.port, max_size=2) as pool:
+        async with pool.acquire() as conn:
+            bars = await conn.request_bars_in_period(
+                "AAPL", START, START.replace(hour=16), 60
+            )
+
+        assert bars[0].close_p == 267.9
+        assert pool.limiter.stats.throttled == 3
+        assert pool.limiter.stats.backoffs >= 1
+
+
+@pytest.mark.asyncio
+async def test_large_responses_dont_back_off(iqfeed) -> None:
+    async with iqfeed.fake(latency=0.05, line_rate=1000) as server, \
+            iqfeed.pool(server.port, max_size=2) as pool:
+        async with pool.acquire() as conn:
+            await conn.request_bars_in_period(
+                "AAPL", START, START.replace(minute=40), 60
+            )
+
+            # Streaming the whole day takes several times the latency of the
+            # small request, but IQFeed started answering just as quickly
+            await conn.request_bars_in_period(
+                "AAPL", START, START.replace(hour=16), 60
+            )
+
+        assert pool.limiter.stats.backoffs == 0
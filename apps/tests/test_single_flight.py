@@ -0,0 +1,53 @@
+from typing import AsyncIterator
+from typing import List
+import asyncio
+
+import pytest
+
+from iqfeedserver.single_flight import SingleFlight
+
+
+async def _collect(flights: SingleFlight[int], fn) -> List[int]:
+    return [chunk async for chunk in flights.stream("AAPL", fn)]
+
+
+@pytest.mark.asyncio
+async def test_coalesces_concurrent_streams() -> None:
+    flights = SingleFlight()  # type: SingleFlight[int]
+    calls = []
+
+    async def fetch() -> AsyncIterator[int]:
+        calls.append(1)
+        for i in range(3):
+            await asyncio.sleep(0.02)
+            yield i
+
+    results = await asyncio.gather(
+        *(_collect(flights, fetch) for _ in range(5))
+    )
+
+    assert results == [[0, 1, 2]] * 5
+    assert len(calls) == 1
+    assert flights.coalesced == 4
+
+    # Streams started after the first one completes run again
+    assert await _collect(flights, fetch) == [0, 1, 2]
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others() -> None:
+    flights = SingleFlight()  # type: SingleFlight[int]
+
+    async def fetch() -> AsyncIterator[int]:
+        await asyncio.sleep(0.05)
+        yield 42
+
+    first = asyncio.ensure_future(_collect(flights, fetch))
+    second = asyncio.ensure_future(_collect(flights, fetch))
+    await asyncio.sleep(0)
+
+    first.cancel()
+
+    assert await second == [42]
+    assert first.cancelled()
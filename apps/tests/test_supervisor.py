@@ -0,0 +1,55 @@
+import os
+import sys
+import threading
+import time
+
+from iqfeedserver.supervisor import Supervisor
+
+
+def _crash() -> None:
+    sys.exit(1)
+
+
+def _sleep() -> None:
+    time.sleep(60)
+
+
+def test_restarts_workers_that_exit() -> None:
+    supervisor = Supervisor(2, _crash, restart_delay=0.01)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+
+    try:
+        deadline = time.monotonic() + 10
+        while supervisor.restarts < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert supervisor.restarts >= 4
+
+    finally:
+        supervisor.stop()
+        thread.join()
+
+
+def test_stops_workers() -> None:
+    supervisor = Supervisor(2, _sleep)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+
+    deadline = time.monotonic() + 10
+    while len(supervisor.pids) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    pids = supervisor.pids
+    supervisor.stop()
+    thread.join()
+
+    assert len(pids) == 2
+    assert supervisor.restarts == 0
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+            assert False, "Worker %d is still running" % pid
+
+        except ProcessLookupError:
+            pass
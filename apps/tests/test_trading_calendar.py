@@ -0,0 +1,37 @@
+import datetime
+
+from iqfeedserver import trading_calendar
+
+
+def test_closed_on_weekends_and_holidays() -> None:
+    assert trading_calendar.is_trading_day(datetime.date(2019, 11, 27))
+    assert not trading_calendar.is_trading_day(datetime.date(2019, 11, 28))
+    assert not trading_calendar.is_trading_day(datetime.date(2019, 11, 30))
+    assert not trading_calendar.is_trading_day(datetime.date(2019, 4, 19))
+    assert not trading_calendar.is_trading_day(datetime.date(2018, 12, 5))
+
+    # Independence Day on a Saturday is observed on the Friday before
+    assert not trading_calendar.is_trading_day(datetime.date(2020, 7, 3))
+
+    # New Year's Day on a Saturday isn't observed
+    assert trading_calendar.is_trading_day(datetime.date(2021, 12, 31))
+
+    assert trading_calendar.get_next_trading_day(
+        datetime.date(2019, 12, 25)
+    ) == datetime.date(2019, 12, 26)
+
+
+def test_closes_early_on_half_days() -> None:
+    assert trading_calendar.get_session(
+        datetime.date(2019, 11, 29)
+    ) == trading_calendar.Session(
+        datetime.datetime(2019, 11, 29, 9, 30),
+        datetime.datetime(2019, 11, 29, 13)
+    )
+    assert [
+        session.close.hour for session in (
+            trading_calendar.get_session(datetime.date(2019, 12, day))
+            for day in (23, 24)
+        ) if session
+    ] == [16, 13]
+    assert trading_calendar.get_session(datetime.date(2019, 12, 25)) is None
@@ -0,0 +1,374 @@
+from typing import List
+import asyncio
+import datetime
+import time
+
+import pytest
+
+from iqfeedserver import worker
+
+
+DAY = datetime.datetime(2019, 11, 29)
+NO_TICKS = ["T1,E,!NO_DATA!,", "T1,!ENDMSG!,"]
+
+
+async def _collect(
+    ticker: str, start: datetime.datetime,
+    interval: int = worker.DEFAULT_INTERVAL, days: int = 1
+) -> List[str]:
+    chunks = [
+        chunk async for chunk in worker.process_job(
+            ticker, start, interval, days
+        )
+    ]
+    return b"".join(chunks).decode("latin-1").splitlines()
+
+
+@pytest.mark.asyncio
+async def test_process_job_streams_bars(iqfeed) -> None:
+    async with iqfeed.lookup(bars=3):
+        lines = await _collect("AAPL", DAY)
+
+        assert lines == [
+            "B-AAPL-0060-s,BC,AAPL,2019-11-29 09:31:00,"
+            "267.6,268.0,267.5,267.9,100,100,10",
+            "B-AAPL-0060-s,BC,AAPL,2019-11-29 09:32:00,"
+            "268.6,269.0,268.5,268.9,200,100,10",
+            "B-AAPL-0060-s,BC,AAPL,2019-11-29 09:33:00,"
+            "269.6,270.0,269.5,269.9,300,100,10",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_identical_jobs_share_request(iqfeed) -> None:
+    async with iqfeed.lookup(bars=3, delay=0.1) as server:
+        results = await asyncio.gather(
+            *(_collect("AAPL", DAY) for _ in range(3))
+        )
+
+        assert results[0] == results[1] == results[2]
+        assert len(results[0]) == 3
+        assert sum(
+            command.startswith("HIT,") for command in server.commands
+        ) == 1
+
+
+@pytest.mark.asyncio
+async def test_passthrough_keeps_iqfeed_text(monkeypatch, iqfeed) -> None:
+    monkeypatch.setenv("IQFEED_PASSTHROUGH", "1")
+    monkeypatch.setenv("IQFEED_PASSTHROUGH_VALIDATE", "1")
+
+    async with iqfeed.lookup(bars=2):
+        lines = await _collect("AAPL", DAY)
+
+        assert lines == [
+            "B-AAPL-0060-s,BC,AAPL,2019-11-29 09:31:00,"
+            "267.60,268.00,267.50,267.90,100,100,10",
+            "B-AAPL-0060-s,BC,AAPL,2019-11-29 09:32:00,"
+            "268.60,269.00,268.50,268.90,200,100,10",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_passthrough_matches_parsed_replay(monkeypatch, iqfeed) -> None:
+    start = DAY.replace(hour=9, minute=37)
+
+    async with iqfeed.lookup(bars=10) as server:
+        parsed = await _collect("AAPL", start)
+
+        monkeypatch.setenv("IQFEED_PASSTHROUGH", "1")
+        monkeypatch.setattr(worker, "_payloads", None)
+        passthrough = await _collect("AAPL", start)
+
+        assert [line.split(",")[3] for line in passthrough] == [
+            line.split(",")[3] for line in parsed
+        ] == [
+            "2019-11-29 09:38:00", "2019-11-29 09:39:00",
+            "2019-11-29 09:40:00",
+        ]
+
+        # Both pull the whole day, so no data would mean none for the day
+        assert [
+            command.split(",")[3] for command in server.commands
+            if command.startswith("HIT,")
+        ] == ["20191129 093000", "20191129 093000"]
+
+
+@pytest.mark.asyncio
+async def test_intervals_resampled_from_one_pull(iqfeed) -> None:
+    async with iqfeed.lookup(bars=10, delay=0.1) as server:
+        five, ten = await asyncio.gather(
+            _collect("AAPL", DAY, 300),
+            _collect("AAPL", DAY, 600)
+        )
+
+        assert five == [
+            "B-AAPL-0300-s,BC,AAPL,2019-11-29 09:35:00,"
+            "267.6,272.0,267.5,271.9,500,500,50",
+            "B-AAPL-0300-s,BC,AAPL,2019-11-29 09:40:00,"
+            "272.6,277.0,272.5,276.9,1000,500,50",
+        ]
+        assert ten == [
+            "B-AAPL-0600-s,BC,AAPL,2019-11-29 09:40:00,"
+            "267.6,277.0,267.5,276.9,1000,1000,100",
+        ]
+        assert [
+            command.split(",")[2] for command in server.commands
+            if command.startswith("HIT,")
+        ] == ["60"]
+
+
+@pytest.mark.asyncio
+async def test_resampled_intervals_line_up_with_iqfeed(
+    monkeypatch, iqfeed
+) -> None:
+    start = datetime.datetime(2019, 11, 26, 9, 30)
+
+    async with iqfeed.fake():
+        lines = await _collect("AAPL", start, 3600)
+
+        # Intervals are counted from the open, with the last one cut short
+        # by the close
+        assert [line.split(",")[3] for line in lines] == [
+            "2019-11-26 %02d:30:00" % hour for hour in range(10, 17)
+        ]
+
+        monkeypatch.setenv("IQFEED_PASSTHROUGH", "1")
+        monkeypatch.setattr(worker, "_payloads", None)
+        passthrough = await _collect("AAPL", start, 3600)
+
+        assert [line.split(",")[3] for line in passthrough] == [
+            line.split(",")[3] for line in lines[:-1]
+        ]
+
+
+@pytest.mark.asyncio
+async def test_replay_starts_at_requested_time(iqfeed) -> None:
+    async with iqfeed.lookup(bars=10):
+        lines = await _collect("AAPL", DAY.replace(hour=9, minute=37))
+
+        assert [line.split(",")[3] for line in lines] == [
+            "2019-11-29 09:38:00", "2019-11-29 09:39:00",
+            "2019-11-29 09:40:00",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_multi_day_replay_streams_days_in_order(iqfeed) -> None:
+    async with iqfeed.lookup(bars=2, delay=0.2):
+        start = time.monotonic()
+        lines = await _collect("AAPL", DAY.replace(hour=9, minute=30), days=3)
+
+        # Days are pulled concurrently and the weekend is skipped
+        assert time.monotonic() - start < 0.4
+        assert [line.split(",")[3] for line in lines] == [
+            "2019-11-29 09:31:00", "2019-11-29 09:32:00",
+            "2019-12-02 09:31:00", "2019-12-02 09:32:00",
+            "2019-12-03 09:31:00", "2019-12-03 09:32:00",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_days_without_data_answered_locally(iqfeed) -> None:
+    async with iqfeed.lookup(bars=0) as server:
+        assert await _collect("DEAD", DAY) == ["n,DEAD"]
+        assert await _collect("DEAD", DAY) == ["n,DEAD"]
+        assert sum(
+            command.startswith("HIT,") for command in server.commands
+        ) == 1
+
+
+@pytest.mark.asyncio
+async def test_days_without_second_bars_keep_minute_bars(iqfeed) -> None:
+    async with iqfeed.lookup(bars=2, min_interval=60) as server:
+        assert await _collect("AAPL", DAY, 7) == ["n,AAPL"]
+        assert await _collect("AAPL", DAY, 7) == ["n,AAPL"]
+
+        lines = await _collect("AAPL", DAY)
+        assert [line.split(",")[3] for line in lines] == [
+            "2019-11-29 09:31:00", "2019-11-29 09:32:00",
+        ]
+        assert [
+            command.split(",")[2] for command in server.commands
+            if command.startswith("HIT,")
+        ] == ["1", "60"]
+
+
+@pytest.mark.asyncio
+async def test_closed_days_answered_locally(iqfeed) -> None:
+    async with iqfeed.lookup(bars=2) as server:
+        # Thanksgiving and a Saturday
+        assert await _collect("AAPL", DAY.replace(day=28)) == ["n,AAPL"]
+        assert await _collect("AAPL", DAY.replace(day=30)) == ["n,AAPL"]
+
+        # A replay starting on a closed day goes on with the next one
+        lines = await _collect("AAPL", DAY.replace(day=30), days=2)
+        assert [line.split(",")[3] for line in lines] == [
+            "2019-12-02 09:31:00", "2019-12-02 09:32:00",
+        ]
+
+        assert [
+            command.split(",")[3] for command in server.commands
+            if command.startswith("HIT,")
+        ] == ["20191202 093000"]
+
+
+@pytest.mark.asyncio
+async def test_replay_skips_days_without_data(iqfeed) -> None:
+    missing = [datetime.date(2019, 12, 2)]
+
+    async with iqfeed.lookup(bars=1, missing=missing):
+        lines = await _collect("AAPL", DAY.replace(hour=9, minute=30), days=3)
+
+        assert [line.split(",")[3] for line in lines] == [
+            "2019-11-29 09:31:00", "2019-12-03 09:31:00",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_replay_without_any_bars_answered_once(iqfeed) -> None:
+    missing = [datetime.date(2019, 12, 2)]
+
+    async with iqfeed.lookup(bars=2, missing=missing):
+        # Every bar of the first day ends before the start time
+        assert await _collect("AAPL", DAY.replace(hour=9, minute=40)) == \
+            ["n,AAPL"]
+        assert await _collect(
+            "AAPL", DAY.replace(hour=9, minute=40), days=2
+        ) == ["n,AAPL"]
+
+
+@pytest.mark.asyncio
+async def test_replay_failing_midway_reports_error(iqfeed) -> None:
+    missing = [datetime.date(2019, 11, 29)]
+
+    async with iqfeed.lookup(bars=2, missing=missing, error="Broken"):
+        lines = await _collect("AAPL", DAY.replace(hour=9, minute=30), days=2)
+
+        # The bars sent before the failure aren't passed off as the whole day
+        assert [line.split(",")[1] for line in lines] == ["BC", "BC", "E"]
+        assert lines[-1] == "B-AAPL-0060-s,E,Broken"
+
+
+@pytest.mark.asyncio
+async def test_live_jobs_share_upstream_watch(monkeypatch, iqfeed) -> None:
+    monkeypatch.setattr(worker, "is_live", lambda start: True)
+
+    async with iqfeed.derivative(bars=1) as server:
+        jobs = [worker.process_job("AAPL", DAY) for _ in range(3)]
+
+        for job in jobs:
+            chunk = await asyncio.wait_for(job.__anext__(), 5)
+            assert chunk.decode("latin-1").splitlines() == [
+                "B-AAPL-0060-s,BH,AAPL,2019-11-29 09:31:00,"
+                "267.9,267.9,267.9,267.9,1000,100,10"
+            ]
+
+        assert server.connections == 1
+        assert server.watches == ["AAPL"]
+
+        for job in jobs:
+            await job.aclose()
+
+        await asyncio.sleep(0.05)
+        assert server.watches == []
+
+
+@pytest.mark.asyncio
+async def test_live_job_forwards_missing_data(monkeypatch, iqfeed) -> None:
+    monkeypatch.setattr(worker, "is_live", lambda start: True)
+
+    async with iqfeed.derivative(bars=1) as server:
+        job = worker.process_job("MISSING", DAY)
+
+        try:
+            await asyncio.wait_for(job.__anext__(), 5)
+            await server.send_no_data("MISSING")
+
+            assert await asyncio.wait_for(job.__anext__(), 5) == \
+                b"n,MISSING\r\n"
+
+        finally:
+            await job.aclose()
+
+
+@pytest.mark.asyncio
+async def test_tick_job_streams_and_caches_ticks(
+    monkeypatch, tmp_path, iqfeed
+) -> None:
+    monkeypatch.setenv("IQFEED_CACHE_DIR", str(tmp_path))
+
+    async def collect(start: datetime.datetime) -> List[str]:
+        chunks = [
+            chunk async for chunk in worker.process_tick_job(
+                "SPY", start, DAY.replace(hour=16), "T1"
+            )
+        ]
+        return b"".join(chunks).decode("latin-1").splitlines()
+
+    async with iqfeed.lookup(ticks=3) as server:
+        assert await collect(DAY.replace(hour=9, minute=30)) == [
+            "T1,2019-11-29 09:30:00.000005,267.9,100,100,267.89,267.91,1",
+            "T1,2019-11-29 09:30:01.000005,268.9,100,200,268.89,268.91,2",
+            "T1,2019-11-29 09:30:02.000005,269.9,100,300,269.89,269.91,3",
+            "T1,!ENDMSG!,",
+        ]
+
+        # The whole day was pulled and cached, so later periods are sliced
+        # from the cache
+        assert (await collect(DAY.replace(hour=9, minute=30, second=1)))[
+            0
+        ].startswith("T1,2019-11-29 09:30:01.000005,")
+        assert [
+            command.split(",")[2] for command in server.commands
+            if command.startswith("HTT,")
+        ] == ["20191129 000000"]
+
+
+@pytest.mark.asyncio
+async def test_days_without_ticks_keep_their_bars(
+    monkeypatch, tmp_path, iqfeed
+) -> None:
+    monkeypatch.setenv("IQFEED_CACHE_DIR", str(tmp_path))
+
+    async def collect_ticks(start: datetime.datetime) -> List[str]:
+        chunks = [
+            chunk async for chunk in worker.process_tick_job(
+                "SPY", start, DAY.replace(hour=16), "T1"
+            )
+        ]
+        return b"".join(chunks).decode("latin-1").splitlines()
+
+    async with iqfeed.lookup(bars=2, ticks=0) as server:
+        assert await collect_ticks(DAY) == NO_TICKS
+
+        # Days without ticks are remembered apart from days without bars
+        assert await collect_ticks(DAY) == NO_TICKS
+        assert [
+            command.split(",")[2] for command in server.commands
+            if command.startswith("HTT,")
+        ] == ["20191129 000000"]
+
+        lines = await _collect("SPY", DAY)
+        assert [line.split(",")[3] for line in lines] == [
+            "2019-11-29 09:31:00", "2019-11-29 09:32:00",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_partial_days_without_ticks_arent_remembered(iqfeed) -> None:
+    async def collect_ticks() -> List[str]:
+        chunks = [
+            chunk async for chunk in worker.process_tick_job(
+                "SPY", DAY.replace(hour=15), DAY.replace(hour=16), "T1"
+            )
+        ]
+        return b"".join(chunks).decode("latin-1").splitlines()
+
+    async with iqfeed.lookup(ticks=0) as server:
+        assert await collect_ticks() == NO_TICKS
+        assert await collect_ticks() == NO_TICKS
+
+        assert sum(
+            command.startswith("HTT,") for command in server.commands
+        ) == 2